@@ -2,57 +2,218 @@ import os
 import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate, upgrade
+from jinja2 import FileSystemBytecodeCache
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+from db_routing import READER_BIND, RoutingSession, reader_bind_options
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
-
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "supersecretkey")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# -------------------------
-# Configure the database
-# -------------------------
-db_url = os.environ.get("DATABASE_URL")
-if not db_url:
-    # fallback for local dev
-    db_url = "sqlite:///app.db"
-
-app.config["SQLALCHEMY_DATABASE_URI"] = db_url
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# File upload configuration
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
-
-# Initialize the app with the extension
-db.init_app(app)
-
-# Import models after db initialization to avoid circular imports
-with app.app_context():
-    # Import models to ensure tables are created
-    from models import User, Customer, Vendor, Item, Sale, SaleItem, Purchase, PurchaseItem, set_db  # noqa: F401
-    # Set the db reference in models
-    set_db(db)
-    db.create_all()
-    logging.info("Database tables created")
-
-# -------------------------
-# Import routes
-# -------------------------
-import routes  # noqa: E402
+# Sessions route queries in @read_only views to the reader engine (see db_routing.py)
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+migrate = Migrate(directory=MIGRATIONS_DIR, render_as_batch=True)
+
+
+def configure(app):
+    # -------------------------
+    # Configure the database
+    # -------------------------
+    db_url = os.environ.get("DATABASE_URL")
+    if not db_url:
+        # fallback for local dev
+        db_url = "sqlite:///app.db"
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Reader engine for read-only views: DATABASE_READ_URL (e.g. a replica), else a second pool on a
+    # SQLite file (SQLITE_READ_POOL=0 to turn off), else none and reads use the primary
+    reader = reader_bind_options(db_url, os.environ.get("DATABASE_READ_URL"),
+                                 os.environ.get("SQLITE_READ_POOL", "1") == "1")
+    if reader:
+        app.config["SQLALCHEMY_BINDS"] = {READER_BIND: reader}
+    # How long a browser that just wrote keeps reading from the primary, when the reader is a replica
+    app.config['READ_AFTER_WRITE_SECONDS'] = float(os.environ.get("READ_AFTER_WRITE_SECONDS", "5"))
+
+    # SQLite connection tuning (see sqlite_profile.py); ignored on other databases
+    app.config['SQLITE_JOURNAL_MODE'] = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    # How write transactions begin; reads always begin deferred
+    app.config['SQLITE_BEGIN_MODE'] = os.environ.get("SQLITE_BEGIN_MODE", "IMMEDIATE")
+
+    # File upload configuration
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    # Item feeds are streamed to disk, so the import route accepts much larger uploads
+    app.config['IMPORT_MAX_CONTENT_LENGTH'] = int(os.environ.get("IMPORT_MAX_CONTENT_LENGTH", 1024 * 1024 * 1024))  # 1GB
+    # Threads per web worker that process uploaded imports in the background
+    app.config['IMPORT_WORKERS'] = int(os.environ.get("IMPORT_WORKERS", "2"))
+
+    # Bill / invoice numbering: prefix per document type, numbers restart each fiscal year
+    app.config['DOCUMENT_NUMBER_PREFIXES'] = {
+        'SALE': os.environ.get("SALE_NUMBER_PREFIX", "SALE"),
+        'PUR': os.environ.get("PURCHASE_NUMBER_PREFIX", "PUR"),
+    }
+    app.config['FISCAL_YEAR_START'] = os.environ.get("FISCAL_YEAR_START", "01-01")  # MM-DD
+    # Numbers each worker process reserves per database round trip
+    app.config['DOCUMENT_NUMBER_BLOCK_SIZE'] = int(os.environ.get("DOCUMENT_NUMBER_BLOCK_SIZE", "20"))
+
+    # Background thread per worker that posts queued sales/purchases to the ledgers
+    app.config['LEDGER_WRITER'] = os.environ.get("LEDGER_WRITER", "1") == "1"
+    app.config['LEDGER_DRAIN_INTERVAL'] = float(os.environ.get("LEDGER_DRAIN_INTERVAL", "5"))  # seconds
+    app.config['LEDGER_BATCH_SIZE'] = int(os.environ.get("LEDGER_BATCH_SIZE", "500"))
+
+    # Per-process serial number map for barcode scans: how often a scan checks for item changes,
+    # and how often the map is reloaded in full regardless
+    app.config['SCAN_CACHE_CHECK_INTERVAL'] = float(os.environ.get("SCAN_CACHE_CHECK_INTERVAL", "2"))  # seconds
+    app.config['SCAN_CACHE_MAX_AGE'] = float(os.environ.get("SCAN_CACHE_MAX_AGE", "300"))  # seconds
+
+    # Per-request SQL/template timings (Server-Timing header), slow-query log and /metrics (see metrics.py)
+    app.config['METRICS_ENABLED'] = os.environ.get("METRICS_ENABLED", "1") == "1"
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get("SLOW_QUERY_MS", "200"))
+    # /metrics is readable by these logged-in users, or by a scraper sending `Authorization: Bearer <token>`
+    app.config['METRICS_TOKEN'] = os.environ.get("METRICS_TOKEN")
+    app.config['METRICS_USERS'] = set(os.environ.get("METRICS_USERS", "admin").split(","))
+
+    # `?_profile=1` / `X-Profile: 1` from these users runs the request under cProfile (see profiling.py)
+    app.config['PROFILING_ENABLED'] = os.environ.get("PROFILING_ENABLED", "1") == "1"
+    app.config['PROFILE_USERS'] = set(os.environ.get("PROFILE_USERS", "admin").split(","))
+    if os.environ.get("PROFILE_DIR"):
+        app.config['PROFILE_DIR'] = os.environ["PROFILE_DIR"]
+
+    # Lazy-load (N+1) detector (see n_plus_one.py); unset, it is on whenever the app runs in debug mode
+    if os.environ.get("NPLUSONE_DETECT"):
+        app.config['NPLUSONE_DETECT'] = os.environ["NPLUSONE_DETECT"] == "1"
+
+    # Logging goes through a queue to a listener thread (see logging_config.py)
+    app.config['LOG_LEVEL'] = os.environ.get("LOG_LEVEL", "INFO")
+    app.config['LOG_LEVELS'] = os.environ.get("LOG_LEVELS", "")  # e.g. "sqlalchemy.engine=INFO,ledger=DEBUG"
+    app.config['LOG_FORMAT'] = os.environ.get("LOG_FORMAT", "json")  # json or text
+    app.config['LOG_QUEUE_SIZE'] = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+    # Share of requests whose form payloads are logged
+    app.config['LOG_PAYLOAD_SAMPLE_RATE'] = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+    # Apply pending migrations (migrations/) when a process starts. Off by default: deploys run
+    # `flask init-db` once instead of every worker checking the schema as it boots
+    app.config['AUTO_MIGRATE'] = os.environ.get("AUTO_MIGRATE", "0") == "1"
+
+    # Compiled templates are cached on disk and shared by the workers
+    app.config['JINJA_BYTECODE_CACHE_DIR'] = os.environ.get(
+        "JINJA_BYTECODE_CACHE_DIR", os.path.join(app.instance_path, 'jinja_cache'))
+
+
+def prepare_database():
+    """Migrate the schema and build the counters and rollups a new database needs (app context)"""
+    import counters
+    import rollups
+    upgrade(directory=MIGRATIONS_DIR)
+    logging.info("Database schema up to date")
+    # Builds the counters / rollups on first run
+    counters.ensure_counters()
+    rollups.ensure_rollups()
+
+
+def create_app():
+    # Create the app
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "supersecretkey")
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+    configure(app)
+
+    # Structured logging off the request thread; request ids are assigned before the other hooks run
+    import logging_config
+    logging_config.init_app(app)
+
+    cache_dir = app.config['JINJA_BYTECODE_CACHE_DIR']
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(cache_dir)}
+
+    # Initialize the app with the extension
+    db.init_app(app)
+
+    # WAL, busy timeout and pragmas on every SQLite connection, set up before the first one is opened
+    import sqlite_profile
+    sqlite_profile.init_app(app, db)
+
+    import db_routing
+    db_routing.init_app(app, db)
+
+    # Registered before the other request hooks so the timings cover them
+    import metrics
+    metrics.init_app(app, db)
+    import profiling
+    profiling.init_app(app)
+
+    migrate.init_app(app, db)
+
+    # Registers the counter-maintenance hooks
+    import counters  # noqa: F401
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Migrate the schema and build the counters and rollups (run once per deploy)."""
+        prepare_database()
+
+    if app.config['AUTO_MIGRATE']:
+        with app.app_context():
+            prepare_database()
+
+    # `flask rebuild-rollups`
+    import rollups
+    rollups.init_app(app)
+
+    # `flask check-indexes`: EXPLAIN the hot queries and fail if one stops using its index
+    import query_plans
+    query_plans.init_app(app)
+
+    # `flask stock-snapshot`: daily per-item stock snapshots for stock-at-date lookups
+    import inventory
+    inventory.init_app(app)
+
+    # Ledger outbox writer thread and `flask drain-ledger`
+    import ledger
+    ledger.init_app(app)
+
+    # `flask set-tax-rate` / `flask recalculate-taxes`: settings-backed VAT and excise rates
+    import tax
+    tax.init_app(app)
+
+    # `flask seed` (synthetic data), `flask benchmark` (route timings against a stored baseline)
+    # and `flask benchmark-startup` (worker boot time)
+    import seed
+    seed.init_app(app)
+    import benchmark
+    benchmark.init_app(app)
+
+    # In-memory serial number lookups for barcode scans, warmed per worker
+    import scan_cache
+    scan_cache.init_app(app)
+
+    # Log (or raise on) repeated relationship lazy loads, on by default in debug mode
+    import n_plus_one
+    n_plus_one.init_app(app)
+
+    # -------------------------
+    # Register routes
+    # -------------------------
+    import routes
+    routes.init_app(app)
+
+    return app
+
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,287 @@
+"""Request benchmarks against a seeded database: ``flask benchmark``.
+
+Runs the checkout, dashboard, list, invoice and import paths in-process
+through the Flask test client (``process_excel_file`` directly, because
+the import route only queues a job). Each one is timed over ``--iterations``
+runs after ``--warmup`` runs. The report gives p50/p95/p99 latency in ms
+and SQL statements per run.
+
+``--save-baseline`` stores the results as JSON (``benchmarks/baseline.json``
+by default). A later run compares itself with the baseline and exits
+non-zero when a benchmark's p95 is more than ``--tolerance`` slower, or it
+runs more statements than before. Use the same data set for both, e.g.
+``flask seed --random-seed 42`` on a scratch database. Runs write sales,
+purchases and ``BENCH`` items into that database, so never point this at
+real data.
+
+``flask benchmark-startup`` boots the app in fresh interpreters, as a
+gunicorn worker does, and reports the median boot time, how many modules
+were loaded and whether pandas was among them. ``--path`` boots another
+checkout instead (e.g. a ``git worktree`` of an older commit), so a change
+can be measured against the tree before it.
+"""
+import csv
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+import click
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Engine
+
+from app import db
+from models import Customer, Item, Sale, User, Vendor
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'baseline.json')
+BENCH_SN_PREFIX = 'BENCH'
+IMPORT_ROWS = 1000
+# Child process that boots the app the way a gunicorn worker does and reports on it
+STARTUP_PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(elapsed, len(sys.modules), int('pandas' in sys.modules))
+"""
+
+Result = namedtuple('Result', 'name runs p50 p95 p99 queries')
+
+
+def _percentile(samples, percent):
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class QueryCounter:
+    """Counts SQL statements on every engine while :attr:`active`"""
+
+    def __init__(self):
+        self.count = 0
+        self.active = False
+        event.listen(Engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        if self.active:
+            self.count += 1
+
+    def close(self):
+        event.remove(Engine, 'before_cursor_execute', self._count)
+
+
+def _sample_ids(model, n, rng, *where):
+    """Up to ``n`` random ids of ``model`` (from the first 10k matches, so the query stays cheap)"""
+    ids = db.session.scalars(select(model.id).where(*where).order_by(model.id.desc()).limit(10000)).all()
+    return rng.sample(ids, min(n, len(ids)))
+
+
+def _write_import_file(rng):
+    handle, path = tempfile.mkstemp(suffix='.csv', prefix='bench-import-')
+    with os.fdopen(handle, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['sn', 'product', 'category', 'brand', 'cp', 'wholesale', 'sp', 'uom', 'opening_quantity'])
+        for _ in range(IMPORT_ROWS):
+            # Half new serial numbers, half updates of ones earlier runs created
+            n = rng.randint(1, IMPORT_ROWS * 2)
+            cp = rng.randint(100, 10000) / 100
+            writer.writerow([f"{BENCH_SN_PREFIX}{n:07d}", f"Benchmark item {n}", 'Benchmark', 'Bench',
+                             f"{cp:.2f}", f"{cp * 1.1:.2f}", f"{cp * 1.25:.2f}", 'pcs', rng.randint(1, 100)])
+    return path
+
+
+def scenarios(rng):
+    """``(name, run, expected)``: ``run(client)`` performs one request and returns its status.
+
+    A form that fails re-renders itself with 200, so the POST scenarios
+    expect the 302 a saved sale or purchase redirects with.
+    """
+    items = db.session.execute(select(Item.id, Item.sp).where(Item.current_quantity > 100)
+                               .order_by(Item.id.desc()).limit(10000)).all()
+    if not items:
+        raise click.ClickException("No items with stock; run `flask seed` first.")
+    customers = _sample_ids(Customer, 100, rng)
+    vendors = _sample_ids(Vendor, 100, rng)
+    sales = _sample_ids(Sale, 100, rng)
+
+    def get(path_for):
+        return lambda client: client.get(path_for()).status_code, 200
+
+    def post(path, form):
+        return lambda client: client.post(path, data=form()).status_code, 302
+
+    def sale_form():
+        lines = rng.sample(items, min(3, len(items)))
+        return {'customer_id': str(rng.choice(customers)) if customers else '', 'discount': '0',
+                'vat_enabled': 'on', 'item_id[]': [str(item_id) for item_id, _ in lines],
+                'quantity[]': ['1'] * len(lines), 'unit_price[]': [str(sp) for _, sp in lines]}
+
+    def purchase_form():
+        lines = rng.sample(items, min(3, len(items)))
+        return {'vendor_id': str(rng.choice(vendors)) if vendors else '', 'discount': '0',
+                'item_id[]': [str(item_id) for item_id, _ in lines], 'quantity[]': ['10'] * len(lines),
+                'unit_price[]': [str(sp) for _, sp in lines]}
+
+    def import_file(client):
+        from utils import process_excel_file
+        success, message = process_excel_file(_write_import_file(rng))
+        if not success:
+            raise click.ClickException(f"Import failed: {message}")
+        return 200
+
+    return [
+        ('add_sale', *post('/sales/add', sale_form)),
+        ('add_purchase', *post('/purchases/add', purchase_form)),
+        ('dashboard', *get(lambda: '/')),
+        ('customers', *get(lambda: '/customers')),
+        ('vendors', *get(lambda: '/vendors')),
+        ('items', *get(lambda: '/items')),
+        ('items_search', *get(lambda: '/items?q=Tea')),
+        ('item_movements', *get(lambda: f"/items/{rng.choice(items)[0]}/movements")),
+        ('sales', *get(lambda: '/sales')),
+        ('purchases', *get(lambda: '/purchases')),
+        ('sales_ledger', *get(lambda: '/ledger/sales')),
+        ('sales_report', *get(lambda: '/reports/sales/item')),
+        ('view_sale', *get(lambda: f"/sales/view/{rng.choice(sales)}" if sales else '/sales')),
+        ('process_excel_file', import_file, 200),
+    ]
+
+
+def _check_status(name, status, expected):
+    if status != expected:
+        hint = " (the form was rejected; see the log)" if expected == 302 and status == 200 else ""
+        raise click.ClickException(f"{name} returned HTTP {status}, expected {expected}{hint}")
+
+
+def run_benchmarks(app, iterations=20, warmup=2, only=None, random_seed=42):
+    """Run every benchmark (or those named in ``only``) and return a list of :class:`Result`"""
+    rng = random.Random(random_seed)
+    user = db.session.scalar(select(User).where(User.username == 'admin'))
+    if user is None:
+        user = User(username='admin')
+        user.set_password('admin')
+        db.session.add(user)
+        db.session.commit()
+    user_id = user.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['username'] = 'admin'
+
+    counter = QueryCounter()
+    results = []
+    try:
+        for name, run, expected in scenarios(rng):
+            if only and name not in only:
+                continue
+            for _ in range(warmup):
+                db.session.remove()
+                _check_status(name, run(client), expected)
+            timings, queries = [], []
+            for _ in range(iterations if name != 'process_excel_file' else max(1, iterations // 5)):
+                # Test client requests run in this command's app context and so share its session;
+                # each starts with a fresh one, as a request in a worker does
+                db.session.remove()
+                counter.count, counter.active = 0, True
+                started = time.perf_counter()
+                status = run(client)
+                elapsed = time.perf_counter() - started
+                counter.active = False
+                _check_status(name, status, expected)
+                timings.append(elapsed * 1000)
+                queries.append(counter.count)
+            results.append(Result(name, len(timings), _percentile(timings, 50), _percentile(timings, 95),
+                                  _percentile(timings, 99), statistics.mean(queries)))
+    finally:
+        counter.close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Messages for every result that regressed past ``baseline``"""
+    regressions = []
+    for result in results:
+        before = baseline.get(result.name)
+        if before is None:
+            continue
+        if result.p95 > before['p95'] * (1 + tolerance):
+            regressions.append(f"{result.name}: p95 {result.p95:.1f}ms vs {before['p95']:.1f}ms baseline")
+        if result.queries > before['queries'] + 0.5:
+            regressions.append(f"{result.name}: {result.queries:.1f} queries vs {before['queries']:.1f} baseline")
+    return regressions
+
+
+def measure_startup(runs=5, module='main', root=None):
+    """Boot ``module`` in ``runs`` fresh interpreters; returns ``(seconds, modules loaded, pandas loaded)`` per run"""
+    root = root or os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', STARTUP_PROBE.format(module=module)], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.split()
+        samples.append((float(output[-3]), int(output[-2]), output[-1] == '1'))
+    return samples
+
+
+def init_app(app):
+    @app.cli.command('benchmark-startup')
+    @click.option('--runs', type=int, default=5, show_default=True, help='Fresh interpreters to boot.')
+    @click.option('--module', default='main', show_default=True, help='Module that builds the app.')
+    @click.option('--path', 'root', type=click.Path(exists=True, file_okay=False),
+                  help='Checkout to boot instead of this one.')
+    def benchmark_startup_command(runs, module, root):
+        """Time how long a worker takes to import and build the app."""
+        samples = measure_startup(runs, module, root)
+        timings = [seconds * 1000 for seconds, _, _ in samples]
+        click.echo(f"{module}: median {statistics.median(timings):.0f}ms, min {min(timings):.0f}ms "
+                   f"over {runs} runs; {samples[-1][1]} modules loaded, "
+                   f"pandas {'loaded' if samples[-1][2] else 'not loaded'}")
+
+
+    @app.cli.command('benchmark')
+    @click.option('--iterations', type=int, default=20, show_default=True, help='Timed runs per benchmark.')
+    @click.option('--warmup', type=int, default=2, show_default=True, help='Untimed runs before timing.')
+    @click.option('--only', multiple=True, help='Run just this benchmark (repeatable).')
+    @click.option('--baseline', 'baseline_path', type=click.Path(dir_okay=False), default=DEFAULT_BASELINE,
+                  show_default=True)
+    @click.option('--save-baseline', is_flag=True, help='Store this run as the baseline instead of comparing.')
+    @click.option('--tolerance', type=float, default=0.25, show_default=True,
+                  help='Allowed p95 slowdown against the baseline (0.25 = 25%).')
+    def benchmark_command(iterations, warmup, only, baseline_path, save_baseline, tolerance):
+        """Time the main routes through the test client against the current database."""
+        counts = {name: db.session.scalar(select(func.count()).select_from(model))
+                  for name, model in (('items', Item), ('customers', Customer), ('sales', Sale))}
+        click.echo("Data set: " + ", ".join(f"{count} {name}" for name, count in counts.items()))
+        results = run_benchmarks(app, iterations=iterations, warmup=warmup, only=set(only))
+
+        click.echo(f"{'benchmark':<20}{'runs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+        for result in results:
+            click.echo(f"{result.name:<20}{result.runs:>6}{result.p50:>10.1f}{result.p95:>10.1f}"
+                       f"{result.p99:>10.1f}{result.queries:>9.1f}")
+
+        if save_baseline:
+            os.makedirs(os.path.dirname(baseline_path) or '.', exist_ok=True)
+            with open(baseline_path, 'w') as f:
+                json.dump({'data_set': counts,
+                           'results': {result.name: result._asdict() for result in results}}, f, indent=2)
+            click.echo(f"Baseline saved to {baseline_path}.")
+            return
+        if not os.path.exists(baseline_path):
+            click.echo("No baseline to compare with; run with --save-baseline to store one.")
+            return
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        before = baseline.get('data_set') or {}
+        # Runs add sales and items themselves, so only a clearly different data set is worth a warning
+        if any(abs(counts[name] - before.get(name, 0)) > 0.05 * max(counts[name], 1) for name in counts):
+            click.echo(f"Warning: baseline was taken on {baseline.get('data_set')}.", err=True)
+        regressions = compare(results, baseline['results'], tolerance)
+        for message in regressions:
+            click.echo(message, err=True)
+        if regressions:
+            raise SystemExit(1)
+        click.echo("No regressions against the baseline.")
@@ -0,0 +1,256 @@
+"""Incrementally maintained dashboard counters and the cached dashboard payload.
+
+Row counts and per-day sales revenue live in ``stat_counters`` and are
+adjusted in the same transaction as the write that changes them, from a
+session ``after_flush`` hook. Every such write also bumps the
+``dashboard_version`` counter; the dashboard payload is cached per process
+against that version, so a dashboard hit is a single primary-key read
+unless something changed since the last render.
+
+``items_version`` moves on every write to an item's price or stock (ORM
+edits here, Core stock updates via :func:`bump_items_version`) and is the
+validator the item APIs use for conditional GETs. ``item_catalogue_version``
+moves only on writes to the item rows themselves (ORM edits, imports), not
+on stock-only updates, so caches can tell when a stock refresh is enough.
+``parties_version`` moves on every customer or vendor write and stamps the
+cached picker lists (see reference.py); ``settings_version`` does the same
+for ``settings`` rows and the cached tax rates (see tax.py).
+"""
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import bindparam, delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import db
+from models import Customer, Vendor, Item, Sale, SaleItem, Purchase, PurchaseItem, Settings, StatCounter
+
+logger = logging.getLogger(__name__)
+
+COUNTED_MODELS = {
+    Customer: 'customers',
+    Vendor: 'vendors',
+    Item: 'items',
+    Sale: 'sales',
+    Purchase: 'purchases',
+}
+# Writes to these invalidate the dashboard payload without changing a count
+DASHBOARD_MODELS = tuple(COUNTED_MODELS) + (SaleItem, PurchaseItem)
+
+VERSION_KEY = 'dashboard_version'
+ITEMS_VERSION_KEY = 'items_version'
+ITEM_CATALOGUE_KEY = 'item_catalogue_version'
+PARTIES_VERSION_KEY = 'parties_version'
+PARTY_MODELS = (Customer, Vendor)
+SETTINGS_VERSION_KEY = 'settings_version'
+LOW_STOCK_LEVEL = 10
+
+
+def revenue_key(day):
+    return f"revenue:{day.isoformat()}"
+
+
+def _increment_statement(dialect_name):
+    """INSERT ... ON CONFLICT(name) DO UPDATE SET value = value + delta"""
+    table = StatCounter.__table__
+    if dialect_name == 'sqlite':
+        stmt = sqlite.insert(table)
+    elif dialect_name == 'postgresql':
+        stmt = postgresql.insert(table)
+    else:
+        return None
+    stmt = stmt.values(name=bindparam('counter'), value=bindparam('delta'))
+    return stmt.on_conflict_do_update(index_elements=[table.c.name],
+                                      set_={'value': table.c.value + stmt.excluded.value})
+
+
+def _apply(connection, deltas):
+    params = [{'counter': name, 'delta': delta} for name, delta in deltas.items() if delta]
+    if not params:
+        return
+    stmt = _increment_statement(connection.dialect.name)
+    if stmt is not None:
+        connection.execute(stmt, params)
+        return
+    table = StatCounter.__table__
+    for param in params:
+        result = connection.execute(
+            update(table).where(table.c.name == param['counter']).values(value=table.c.value + param['delta']))
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(name=param['counter'], value=param['delta']))
+
+
+def adjust(deltas, session=None):
+    """Apply counter deltas for writes that bypass the ORM (e.g. bulk imports).
+
+    Runs in the current transaction and also invalidates the dashboard.
+    """
+    deltas = dict(deltas)
+    deltas[VERSION_KEY] = deltas.get(VERSION_KEY, 0) + 1
+    _apply((session or db.session).connection(), deltas)
+
+
+def bump_items_version(session=None):
+    """Invalidate cached item data after a Core write to ``items``"""
+    adjust({ITEMS_VERSION_KEY: 1}, session)
+
+
+def items_version():
+    return db.session.scalar(select(StatCounter.value).where(StatCounter.name == ITEMS_VERSION_KEY))
+
+
+def parties_version():
+    return db.session.scalar(select(StatCounter.value).where(StatCounter.name == PARTIES_VERSION_KEY))
+
+
+def settings_version():
+    return db.session.scalar(select(StatCounter.value).where(StatCounter.name == SETTINGS_VERSION_KEY))
+
+
+def _sale_revenue(sale, sign=1):
+    if sale.sale_date is None or sale.total_amount is None:
+        return None, Decimal('0')
+    return revenue_key(sale.sale_date.date()), sign * Decimal(str(sale.total_amount))
+
+
+@event.listens_for(Session, 'after_flush')
+def track_counter_changes(session, flush_context):
+    deltas = defaultdict(Decimal)
+    touched = False
+
+    for obj, sign in [(obj, 1) for obj in session.new] + [(obj, -1) for obj in session.deleted]:
+        if isinstance(obj, Settings):
+            deltas[SETTINGS_VERSION_KEY] += 1
+        if not isinstance(obj, DASHBOARD_MODELS):
+            continue
+        touched = True
+        if isinstance(obj, Item):
+            deltas[ITEMS_VERSION_KEY] += 1
+            deltas[ITEM_CATALOGUE_KEY] += 1
+        if isinstance(obj, PARTY_MODELS):
+            deltas[PARTIES_VERSION_KEY] += 1
+        name = COUNTED_MODELS.get(type(obj))
+        if name:
+            deltas[name] += sign
+        if isinstance(obj, Sale):
+            key, amount = _sale_revenue(obj, sign)
+            if key:
+                deltas[key] += amount
+
+    for obj in session.dirty:
+        if isinstance(obj, Settings) and session.is_modified(obj):
+            deltas[SETTINGS_VERSION_KEY] += 1
+        if not isinstance(obj, DASHBOARD_MODELS) or not session.is_modified(obj):
+            continue
+        touched = True
+        if isinstance(obj, Item):
+            deltas[ITEMS_VERSION_KEY] += 1
+            deltas[ITEM_CATALOGUE_KEY] += 1
+        if isinstance(obj, PARTY_MODELS):
+            deltas[PARTIES_VERSION_KEY] += 1
+        if isinstance(obj, Sale):
+            # Move revenue from the old day/amount to the new one
+            state = inspect(obj)
+            old_date = state.attrs.sale_date.history.deleted
+            old_total = state.attrs.total_amount.history.deleted
+            if old_date or old_total:
+                old_day = (old_date[0] if old_date else obj.sale_date)
+                old_amount = old_total[0] if old_total else obj.total_amount
+                if old_day is not None and old_amount is not None:
+                    deltas[revenue_key(old_day.date())] -= Decimal(str(old_amount))
+                key, amount = _sale_revenue(obj)
+                if key:
+                    deltas[key] += amount
+
+    if touched:
+        deltas[VERSION_KEY] += 1
+    if deltas:
+        _apply(session.connection(), deltas)
+
+
+def rebuild_counters():
+    """Recompute every counter from the base tables (startup / backfill)"""
+    values = {name: db.session.scalar(select(func.count()).select_from(model))
+              for model, name in COUNTED_MODELS.items()}
+    day = func.date(Sale.sale_date)
+    for sale_day, total in db.session.execute(select(day, func.sum(Sale.total_amount)).group_by(day)):
+        if sale_day is not None:
+            values[f"revenue:{sale_day}"] = total or 0
+    for key in (VERSION_KEY, ITEMS_VERSION_KEY, ITEM_CATALOGUE_KEY, PARTIES_VERSION_KEY, SETTINGS_VERSION_KEY):
+        version = db.session.scalar(select(StatCounter.value).where(StatCounter.name == key)) or 0
+        values[key] = version + 1
+
+    db.session.execute(delete(StatCounter))
+    db.session.execute(insert(StatCounter), [{'name': name, 'value': value} for name, value in values.items()])
+    db.session.commit()
+
+
+def ensure_counters():
+    """Build the counters once for a database that does not have them yet"""
+    if not inspect(db.engine).has_table(StatCounter.__tablename__):
+        # Schema not migrated yet (AUTO_MIGRATE off); built on the first start after `flask db upgrade`
+        return
+    if db.session.get(StatCounter, VERSION_KEY) is not None:
+        return
+    try:
+        rebuild_counters()
+        logger.info("Dashboard counters initialised")
+    except IntegrityError:
+        # Another worker initialised them first
+        db.session.rollback()
+
+
+_cache = {'key': None, 'payload': None}
+_cache_lock = threading.Lock()
+
+
+def _build_payload(today):
+    names = list(COUNTED_MODELS.values()) + [revenue_key(today)]
+    counts = dict(db.session.execute(
+        select(StatCounter.name, StatCounter.value).where(StatCounter.name.in_(names))).all())
+
+    recent_sales = db.session.execute(
+        select(Sale.id, Sale.bill_number, Customer.name.label('customer_name'), Sale.total_amount,
+               Sale.sale_date)
+        .outerjoin(Customer, Sale.customer_id == Customer.id)
+        .order_by(Sale.sale_date.desc()).limit(5)).all()
+    recent_purchases = db.session.execute(
+        select(Purchase.id, Purchase.invoice_number, Vendor.name.label('vendor_name'),
+               Purchase.total_amount, Purchase.purchase_date)
+        .outerjoin(Vendor, Purchase.vendor_id == Vendor.id)
+        .order_by(Purchase.purchase_date.desc()).limit(5)).all()
+    low_stock_items = db.session.execute(
+        select(Item.id, Item.product, Item.category, Item.current_quantity, Item.uom)
+        .where(Item.current_quantity < LOW_STOCK_LEVEL).limit(5)).all()
+
+    return {
+        'total_customers': int(counts.get('customers', 0)),
+        'total_vendors': int(counts.get('vendors', 0)),
+        'total_items': int(counts.get('items', 0)),
+        'total_sales': int(counts.get('sales', 0)),
+        'total_purchases': int(counts.get('purchases', 0)),
+        'today_revenue': Decimal(str(counts.get(revenue_key(today), 0))),
+        'recent_sales': [row._asdict() for row in recent_sales],
+        'recent_purchases': [row._asdict() for row in recent_purchases],
+        'low_stock_items': [row._asdict() for row in low_stock_items],
+    }
+
+
+def get_dashboard_payload():
+    """Dashboard template context, rebuilt only when the version has moved"""
+    version = db.session.scalar(select(StatCounter.value).where(StatCounter.name == VERSION_KEY))
+    today = datetime.utcnow().date()
+    key = (version, today)
+    with _cache_lock:
+        if version is not None and _cache['key'] == key:
+            return _cache['payload']
+
+    payload = _build_payload(today)
+    with _cache_lock:
+        _cache['key'], _cache['payload'] = key, payload
+    return payload
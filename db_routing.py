@@ -0,0 +1,137 @@
+"""Route read-only views to a separate reader engine.
+
+Views decorated with :func:`read_only` run their queries on the ``reader``
+bind instead of the primary engine, so lists, reports and the dashboard do
+not take connections from the pool that checkout writes use. The reader is:
+
+* ``DATABASE_READ_URL`` when set (e.g. a Postgres replica);
+* otherwise, on a file-backed SQLite database, a second pool on the same
+  file whose connections are ``PRAGMA query_only`` (WAL lets them read
+  while a write is in progress);
+* otherwise there is no reader and everything goes to the primary.
+
+Flushes and INSERT/UPDATE/DELETE statements always go to the primary, even
+inside a read-only view. A replica can lag, so once a request from a
+browser has written, that browser's read-only views use the primary for
+``READ_AFTER_WRITE_SECONDS`` and a user sees the sale they just saved.
+
+:func:`writes_expected` tells the SQLite profile which transactions will
+write: those of POST (PUT, PATCH, DELETE) requests, of GET views marked
+with :func:`writes`, and everything outside a request (CLI commands and
+the ledger / import threads) except what runs under :func:`reading`.
+"""
+import contextlib
+import functools
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+READER_BIND = 'reader'
+WRITE_STAMP = '_db_wrote_at'
+SAFE_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+
+def reader_bind_options(db_url, read_url=None, sqlite_read_pool=True):
+    """``SQLALCHEMY_BINDS`` entry for the reader, or None when there should be no reader"""
+    if read_url:
+        return {'url': read_url}
+    url = make_url(db_url)
+    if sqlite_read_pool and url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:'):
+        return {'url': db_url}
+    return None
+
+
+def read_only(f):
+    """Mark a view as read-only so its queries use the reader engine.
+
+    ORM flushes and DML statements still go to the primary, but a view
+    that writes through a bare ``session.connection()`` would get the
+    reader, so only views that never write should carry this.
+    """
+    @functools.wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.read_only_db = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def writes(f):
+    """Mark a GET view that writes (e.g. a delete link) so its transactions start as writes"""
+    @functools.wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.db_writes = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+@contextlib.contextmanager
+def reading():
+    """Outside a request, begin the transactions started inside as reads (e.g. a background thread's poll).
+
+    End the transaction inside the block; one still open afterwards would
+    carry on as a read.
+    """
+    g.db_writes = False
+    try:
+        yield
+    finally:
+        g.pop('db_writes', None)
+
+
+def writes_expected():
+    """Whether a transaction starting now belongs to a writer"""
+    if not has_request_context():
+        return not has_app_context() or g.get('db_writes', True)
+    return request.method not in SAFE_METHODS or g.get('db_writes', False)
+
+
+def _reads_from_reader():
+    if not has_request_context() or not g.get('read_only_db'):
+        return False
+    if 'read_after_write' not in g:
+        wrote_at = session.get(WRITE_STAMP)
+        g.read_after_write = (wrote_at is not None
+                              and time.time() - wrote_at < current_app.config['READ_AFTER_WRITE_SECONDS'])
+    return not g.read_after_write
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends reads in read-only views to the reader bind"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                if has_request_context():
+                    g.db_wrote = True
+            elif _reads_from_reader():
+                reader = self._db.engines.get(READER_BIND)
+                if reader is not None:
+                    return reader
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_app(app, db):
+    app.config.setdefault('READ_AFTER_WRITE_SECONDS', 5)
+
+    with app.app_context():
+        reader = db.engines.get(READER_BIND)
+        # Only a replica can lag behind the primary; a second pool on the same SQLite file cannot
+        lagging = reader is not None and reader.url != db.engine.url
+    if reader is not None and reader.dialect.name == 'sqlite':
+        @event.listens_for(reader, 'connect')
+        def make_reader_query_only(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute("PRAGMA query_only=ON")
+            finally:
+                cursor.close()
+
+    if lagging and app.config['READ_AFTER_WRITE_SECONDS']:
+        @app.after_request
+        def stamp_writes(response):
+            if g.get('db_wrote'):
+                session[WRITE_STAMP] = time.time()
+            return response
@@ -43,7 +43,7 @@ class ItemForm(FlaskForm):
     opening_quantity = DecimalField('Opening Quantity', validators=[Optional(), NumberRange(min=0)], default=Decimal('0.00'))
 
 class ExcelUploadForm(FlaskForm):
-    file = FileField('Excel File', validators=[DataRequired(), FileAllowed(['xlsx', 'xls'], 'Excel files only!')])
+    file = FileField('Import File', validators=[DataRequired(), FileAllowed(['xlsx', 'xls', 'csv', 'ndjson', 'jsonl'], 'Excel, CSV or NDJSON files only!')])
 
 class SaleItemForm(FlaskForm):
     item_id = SelectField('Item', coerce=int, validators=[DataRequired()])
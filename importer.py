@@ -0,0 +1,349 @@
+"""Bulk item import engine.
+
+Files are read in bounded chunks (CSV, NDJSON, or read-only openpyxl for
+xlsx), rows are validated and classified as inserts/updates in pandas, the
+existing serial numbers are prefetched with a single query, and writes are
+sent as multi-row statements instead of one ORM round trip per row.
+"""
+import json
+import os
+from decimal import Decimal
+
+import pandas as pd
+from sqlalchemy import bindparam, select, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+import counters
+from app import db
+from inventory import record_movements
+from models import Item
+
+# Expected columns: sn, product, category, brand, cp, wholesale, sp, uom, opening_quantity
+REQUIRED_COLUMNS = ['sn', 'product', 'category', 'brand', 'cp', 'wholesale', 'sp', 'uom', 'opening_quantity']
+DECIMAL_COLUMNS = ['cp', 'wholesale', 'sp', 'opening_quantity']
+TEXT_COLUMNS = ['sn', 'product', 'uom']
+
+# Columns overwritten when an incoming row matches an existing serial number
+UPDATE_COLUMNS = ['product', 'category', 'brand', 'cp', 'wholesale', 'sp', 'uom',
+                  'opening_quantity', 'current_quantity']
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Set by readers on rows that could not be parsed at all (e.g. malformed JSON lines)
+PARSE_ERROR_COLUMN = '_parse_error'
+
+# Only the first few row errors are echoed back in the flash message
+MAX_REPORTED_ERRORS = 5
+
+
+class MissingColumnsError(ValueError):
+    """Raised when an import file lacks one of the required columns"""
+
+    def __init__(self, columns):
+        self.columns = columns
+        super().__init__(f"Missing columns: {', '.join(columns)}")
+
+
+class ImportResult:
+    """Counters and row errors collected while importing items"""
+
+    def __init__(self):
+        # Valid rows read; repeated serial numbers count once per row, as before
+        self.success_count = 0
+        self.inserted = 0
+        self.updated = 0
+        self.error_count = 0
+        # First few "Row N: ..." messages; the full list goes to the rejects file
+        self.errors = []
+
+    def add_rejected(self, rejected):
+        self.error_count += len(rejected)
+        room = MAX_REPORTED_ERRORS - len(self.errors)
+        if room > 0:
+            head = rejected.head(room)
+            self.errors.extend(f"Row {n}: {msg}" for n, msg in zip(head['row'], head['error']))
+
+    def summary(self):
+        """Build the message flashed after an import"""
+        if self.error_count:
+            return (f"Processed {self.success_count} items successfully. "
+                    f"{self.error_count} errors: {'; '.join(self.errors)}")
+        return f"Successfully imported {self.success_count} items"
+
+
+class RejectsWriter:
+    """Append rejected rows to a CSV file, creating it on the first rejection"""
+
+    def __init__(self, path):
+        self.path = path
+        self.written = False
+
+    def write(self, rejected):
+        if rejected.empty:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        rejected.to_csv(self.path, mode='a' if self.written else 'w', header=not self.written, index=False)
+        self.written = True
+
+
+def missing_columns(df):
+    return [col for col in REQUIRED_COLUMNS if col not in df.columns]
+
+
+def _text(series):
+    """Stringify a column the same way the row-by-row importer did, blanking NaN"""
+    return series.where(series.notna(), '').astype(str).str.strip()
+
+
+def prepare_item_rows(df):
+    """Normalise a raw item frame and split off invalid rows.
+
+    ``df`` must be indexed by source row number (header = row 1). Returns
+    ``(rows, rejected)``: ``rows`` holds the valid rows with Decimal
+    price/quantity columns, ``rejected`` the raw invalid rows with ``row``
+    and ``error`` columns in front.
+    """
+    frame = pd.DataFrame(index=df.index)
+    for col in ('sn', 'product', 'category', 'brand', 'uom'):
+        frame[col] = _text(df[col])
+
+    problems = pd.Series('', index=df.index)
+    for col in TEXT_COLUMNS:
+        problems = problems.where(frame[col] != '', problems + f'{col} is required; ')
+
+    # A blank opening quantity means no opening stock
+    opening = df['opening_quantity'].where(df['opening_quantity'].notna(), 0)
+    raw_decimals = {col: df[col] for col in DECIMAL_COLUMNS}
+    raw_decimals['opening_quantity'] = opening
+    for col, raw in raw_decimals.items():
+        blank = raw.isna() | (raw.map(str).str.strip() == '')
+        numeric = pd.to_numeric(raw.where(~blank), errors='coerce')
+        invalid = numeric.isna() | numeric.isin([float('inf'), float('-inf')])
+        problems = problems.where(~blank, problems + f'{col} is required; ')
+        problems = problems.where(~invalid | blank, problems + f'invalid {col} ' + raw.map(str) + '; ')
+        # Invalid rows are left as NaN here and dropped below
+        frame[col] = raw[~invalid].astype(str).str.strip().map(Decimal)
+
+    if PARSE_ERROR_COLUMN in df.columns:
+        parse_errors = df[PARSE_ERROR_COLUMN]
+        problems = problems.where(parse_errors.isna(), parse_errors)
+
+    bad = problems != ''
+    rejected = df.loc[bad, [col for col in REQUIRED_COLUMNS if col in df.columns]].copy()
+    rejected.insert(0, 'error', problems[bad].str.rstrip('; '))
+    rejected.insert(0, 'row', df.index[bad])
+
+    rows = frame[~bad].copy()
+    rows['current_quantity'] = rows['opening_quantity']
+    return rows, rejected
+
+
+def _frame(records, columns, row_numbers):
+    return pd.DataFrame.from_records(records, columns=columns, index=pd.Index(row_numbers))
+
+
+def _iter_csv(file_path, chunk_size):
+    # Everything is read as text so prices reach Decimal without a float round trip
+    row_number = 2
+    for chunk in pd.read_csv(file_path, chunksize=chunk_size, dtype=str, skipinitialspace=True):
+        chunk.columns = [str(col).strip() for col in chunk.columns]
+        chunk.index = pd.RangeIndex(row_number, row_number + len(chunk))
+        row_number += len(chunk)
+        yield chunk
+
+
+def _iter_ndjson(file_path, chunk_size):
+    columns = REQUIRED_COLUMNS + [PARSE_ERROR_COLUMN]
+    records, row_numbers = [], []
+    with open(file_path, encoding='utf-8') as fh:
+        for line_number, line in enumerate(fh, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line, parse_float=Decimal)
+                if not isinstance(record, dict):
+                    record = {PARSE_ERROR_COLUMN: 'expected a JSON object'}
+            except ValueError as e:
+                record = {PARSE_ERROR_COLUMN: f'invalid JSON ({e.msg})'}
+            records.append(record)
+            row_numbers.append(line_number)
+            if len(records) >= chunk_size:
+                yield _frame(records, columns, row_numbers)
+                records, row_numbers = [], []
+    if records:
+        yield _frame(records, columns, row_numbers)
+
+
+def _iter_xlsx(file_path, chunk_size):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet_rows = workbook.active.iter_rows(values_only=True)
+        header = [str(col).strip() if col is not None else '' for col in next(sheet_rows, ())]
+        width = len(header)
+        records, row_numbers = [], []
+        for row_number, values in enumerate(sheet_rows, start=2):
+            if all(value is None for value in values):
+                continue
+            records.append(tuple(values[:width]) + (None,) * (width - len(values)))
+            row_numbers.append(row_number)
+            if len(records) >= chunk_size:
+                yield _frame(records, header, row_numbers)
+                records, row_numbers = [], []
+        if records:
+            yield _frame(records, header, row_numbers)
+    finally:
+        workbook.close()
+
+
+def _iter_xls(file_path, chunk_size):
+    # Legacy .xls has no streaming reader; load it once and slice
+    df = pd.read_excel(file_path)
+    df.index = pd.RangeIndex(2, len(df) + 2)
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+_READERS = {
+    'csv': _iter_csv,
+    'ndjson': _iter_ndjson,
+    'jsonl': _iter_ndjson,
+    'xlsx': _iter_xlsx,
+    'xls': _iter_xls,
+}
+SUPPORTED_EXTENSIONS = list(_READERS)
+
+
+def iter_item_frames(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield frames of at most ``chunk_size`` rows, indexed by source row number"""
+    extension = os.path.splitext(file_path)[1].lower().lstrip('.')
+    if extension not in _READERS:
+        raise ValueError(f"Unsupported file type: .{extension}")
+    return _READERS[extension](file_path, chunk_size)
+
+
+def fetch_existing_sns():
+    """Load every stored serial number with a single query"""
+    return set(db.session.scalars(select(Item.sn)))
+
+
+def _upsert_statement(dialect_name):
+    """INSERT ... ON CONFLICT(sn) DO UPDATE for dialects that support it"""
+    if dialect_name == 'sqlite':
+        stmt = sqlite.insert(Item.__table__)
+    elif dialect_name == 'postgresql':
+        stmt = postgresql.insert(Item.__table__)
+    else:
+        return None
+    return stmt.on_conflict_do_update(
+        index_elements=[Item.__table__.c.sn],
+        set_={col: stmt.excluded[col] for col in UPDATE_COLUMNS},
+    )
+
+
+def _update_by_sn_statement():
+    """Executemany UPDATE keyed on serial number, for dialects without upsert"""
+    table = Item.__table__
+    return (update(table)
+            .where(table.c.sn == bindparam('match_sn'))
+            .values({col: bindparam(col) for col in UPDATE_COLUMNS}))
+
+
+def _record_stock_changes(rows, previous_stock):
+    """Append an 'import' movement for every written row whose stock changed"""
+    deltas = {sn: Decimal(str(qty or 0)) - Decimal(str(previous_stock.get(sn) or 0))
+              for sn, qty in zip(rows['sn'], rows['current_quantity'])}
+    deltas = {sn: delta for sn, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    ids = dict(db.session.execute(select(Item.sn, Item.id).where(Item.sn.in_(list(deltas)))).all())
+    record_movements({ids[sn]: delta for sn, delta in deltas.items()}, 'import')
+
+
+def upsert_item_rows(rows, commit=False, existing=None):
+    """Write one chunk of prepared rows, returning ``(inserted, updated)`` counts.
+
+    ``existing`` is the set from :func:`fetch_existing_sns`; it is fetched
+    when not supplied and updated in place as new rows are written, so one
+    set can be shared across successive chunks. With ``commit`` set the
+    chunk is committed on its own so the write lock is released between
+    chunks; otherwise the caller commits.
+    """
+    if existing is None:
+        existing = fetch_existing_sns()
+
+    # A serial number repeated in the file behaves as successive updates: last row wins
+    rows = rows.drop_duplicates('sn', keep='last')
+    is_update = rows['sn'].isin(existing)
+    columns = ['sn'] + UPDATE_COLUMNS
+    upsert = _upsert_statement(db.engine.dialect.name)
+    # Stock before the write, so the ledger records what the import changed
+    previous_stock = {}
+    if is_update.any():
+        previous_stock = dict(db.session.execute(
+            select(Item.sn, Item.current_quantity).where(Item.sn.in_(rows.loc[is_update, 'sn'].tolist()))).all())
+
+    if upsert is not None:
+        db.session.execute(upsert, rows[columns].to_dict('records'))
+    else:
+        new_rows = rows.loc[~is_update, columns].to_dict('records')
+        changed = rows.loc[is_update, columns].rename(columns={'sn': 'match_sn'})
+        if new_rows:
+            db.session.execute(insert(Item.__table__), new_rows)
+        if len(changed):
+            db.session.execute(_update_by_sn_statement(), changed.to_dict('records'))
+    _record_stock_changes(rows, previous_stock)
+    inserted, updated = int((~is_update).sum()), int(is_update.sum())
+    # Core statements skip the ORM flush hooks that keep the dashboard counters current
+    counters.adjust({'items': inserted, counters.ITEMS_VERSION_KEY: 1, counters.ITEM_CATALOGUE_KEY: 1})
+    if commit:
+        db.session.commit()
+
+    existing.update(rows.loc[~is_update, 'sn'])
+    return inserted, updated
+
+
+def import_item_frames(frames, commit_each_chunk=False, progress=None, rejects_path=None):
+    """Validate and upsert an iterable of item frames chunk by chunk.
+
+    Each frame is validated and written before the next one is read, so
+    memory stays bounded by the chunk size. Rejected rows are appended to
+    ``rejects_path`` (CSV) when given, and ``progress(result)`` is called
+    after every chunk. Returns an :class:`ImportResult`.
+    """
+    result = ImportResult()
+    rejects = RejectsWriter(rejects_path) if rejects_path else None
+    existing = fetch_existing_sns()
+
+    for frame in frames:
+        missing = missing_columns(frame)
+        if missing:
+            raise MissingColumnsError(missing)
+
+        rows, rejected = prepare_item_rows(frame)
+        result.add_rejected(rejected)
+        if rejects:
+            rejects.write(rejected)
+        result.success_count += len(rows)
+        if len(rows):
+            inserted, updated = upsert_item_rows(rows, commit=commit_each_chunk, existing=existing)
+            result.inserted += inserted
+            result.updated += updated
+        if progress:
+            progress(result)
+
+    db.session.commit()
+    return result
+
+
+def import_item_file(file_path, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+    """Stream a CSV, NDJSON or Excel file through :func:`import_item_frames`"""
+    return import_item_frames(iter_item_frames(file_path, chunk_size), **kwargs)
+
+
+def import_item_frame(df, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+    """Import an in-memory frame whose rows follow a header row"""
+    df = df.set_axis(pd.RangeIndex(2, len(df) + 2))
+    frames = (df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size))
+    return import_item_frames(frames, **kwargs)
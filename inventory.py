@@ -0,0 +1,183 @@
+"""Stock changes and the stock movement ledger.
+
+Stock is decremented with a single conditional UPDATE covering every line
+of a sale (``current_quantity >= qty`` per item), and the rowcount is
+checked, so two tills selling the last unit at the same time cannot both
+succeed: the loser's transaction is rolled back as a whole.
+
+Every change to ``Item.current_quantity`` also appends a row per item to
+``stock_movements`` in the same transaction. ``flask stock-snapshot``
+(run daily, e.g. from cron) stores each item's level at midnight in
+``stock_snapshots``, so the stock at any date is the latest snapshot before
+it plus the movements since, rather than a replay of the whole history.
+"""
+from datetime import datetime, time
+from decimal import Decimal
+
+import click
+from sqlalchemy import and_, case, delete, func, insert, or_, select, update
+
+import counters
+from app import db
+from models import Item, StockMovement, StockSnapshot
+
+
+class InsufficientStock(Exception):
+    """One or more items did not have enough stock for the requested quantity"""
+
+    def __init__(self, quantities):
+        self.quantities = quantities
+        super().__init__("Insufficient stock")
+
+
+def total_quantities(lines):
+    """Sum quantities per item id so repeated lines are checked together"""
+    totals = {}
+    for item_id, quantity in lines:
+        totals[item_id] = totals.get(item_id, Decimal('0')) + quantity
+    return totals
+
+
+def load_stock(item_ids):
+    """``{id: row}`` with product and current_quantity for the given items, in one query"""
+    rows = db.session.execute(
+        select(Item.id, Item.product, Item.current_quantity).where(Item.id.in_(item_ids)))
+    return {row.id: row for row in rows}
+
+
+def find_shortages(quantities, stock=None):
+    """Items in ``{item_id: qty}`` whose stock is below the requested quantity.
+
+    ``stock`` is a :func:`load_stock` result to reuse; it is loaded when not
+    given. Returns ``[(product, available, requested), ...]``.
+    """
+    rows = (stock if stock is not None else load_stock(quantities)).values()
+    return [(row.product, row.current_quantity or Decimal('0'), quantities[row.id])
+            for row in rows if (row.current_quantity or Decimal('0')) < quantities[row.id]]
+
+
+def record_movements(deltas, reason, reference=None):
+    """Append signed ``{item_id: delta}`` movements to the ledger in one statement.
+
+    Every stock change passes through here, so it also moves the items
+    version that the item APIs use as their ETag.
+    """
+    now = datetime.utcnow()
+    rows = [{'item_id': item_id, 'quantity': delta, 'reason': reason, 'reference': reference, 'created_at': now}
+            for item_id, delta in deltas.items() if delta]
+    if rows:
+        db.session.execute(insert(StockMovement), rows)
+        counters.bump_items_version()
+
+
+def decrement_stock(quantities, reason='sale', reference=None):
+    """Atomically subtract ``{item_id: qty}`` from stock in one statement.
+
+    Raises :class:`InsufficientStock` if any item lacked stock at the moment
+    of the update. The caller must roll back, since items that did have
+    enough stock were already decremented in this transaction, and can then
+    use :func:`find_shortages` to report which lines failed.
+    """
+    if not quantities:
+        return
+    qty = case(quantities, value=Item.id)
+    stmt = (update(Item)
+            .where(Item.id.in_(quantities), Item.current_quantity >= qty)
+            .values(current_quantity=Item.current_quantity - qty)
+            .execution_options(synchronize_session=False))
+    result = db.session.execute(stmt)
+    if result.rowcount != len(quantities):
+        raise InsufficientStock(quantities)
+    record_movements({item_id: -qty for item_id, qty in quantities.items()}, reason, reference)
+
+
+def adjust_stock(deltas, reason, reference=None):
+    """Add signed ``{item_id: delta}`` to stock in one statement, without a stock check.
+
+    For stock coming in (purchases, voided sales) and for voided purchases,
+    which must go through even if the stock has since been sold.
+    """
+    deltas = {item_id: delta for item_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    delta = case(deltas, value=Item.id)
+    db.session.execute(update(Item)
+                       .where(Item.id.in_(deltas))
+                       .values(current_quantity=func.coalesce(Item.current_quantity, 0) + delta)
+                       .execution_options(synchronize_session=False))
+    record_movements(deltas, reason, reference)
+
+
+def delete_stock_history(item_id):
+    """Delete an item's movements and snapshots, before the item itself is deleted.
+
+    The foreign keys cascade on Postgres, but SQLite enforces them only with
+    ``PRAGMA foreign_keys=ON``, which stays off here: sale and purchase lines
+    keep pointing at items that were deleted.
+    """
+    db.session.execute(delete(StockMovement).where(StockMovement.item_id == item_id))
+    db.session.execute(delete(StockSnapshot).where(StockSnapshot.item_id == item_id))
+
+
+# ------------------------
+# Stock at a point in time
+# ------------------------
+def stock_levels_at(at, item_ids=None):
+    """``{item_id: quantity}`` as of ``at``: the latest snapshot plus the movements after it.
+
+    Items with no stock history are left out. Pass ``item_ids`` to limit the
+    lookup to a few items.
+    """
+    latest = select(StockSnapshot.item_id, func.max(StockSnapshot.taken_at).label('taken_at')) \
+        .where(StockSnapshot.taken_at <= at)
+    if item_ids is not None:
+        latest = latest.where(StockSnapshot.item_id.in_(item_ids))
+    latest = latest.group_by(StockSnapshot.item_id).subquery()
+
+    levels = dict(db.session.execute(
+        select(StockSnapshot.item_id, StockSnapshot.quantity)
+        .join(latest, and_(StockSnapshot.item_id == latest.c.item_id,
+                           StockSnapshot.taken_at == latest.c.taken_at))).all())
+
+    deltas = (select(StockMovement.item_id, func.sum(StockMovement.quantity))
+              .outerjoin(latest, StockMovement.item_id == latest.c.item_id)
+              .where(StockMovement.created_at <= at,
+                     or_(latest.c.taken_at.is_(None), StockMovement.created_at > latest.c.taken_at))
+              .group_by(StockMovement.item_id))
+    if item_ids is not None:
+        deltas = deltas.where(StockMovement.item_id.in_(item_ids))
+    for item_id, delta in db.session.execute(deltas):
+        levels[item_id] = levels.get(item_id, Decimal('0')) + (delta or Decimal('0'))
+    return levels
+
+
+def stock_at(item_id, at):
+    """One item's stock as of ``at``"""
+    return stock_levels_at(at, [item_id]).get(item_id, Decimal('0'))
+
+
+def take_snapshot(at=None):
+    """Store every item's stock as of ``at`` (default: the start of today, UTC).
+
+    Levels are derived from the previous snapshot and the ledger, so a
+    snapshot of a past moment is exact. Re-running for the same moment
+    replaces it. Returns the number of items snapshotted.
+    """
+    at = at or datetime.combine(datetime.utcnow().date(), time.min)
+    levels = stock_levels_at(at)
+    db.session.execute(delete(StockSnapshot).where(StockSnapshot.taken_at == at))
+    if levels:
+        db.session.execute(insert(StockSnapshot), [{'item_id': item_id, 'taken_at': at, 'quantity': quantity}
+                                                   for item_id, quantity in levels.items()])
+    db.session.commit()
+    return len(levels)
+
+
+def init_app(app):
+    @app.cli.command('stock-snapshot')
+    @click.option('--at', type=click.DateTime(), default=None,
+                  help='Moment to snapshot (UTC); defaults to the start of today.')
+    def stock_snapshot_command(at):
+        """Snapshot every item's stock level; run daily."""
+        count = take_snapshot(at)
+        click.echo(f"Snapshotted stock for {count} items.")
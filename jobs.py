@@ -0,0 +1,80 @@
+"""Background job runner for item imports.
+
+Uploads are recorded in the ``import_jobs`` table and processed by a
+process-local thread pool, so the request that accepted the file returns
+immediately and the browser polls ``/jobs/<id>`` for progress.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+
+from app import db
+from models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Create the worker pool on first use (one pool per web worker process)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=current_app.config['IMPORT_WORKERS'],
+                                           thread_name_prefix='import-job')
+        return _executor
+
+
+def rejects_path_for(job_id):
+    """Absolute path of the rejected-rows CSV written for an import job"""
+    return os.path.abspath(os.path.join(current_app.config['UPLOAD_FOLDER'], 'rejects', f"import_job_{job_id}.csv"))
+
+
+def submit_import(file_path, filename):
+    """Persist a pending import job and queue it on the worker pool"""
+    job = ImportJob(filename=filename, status='pending')
+    db.session.add(job)
+    db.session.commit()
+    get_executor().submit(run_import, current_app._get_current_object(), job.id, file_path)
+    return job
+
+
+def run_import(app, job_id, file_path):
+    """Run one import job inside its own app context and session"""
+    # pandas is only imported by the import path, so worker boot does not pay for it
+    from utils import process_import_file
+
+    with app.app_context():
+        job = db.session.get(ImportJob, job_id)
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        def progress(result):
+            job.total_rows = result.success_count + result.error_count
+            job.rows_processed = result.success_count
+            job.error_count = result.error_count
+            db.session.commit()
+
+        rejects_path = rejects_path_for(job_id)
+        try:
+            success, message = process_import_file(file_path, commit_each_chunk=True, progress=progress,
+                                                   rejects_path=rejects_path)
+        except Exception as e:
+            logger.exception("Import job %s crashed", job_id)
+            db.session.rollback()
+            success, message = False, f"Error processing file: {str(e)}"
+
+        job = db.session.get(ImportJob, job_id)
+        job.status = 'completed' if success else 'failed'
+        job.message = message
+        if os.path.exists(rejects_path):
+            job.rejects_path = rejects_path
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
@@ -0,0 +1,191 @@
+"""Sales and purchase ledgers, fed through a transactional outbox.
+
+Saving or deleting a sale/purchase adds a posting to ``ledger_outbox`` in
+the same transaction, which costs the checkout one extra INSERT. A
+background writer thread per process drains the outbox in batches into
+``sales_ledger`` / ``purchase_ledger``: it claims a batch by stamping it
+with a batch id, copies the batch into the ledgers with one multi-row
+INSERT per ledger and deletes it, all in one transaction. Several writers
+(one per web worker) can run at once without posting a row twice.
+
+The writer runs outside any request, so on SQLite its transactions begin
+IMMEDIATE like a checkout's (see sqlite_profile.py). A drain and a
+checkout queue on the busy timeout for each other. A drain never commits
+between a checkout's reads and its writes. Each wake-up first looks for
+pending rows with a plain read, so an idle writer never takes the lock.
+
+Deleting a document posts a reversing entry (negative amount), so the
+ledgers stay append-only.
+"""
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+
+import click
+from sqlalchemy import delete, insert, select, update
+
+from app import db
+from db_routing import reading
+from models import Customer, Vendor, Sale, Purchase, SalesLedger, PurchaseLedger, LedgerOutbox
+
+logger = logging.getLogger(__name__)
+
+# outbox ``ledger`` value -> (ledger model, its document number column, its source FK column, source model)
+LEDGERS = {
+    'sales': (SalesLedger, 'bill_no', 'sale_id', Sale),
+    'purchases': (PurchaseLedger, 'invoice_no', 'purchase_id', Purchase),
+}
+CASH_PARTICULAR = 'Cash'
+
+
+def _queue(ledger, source_id, date, particular, document_number, amount):
+    # Legacy documents may have no date; post them as of now, as migration 0004 did
+    db.session.add(LedgerOutbox(ledger=ledger, source_id=source_id, date=date or datetime.utcnow(),
+                                particular=particular or CASH_PARTICULAR,
+                                document_number=document_number, amount=amount))
+
+
+def queue_sale(sale, reverse=False):
+    """Queue the ledger posting for a flushed sale (or its reversal when it is deleted)"""
+    name = db.session.scalar(select(Customer.name).where(Customer.id == sale.customer_id)) \
+        if sale.customer_id else None
+    amount = -sale.total_amount if reverse else sale.total_amount
+    _queue('sales', sale.id, sale.sale_date, name, sale.bill_number, amount)
+    if reverse:
+        # Keep already-posted rows once the sale is gone (sale_id is a foreign key)
+        db.session.execute(update(SalesLedger).where(SalesLedger.sale_id == sale.id).values(sale_id=None))
+
+
+def queue_purchase(purchase, reverse=False):
+    """Queue the ledger posting for a flushed purchase (or its reversal when it is deleted)"""
+    name = db.session.scalar(select(Vendor.name).where(Vendor.id == purchase.vendor_id)) \
+        if purchase.vendor_id else None
+    amount = -purchase.total_amount if reverse else purchase.total_amount
+    _queue('purchases', purchase.id, purchase.purchase_date, name, purchase.invoice_number, amount)
+    if reverse:
+        db.session.execute(update(PurchaseLedger).where(PurchaseLedger.purchase_id == purchase.id)
+                           .values(purchase_id=None))
+
+
+def queue_corrections(name, entries):
+    """Queue correcting postings (signed amount differences) for documents whose totals were rewritten.
+
+    ``entries`` are dicts with ``source_id``, ``date``, ``particular``,
+    ``document_number`` and ``amount``; they are added in one statement.
+    """
+    if entries:
+        db.session.execute(insert(LedgerOutbox), [
+            dict(entry, ledger=name, particular=entry['particular'] or CASH_PARTICULAR) for entry in entries])
+
+
+def drain_batch(batch_size):
+    """Post up to ``batch_size`` outbox rows to the ledgers; returns how many were posted"""
+    batch_id = uuid.uuid4().hex
+    pending = (select(LedgerOutbox.id).where(LedgerOutbox.batch_id.is_(None))
+               .order_by(LedgerOutbox.id).limit(batch_size))
+    # Claim rows atomically; a concurrent writer skips rows claimed here
+    db.session.execute(update(LedgerOutbox)
+                       .where(LedgerOutbox.id.in_(pending.scalar_subquery()), LedgerOutbox.batch_id.is_(None))
+                       .values(batch_id=batch_id)
+                       .execution_options(synchronize_session=False))
+    rows = db.session.execute(select(LedgerOutbox.ledger, LedgerOutbox.source_id, LedgerOutbox.date,
+                                     LedgerOutbox.particular, LedgerOutbox.document_number,
+                                     LedgerOutbox.amount)
+                              .where(LedgerOutbox.batch_id == batch_id)
+                              .order_by(LedgerOutbox.id)).all()
+    if not rows:
+        db.session.rollback()
+        return 0
+
+    for name, (model, number_column, source_column, source_model) in LEDGERS.items():
+        entries = [row for row in rows if row.ledger == name]
+        if not entries:
+            continue
+        # Documents deleted before their posting was drained are posted without the link
+        live = set(db.session.scalars(select(source_model.id).where(
+            source_model.id.in_({row.source_id for row in entries if row.source_id is not None}))))
+        db.session.execute(insert(model), [{
+            'date': row.date,
+            'particular': row.particular,
+            number_column: row.document_number,
+            'amount': row.amount,
+            source_column: row.source_id if row.source_id in live else None,
+        } for row in entries])
+
+    db.session.execute(delete(LedgerOutbox).where(LedgerOutbox.batch_id == batch_id))
+    db.session.commit()
+    return len(rows)
+
+
+def drain(batch_size=500):
+    """Drain the whole outbox, one batch per transaction"""
+    total = 0
+    while True:
+        posted = drain_batch(batch_size)
+        total += posted
+        if posted < batch_size:
+            return total
+
+
+def has_pending():
+    """Whether the outbox has rows to post, read without taking the write lock"""
+    with reading():
+        try:
+            return db.session.scalar(
+                select(LedgerOutbox.id).where(LedgerOutbox.batch_id.is_(None)).limit(1)) is not None
+        finally:
+            db.session.rollback()
+
+
+def drain_pending(batch_size=500):
+    """:func:`drain` if anything is pending; what the writer runs on every wake-up"""
+    return drain(batch_size) if has_pending() else 0
+
+
+_writer = {'pid': None, 'wake': threading.Event()}
+_writer_lock = threading.Lock()
+
+
+def _run_writer(app):
+    # No request context here, so each drain transaction takes the SQLite write lock up front
+    wake = _writer['wake']
+    with app.app_context():
+        while True:
+            wake.wait(app.config['LEDGER_DRAIN_INTERVAL'])
+            wake.clear()
+            try:
+                drain_pending(app.config['LEDGER_BATCH_SIZE'])
+            except Exception:
+                logger.exception("Ledger writer failed; retrying")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+
+def start_writer(app):
+    """Start this process's background writer if it is not running yet"""
+    with _writer_lock:
+        if _writer['pid'] == os.getpid():
+            return
+        _writer['pid'] = os.getpid()
+        threading.Thread(target=_run_writer, args=(app,), name='ledger-writer', daemon=True).start()
+
+
+def wake_writer():
+    """Ask the writer to drain now instead of at its next interval"""
+    _writer['wake'].set()
+
+
+def init_app(app):
+    if app.config['LEDGER_WRITER']:
+        # Started lazily so each web worker process gets its own thread
+        @app.before_request
+        def ensure_ledger_writer():
+            start_writer(app)
+
+    @app.cli.command('drain-ledger')
+    def drain_ledger_command():
+        """Post every pending ledger outbox entry."""
+        click.echo(f"Posted {drain(app.config['LEDGER_BATCH_SIZE'])} ledger entries.")
@@ -0,0 +1,181 @@
+"""Logging that never blocks a request on I/O.
+
+Every logger writes into a bounded in-memory queue through a
+``QueueHandler`` on the root logger. A ``QueueListener`` thread takes
+records off the queue and writes them to stderr as one JSON object per
+line (``LOG_FORMAT=text`` for plain lines in development). If the queue is
+full a record is dropped and counted instead of making the request wait.
+The drop count is reported by the next record that gets through.
+
+Records logged during a request carry its ``request_id`` (from
+``X-Request-ID`` or generated, and echoed in the response), method, path,
+endpoint and user. Anything passed as ``extra=`` becomes a JSON field.
+
+Verbose request payloads (form contents etc.) are only logged for a
+sample of requests. :func:`log_payload` is true for ``LOG_PAYLOAD_SAMPLE_RATE``
+of them, so a sampled request logs all of its payloads. ``LOG_LEVEL`` sets
+the root level, and ``LOG_LEVELS=name=LEVEL,...`` overrides single loggers.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request, session
+
+# Attributes every LogRecord has; anything else on a record came from ``extra=``
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_state = {'listener': None, 'handler': None}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain lines with the request id, for reading logs in a terminal"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        return super().format(record)
+
+
+class RequestQueueHandler(QueueHandler):
+    """Puts records on the queue without blocking, stamped with the current request"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Resolve the message and traceback on the calling thread: the arguments may change or
+        # stop being valid once the request moves on. Keep exc_text apart from the message.
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+            record.endpoint = request.endpoint
+            record.user = session.get('username')
+        if self.dropped:
+            with self._dropped_lock:
+                record.dropped_records, self.dropped = self.dropped, 0
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class BlockingStopListener(QueueListener):
+    """QueueListener whose stop waits for room in a full queue instead of raising"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def log_payload():
+    """Whether this request was sampled for verbose payload logging"""
+    return has_request_context() and g.get('log_payload', False)
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level='INFO', fmt='json', queue_size=10000, levels=None):
+    """Route the root logger through the queue; safe to call again (the old listener is stopped)"""
+    stop_logging()
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(TextFormatter() if fmt == 'text' else JsonFormatter())
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = RequestQueueHandler(log_queue)
+    listener = BlockingStopListener(log_queue, stream, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    for name, logger_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    listener.start()
+    _state.update(listener=listener, handler=handler)
+
+
+def stop_logging():
+    """Flush the queue and stop the listener thread"""
+    listener = _state['listener']
+    if listener is not None:
+        listener.stop()
+        logging.getLogger().removeHandler(_state['handler'])
+        _state.update(listener=None, handler=None)
+
+
+atexit.register(stop_logging)
+
+
+def init_app(app):
+    app.config.setdefault('LOG_LEVEL', 'INFO')
+    app.config.setdefault('LOG_LEVELS', '')
+    app.config.setdefault('LOG_FORMAT', 'json')
+    app.config.setdefault('LOG_QUEUE_SIZE', 10000)
+    app.config.setdefault('LOG_PAYLOAD_SAMPLE_RATE', 0.01)
+
+    configure_logging(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'], app.config['LOG_QUEUE_SIZE'],
+                      _parse_levels(app.config['LOG_LEVELS']))
+
+    @app.before_request
+    def tag_request():
+        g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+        g.log_payload = random.random() < app.config['LOG_PAYLOAD_SAMPLE_RATE']
+
+    @app.after_request
+    def echo_request_id(response):
+        if 'request_id' in g:
+            response.headers.setdefault('X-Request-ID', g.request_id)
+        return response
@@ -0,0 +1,184 @@
+"""Per-request timings, a slow-query log and Prometheus metrics.
+
+Every request records its wall time, how many SQL statements it ran and
+how long they took (``before/after_cursor_execute`` on the app's engines)
+and how long ``render_template`` took. For the users who may read
+``/metrics`` (below) these go back to the browser as a ``Server-Timing``
+header, so they show up in the devtools network panel:
+
+    Server-Timing: db;dur=12.4;desc="9 queries", tpl;dur=3.1, total;dur=21.7
+
+A statement slower than ``SLOW_QUERY_MS`` is logged on the
+``metrics.slow_queries`` logger with the endpoint that ran it. Parameters
+are not logged.
+
+``/metrics`` serves per-endpoint histograms in the Prometheus text format.
+They are kept per worker process and reset when it restarts. It shows
+route latencies and SQL timings, so it is closed by default. A user
+logged in as one of ``METRICS_USERS`` (``admin`` by default) can see it,
+and so can a scraper sending ``Authorization: Bearer <METRICS_TOKEN>``.
+For a streamed response (the exports) the timings stop when the body
+starts streaming.
+"""
+import bisect
+import hmac
+import logging
+import threading
+import time
+
+from flask import (Response, abort, before_render_template, current_app, g, has_request_context, request,
+                   session, template_rendered)
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('metrics.slow_queries')
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+MAX_LOGGED_STATEMENT = 2000
+
+
+class Histogram:
+    """Cumulative-bucket histogram per endpoint, as Prometheus expects"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}  # endpoint -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, endpoint, value):
+        series = self.series.get(endpoint)
+        if series is None:
+            series = self.series[endpoint] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for endpoint, series in sorted(self.series.items()):
+            label = f'endpoint="{endpoint}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+_histograms = {
+    'wall': Histogram('http_request_duration_seconds', 'Wall time of a request.', SECONDS_BUCKETS),
+    'db': Histogram('http_request_db_seconds', 'Time spent in SQL statements per request.', SECONDS_BUCKETS),
+    'queries': Histogram('http_request_db_queries', 'SQL statements run per request.', QUERY_COUNT_BUCKETS),
+    'template': Histogram('http_request_template_seconds', 'Time spent rendering templates per request.',
+                          SECONDS_BUCKETS),
+}
+_slow_queries = {}  # endpoint -> count
+_lock = threading.Lock()
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def can_view_metrics():
+    """Whether this request may read /metrics: a matching bearer token or a user in METRICS_USERS"""
+    config = current_app.config
+    token = config['METRICS_TOKEN']
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return session.get('username') in config['METRICS_USERS']
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        lines = []
+        for histogram in _histograms.values():
+            lines.extend(histogram.render())
+        lines += ["# HELP db_slow_queries_total SQL statements slower than SLOW_QUERY_MS.",
+                  "# TYPE db_slow_queries_total counter"]
+        lines.extend(f'db_slow_queries_total{{endpoint="{endpoint}"}} {count}'
+                     for endpoint, count in sorted(_slow_queries.items()))
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app, db):
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('SERVER_TIMING', True)
+    app.config.setdefault('SLOW_QUERY_MS', 200)
+    app.config.setdefault('METRICS_TOKEN', None)
+    app.config.setdefault('METRICS_USERS', {'admin'})
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started_at'] = time.perf_counter()
+
+    def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+        started_at = conn.info.pop('query_started_at', None)
+        if started_at is None:
+            return
+        elapsed = time.perf_counter() - started_at
+        in_request = has_request_context()
+        if in_request:
+            g.db_queries = g.get('db_queries', 0) + 1
+            g.db_time = g.get('db_time', 0.0) + elapsed
+        # The engine belongs to this app, so its config applies even outside an app context
+        if elapsed * 1000 >= app.config['SLOW_QUERY_MS']:
+            endpoint = _endpoint() if in_request else None
+            slow_query_logger.warning("Slow query (%.1f ms) in %s: %s", elapsed * 1000, endpoint or 'background',
+                                      statement[:MAX_LOGGED_STATEMENT])
+            if endpoint:
+                with _lock:
+                    _slow_queries[endpoint] = _slow_queries.get(endpoint, 0) + 1
+
+    # Per engine, not on the Engine class: another create_app() in the process gets its own listeners
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', start_query_timer)
+        event.listen(engine, 'after_cursor_execute', stop_query_timer)
+
+    @before_render_template.connect_via(app)
+    def start_template_timer(sender, template, context, **extra):
+        g.setdefault('template_starts', []).append(time.perf_counter())
+
+    @template_rendered.connect_via(app)
+    def stop_template_timer(sender, template, context, **extra):
+        starts = g.get('template_starts')
+        if starts:
+            elapsed = time.perf_counter() - starts.pop()
+            # A template rendered from inside another's render is already counted by the outer one
+            if not starts:
+                g.template_time = g.get('template_time', 0.0) + elapsed
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started_at = time.perf_counter()
+
+    @app.after_request
+    def record_request_timings(response):
+        started_at = g.get('request_started_at')
+        if started_at is None:
+            return response
+        wall = time.perf_counter() - started_at
+        queries, db_time, template_time = g.get('db_queries', 0), g.get('db_time', 0.0), g.get('template_time', 0.0)
+        endpoint = _endpoint()
+        with _lock:
+            _histograms['wall'].observe(endpoint, wall)
+            _histograms['db'].observe(endpoint, db_time)
+            _histograms['queries'].observe(endpoint, queries)
+            _histograms['template'].observe(endpoint, template_time)
+        # The same numbers /metrics serves, so only for whoever may read it
+        if current_app.config['SERVER_TIMING'] and can_view_metrics():
+            response.headers.add('Server-Timing', f'db;dur={db_time * 1000:.1f};desc="{queries} queries", '
+                                                  f'tpl;dur={template_time * 1000:.1f}, total;dur={wall * 1000:.1f}')
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        if not can_view_metrics():
+            abort(403 if 'user_id' in session else 401)
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
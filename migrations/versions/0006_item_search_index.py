@@ -0,0 +1,84 @@
+"""item search index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-16 21:12:40.517302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = 'sn, product, brand, category'
+
+# External-content FTS5 table over items; the triggers keep it in step with every
+# write to items, ORM or Core. '-_./' are kept inside tokens so serial numbers match whole.
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE items_fts USING fts5(sn, product, brand, category, content='items', "
+    "content_rowid='id', tokenize=\"unicode61 tokenchars '-_./'\", prefix='2 3')",
+    f"""CREATE TRIGGER items_fts_insert AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts(rowid, {SEARCH_COLUMNS}) VALUES (new.id, new.sn, new.product, new.brand, new.category);
+    END""",
+    f"""CREATE TRIGGER items_fts_delete AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, {SEARCH_COLUMNS})
+        VALUES ('delete', old.id, old.sn, old.product, old.brand, old.category);
+    END""",
+    f"""CREATE TRIGGER items_fts_update AFTER UPDATE OF {SEARCH_COLUMNS} ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, {SEARCH_COLUMNS})
+        VALUES ('delete', old.id, old.sn, old.product, old.brand, old.category);
+        INSERT INTO items_fts(rowid, {SEARCH_COLUMNS}) VALUES (new.id, new.sn, new.product, new.brand, new.category);
+    END""",
+    "INSERT INTO items_fts(items_fts) VALUES ('rebuild')",
+]
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS items_fts_update",
+    "DROP TRIGGER IF EXISTS items_fts_delete",
+    "DROP TRIGGER IF EXISTS items_fts_insert",
+    "DROP TABLE IF EXISTS items_fts",
+]
+
+# Trigram GIN index matching search.search_expression(), used by ILIKE '%term%'
+POSTGRES_UPGRADE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX ix_items_search_trgm ON items USING gin "
+    "((coalesce(sn, '') || ' ' || coalesce(product, '') || ' ' || coalesce(brand, '') || ' ' "
+    "|| coalesce(category, '')) gin_trgm_ops)",
+]
+POSTGRES_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_items_search_trgm",
+]
+
+
+def _has_fts5(bind):
+    return bool(bind.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar())
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        # Without FTS5 compiled in, search falls back to LIKE
+        statements = SQLITE_UPGRADE if _has_fts5(bind) else []
+    elif bind.dialect.name == 'postgresql':
+        statements = POSTGRES_UPGRADE
+    else:
+        statements = []
+    for statement in statements:
+        op.execute(sa.text(statement))
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        statements = SQLITE_DOWNGRADE
+    elif bind.dialect.name == 'postgresql':
+        statements = POSTGRES_DOWNGRADE
+    else:
+        statements = []
+    for statement in statements:
+        op.execute(sa.text(statement))
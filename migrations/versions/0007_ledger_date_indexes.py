@@ -0,0 +1,33 @@
+"""ledger date indexes
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-16 23:41:07.204519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The ledger pages list entries newest first
+    with op.batch_alter_table('purchase_ledger', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_purchase_ledger_date'), ['date'], unique=False)
+
+    with op.batch_alter_table('sales_ledger', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sales_ledger_date'), ['date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sales_ledger', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sales_ledger_date'))
+
+    with op.batch_alter_table('purchase_ledger', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_purchase_ledger_date'))
@@ -3,16 +3,8 @@ from datetime import datetime
 from sqlalchemy import Numeric
 from werkzeug.security import generate_password_hash, check_password_hash
 
-# Remove circular import - db will be imported in app.py
-# from app import db
-
-# Global db reference that will be set later
-db = None
-
-def set_db(db_instance):
-    """Set the database instance after models are imported"""
-    global db
-    db = db_instance
+# app.py creates ``db`` before importing this module, so the import is safe
+from app import db
 
 # ------------------------
 # User Model
@@ -37,7 +29,7 @@ class User(db.Model):
 class Customer(db.Model):
     __tablename__ = 'customers'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
     email = db.Column(db.String(120))
     phone = db.Column(db.String(20))
     address = db.Column(db.Text)
@@ -51,7 +43,7 @@ class Customer(db.Model):
 class Vendor(db.Model):
     __tablename__ = 'vendors'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
     email = db.Column(db.String(120))
     phone = db.Column(db.String(20))
     address = db.Column(db.Text)
@@ -70,7 +62,7 @@ class Item(db.Model):
     __tablename__ = 'items'
     id = db.Column(db.Integer, primary_key=True)
     sn = db.Column(db.String(50), unique=True, nullable=False)
-    product = db.Column(db.String(100), nullable=False)
+    product = db.Column(db.String(100), nullable=False, index=True)
     category = db.Column(db.String(50))
     brand = db.Column(db.String(50))
     cp = db.Column(Numeric(10, 2), nullable=False)  # Cost Price
@@ -78,7 +70,7 @@ class Item(db.Model):
     sp = db.Column(Numeric(10, 2), nullable=False)  # Selling Price
     uom = db.Column(db.String(20), nullable=False)  # Unit of Measure
     opening_quantity = db.Column(Numeric(10, 2), default=0.00)
-    current_quantity = db.Column(Numeric(10, 2), default=0.00)
+    current_quantity = db.Column(Numeric(10, 2), default=0.00, index=True)  # low-stock filter
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def inc_quantity(self, qty):
@@ -92,7 +84,7 @@ class Sale(db.Model):
     __tablename__ = 'sales'
     id = db.Column(db.Integer, primary_key=True)
     bill_number = db.Column(db.String(50), unique=True, nullable=False)
-    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'))
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), index=True)
     subtotal_amount = db.Column(Numeric(10, 2), default=0.00, nullable=False)
     discount = db.Column(Numeric(10, 2), default=0.00)
     taxable_amount = db.Column(Numeric(10, 2), default=0.00, nullable=False)
@@ -104,7 +96,7 @@ class Sale(db.Model):
     payment_type = db.Column(db.String(20), default='cash')  # cash, credit, bank
     payment_account = db.Column(db.String(100))
     sales_account = db.Column(db.String(100))
-    sale_date = db.Column(db.DateTime, default=datetime.utcnow)
+    sale_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     notes = db.Column(db.Text)
 
     customer = db.relationship('Customer', backref='sales')
@@ -123,8 +115,8 @@ class Sale(db.Model):
 class SaleItem(db.Model):
     __tablename__ = 'sale_items'
     id = db.Column(db.Integer, primary_key=True)
-    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False)
-    item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False, index=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False, index=True)
     quantity = db.Column(Numeric(10, 2), default=0.00, nullable=False)
     unit_price = db.Column(Numeric(10, 2), default=0.00, nullable=False)
     total_price = db.Column(Numeric(10, 2), default=0.00, nullable=False)
@@ -141,7 +133,7 @@ class Purchase(db.Model):
     __tablename__ = 'purchases'
     id = db.Column(db.Integer, primary_key=True)
     invoice_number = db.Column(db.String(50), unique=True, nullable=False)
-    vendor_id = db.Column(db.Integer, db.ForeignKey('vendors.id'))
+    vendor_id = db.Column(db.Integer, db.ForeignKey('vendors.id'), index=True)
     subtotal_amount = db.Column(Numeric(10, 2), default=0.00, nullable=False)
     discount = db.Column(Numeric(10, 2), default=0.00)
     taxable_amount = db.Column(Numeric(10, 2), default=0.00, nullable=False)
@@ -153,7 +145,7 @@ class Purchase(db.Model):
     payment_type = db.Column(db.String(20), default='cash')
     payment_account = db.Column(db.String(100))
     purchase_account = db.Column(db.String(100))
-    purchase_date = db.Column(db.DateTime, default=datetime.utcnow)
+    purchase_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     notes = db.Column(db.Text)
 
     vendor = db.relationship('Vendor', backref='purchases')
@@ -171,8 +163,8 @@ class Purchase(db.Model):
 class PurchaseItem(db.Model):
     __tablename__ = 'purchase_items'
     id = db.Column(db.Integer, primary_key=True)
-    purchase_id = db.Column(db.Integer, db.ForeignKey('purchases.id'), nullable=False)
-    item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False)
+    purchase_id = db.Column(db.Integer, db.ForeignKey('purchases.id'), nullable=False, index=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False, index=True)
     quantity = db.Column(Numeric(10, 2), default=0.00, nullable=False)
     unit_price = db.Column(Numeric(10, 2), default=0.00, nullable=False)
     total_price = db.Column(Numeric(10, 2), default=0.00, nullable=False)
@@ -188,7 +180,7 @@ class PurchaseItem(db.Model):
 class PurchaseLedger(db.Model):
     __tablename__ = 'purchase_ledger'
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     particular = db.Column(db.String(200), nullable=False)
     invoice_no = db.Column(db.String(50), nullable=False)
     amount = db.Column(Numeric(10, 2), nullable=False)
@@ -199,7 +191,7 @@ class PurchaseLedger(db.Model):
 class SalesLedger(db.Model):
     __tablename__ = 'sales_ledger'
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     particular = db.Column(db.String(200), nullable=False)
     bill_no = db.Column(db.String(50), nullable=False)
     amount = db.Column(Numeric(10, 2), nullable=False)
@@ -217,3 +209,133 @@ class Settings(db.Model):
     value = db.Column(db.String(200), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# ------------------------
+# Background import jobs
+# ------------------------
+class ImportJob(db.Model):
+    __tablename__ = 'import_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, running, completed, failed
+    total_rows = db.Column(db.Integer, default=0)
+    rows_processed = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    message = db.Column(db.Text)
+    rejects_path = db.Column(db.String(500))  # CSV of rejected rows, if any
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def finished(self):
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'total_rows': self.total_rows or 0,
+            'rows_processed': self.rows_processed or 0,
+            'error_count': self.error_count or 0,
+            'message': self.message,
+            'has_rejects': bool(self.rejects_path),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+# ------------------------
+# Dashboard counters
+# ------------------------
+class StatCounter(db.Model):
+    """Running totals maintained on write (see counters.py)"""
+    __tablename__ = 'stat_counters'
+    name = db.Column(db.String(50), primary_key=True)  # e.g. 'sales', 'revenue:2024-01-31'
+    value = db.Column(Numeric(14, 2), default=0, nullable=False)
+
+
+# ------------------------
+# Document number sequences
+# ------------------------
+class NumberSequence(db.Model):
+    """Next unallocated number per document type and fiscal year (see numbering.py)"""
+    __tablename__ = 'number_sequences'
+    name = db.Column(db.String(50), primary_key=True)  # e.g. 'SALE:2024-25'
+    next_value = db.Column(db.Integer, nullable=False, default=1)
+
+
+# ------------------------
+# Stock ledger
+# ------------------------
+class StockMovement(db.Model):
+    """Append-only record of every change to an item's stock (see inventory.py)"""
+    __tablename__ = 'stock_movements'
+    __table_args__ = (db.Index('ix_stock_movements_item_id_created_at', 'item_id', 'created_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id', ondelete='CASCADE'), nullable=False)
+    quantity = db.Column(Numeric(12, 2), nullable=False)  # signed: + stock in, - stock out
+    reason = db.Column(db.String(20), nullable=False)  # opening, sale, sale_void, purchase, purchase_void, import
+    reference = db.Column(db.String(50))  # bill / invoice number
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class StockSnapshot(db.Model):
+    """An item's stock level at a point in time, derived from the ledger"""
+    __tablename__ = 'stock_snapshots'
+    __table_args__ = (db.UniqueConstraint('item_id', 'taken_at', name='uq_stock_snapshots_item_id_taken_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id', ondelete='CASCADE'), nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False)
+    quantity = db.Column(Numeric(12, 2), nullable=False)
+
+
+# ------------------------
+# Ledger outbox
+# ------------------------
+class LedgerOutbox(db.Model):
+    """Ledger postings written with their sale/purchase, drained into the ledgers (see ledger.py)"""
+    __tablename__ = 'ledger_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    ledger = db.Column(db.String(10), nullable=False)  # 'sales' or 'purchases'
+    source_id = db.Column(db.Integer)  # sale / purchase id; no FK, the document may be deleted before posting
+    date = db.Column(db.DateTime, nullable=False)
+    particular = db.Column(db.String(200), nullable=False)
+    document_number = db.Column(db.String(50), nullable=False)
+    amount = db.Column(Numeric(10, 2), nullable=False)
+    batch_id = db.Column(db.String(32), index=True)  # set when a writer claims the row
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ------------------------
+# Reporting rollups
+# ------------------------
+# Maintained on sale/purchase create and delete (see rollups.py); ``kind`` is 'sales' or 'purchases'
+class RollupDayItem(db.Model):
+    __tablename__ = 'rollup_day_item'
+    kind = db.Column(db.String(10), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(Numeric(14, 2), default=0, nullable=False)
+    amount = db.Column(Numeric(14, 2), default=0, nullable=False)  # sum of line totals
+
+
+class RollupDayParty(db.Model):
+    __tablename__ = 'rollup_day_party'
+    kind = db.Column(db.String(10), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    party_id = db.Column(db.Integer, primary_key=True)  # customer / vendor id, 0 for cash
+    documents = db.Column(db.Integer, default=0, nullable=False)
+    amount = db.Column(Numeric(14, 2), default=0, nullable=False)  # sum of bill totals
+
+
+class RollupMonthCategory(db.Model):
+    __tablename__ = 'rollup_month_category'
+    kind = db.Column(db.String(10), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)  # first day of the month
+    category = db.Column(db.String(50), primary_key=True)  # '' for uncategorised items
+    quantity = db.Column(Numeric(14, 2), default=0, nullable=False)
+    amount = db.Column(Numeric(14, 2), default=0, nullable=False)
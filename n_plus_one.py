@@ -0,0 +1,71 @@
+"""Lazy-load (N+1 query) detector.
+
+Counts relationship lazy loads per request, keyed by relationship, and
+reports any relationship lazily loaded more than ``NPLUSONE_THRESHOLD``
+times in one request. Enabled with ``NPLUSONE_DETECT``; left unset it
+follows debug mode at request time, so ``FLASK_DEBUG=1`` and an
+``app.run(debug=True)`` after the app was built both turn it on. With
+``NPLUSONE_RAISE`` set the offending load raises :class:`NPlusOneError`
+instead of only being logged, which makes regressions fail loudly under
+the test client.
+"""
+import logging
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class NPlusOneError(RuntimeError):
+    """A relationship was lazily loaded too many times in one request"""
+
+
+def _relationship_name(orm_execute_state):
+    path = orm_execute_state.loader_strategy_path
+    if path is not None and len(path):
+        prop = path[-1]
+        return f"{prop.parent.class_.__name__}.{prop.key}"
+    return orm_execute_state.lazy_loaded_from.class_.__name__
+
+
+def _detecting():
+    detect = current_app.config['NPLUSONE_DETECT']
+    return current_app.debug if detect is None else detect
+
+
+def count_lazy_loads(orm_execute_state):
+    if not has_request_context() or not _detecting():
+        return
+    if not orm_execute_state.is_select or orm_execute_state.lazy_loaded_from is None:
+        return
+    config = current_app.config
+    loads = g.setdefault('lazy_loads', Counter())
+    name = _relationship_name(orm_execute_state)
+    loads[name] += 1
+    if loads[name] == config['NPLUSONE_THRESHOLD'] + 1 and config['NPLUSONE_RAISE']:
+        raise NPlusOneError(f"{name} lazily loaded more than "
+                            f"{config['NPLUSONE_THRESHOLD']} times in {request.endpoint}")
+
+
+def init_app(app):
+    app.config.setdefault('NPLUSONE_DETECT', None)
+    app.config.setdefault('NPLUSONE_THRESHOLD', 10)
+    app.config.setdefault('NPLUSONE_RAISE', False)
+
+    # Sessions are shared by every app in the process, so the listener is registered once and
+    # reads the settings of whichever app is handling the request
+    if not event.contains(Session, 'do_orm_execute', count_lazy_loads):
+        event.listen(Session, 'do_orm_execute', count_lazy_loads)
+
+    @app.after_request
+    def report_lazy_loads(response):
+        loads = g.pop('lazy_loads', None)
+        if loads:
+            threshold = current_app.config['NPLUSONE_THRESHOLD']
+            for name, count in loads.items():
+                if count > threshold:
+                    logger.warning("Possible N+1: %s lazily loaded %d times in %s", name, count, request.endpoint)
+        return response
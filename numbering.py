@@ -0,0 +1,98 @@
+"""Collision-free bill and invoice numbers.
+
+Numbers come from the ``number_sequences`` table, one row per document
+type and fiscal year. Each worker process reserves a block of
+``DOCUMENT_NUMBER_BLOCK_SIZE`` numbers at a time in its own short
+transaction and hands them out from memory, so concurrent sales never
+produce the same number and most allocations touch no database at all.
+
+Numbers are unique but not gap-free or strictly ordered across workers:
+a block reserved by a process that exits, or a number taken by a sale
+that is rolled back or rejected, is never reused.
+
+On SQLite a number has to be taken before the request's session runs its
+first query. Once the session has read, its transaction holds a WAL
+snapshot (or, for a write request, the write lock), and the block
+reservation committing on another connection either waits on that lock
+until the busy timeout or makes the request's own write fail with
+"database is locked". :func:`next_number` refuses to run inside an open
+session transaction so the mistake shows up on the first call.
+"""
+import os
+import threading
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import NumberSequence
+
+_blocks = {}
+_blocks_lock = threading.Lock()
+_blocks_pid = None
+
+
+def fiscal_year(day=None):
+    """Label of the fiscal year containing ``day``, e.g. '2024' or '2024-25'"""
+    # Documents are dated in UTC, so the number's year must be too
+    day = day or datetime.utcnow().date()
+    month, first_day = (int(part) for part in current_app.config['FISCAL_YEAR_START'].split('-'))
+    start_year = day.year if (day.month, day.day) >= (month, first_day) else day.year - 1
+    if (month, first_day) == (1, 1):
+        return str(start_year)
+    return f"{start_year}-{(start_year + 1) % 100:02d}"
+
+
+def _reserve_block(name, size):
+    """Take ``size`` numbers from the sequence row, committing immediately.
+
+    Runs on its own connection so the reservation survives a rollback of
+    the caller's transaction. Returns the first number of the block.
+    """
+    table = NumberSequence.__table__
+    for _ in range(2):
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                update(table).where(table.c.name == name).values(next_value=table.c.next_value + size))
+            if result.rowcount:
+                return connection.scalar(select(table.c.next_value).where(table.c.name == name)) - size
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(table).values(name=name, next_value=1 + size))
+            return 1
+        except IntegrityError:
+            # Another process created the row first; take a block from it instead
+            continue
+    raise RuntimeError(f"Could not reserve document numbers for {name}")
+
+
+def next_number(doc_type, day=None):
+    """Allocate the next number for ``doc_type`` ('SALE' or 'PUR'), e.g. 'SALE-2024-25-000042'.
+
+    Call it before the session runs any query in this transaction: a refill
+    commits on a separate connection, which on SQLite conflicts with any
+    transaction the session already has open, even one that has only read.
+    """
+    global _blocks_pid
+    if db.session().in_transaction():
+        raise RuntimeError("next_number() must be called before the session's first query in the transaction")
+    config = current_app.config
+    prefix = config['DOCUMENT_NUMBER_PREFIXES'].get(doc_type, doc_type)
+    year = fiscal_year(day)
+    name = f"{doc_type}:{year}"
+
+    with _blocks_lock:
+        if _blocks_pid != os.getpid():
+            # Blocks reserved before a fork belong to the parent process
+            _blocks.clear()
+            _blocks_pid = os.getpid()
+        block = _blocks.get(name)
+        if block is None or block[0] >= block[1]:
+            size = max(int(config['DOCUMENT_NUMBER_BLOCK_SIZE']), 1)
+            first = _reserve_block(name, size)
+            block = _blocks[name] = [first, first + size]
+        number = block[0]
+        block[0] += 1
+    return f"{prefix}-{year}-{number:06d}"
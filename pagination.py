@@ -0,0 +1,188 @@
+"""Keyset pagination for the list pages.
+
+Pages are addressed by an opaque cursor holding the sort value and id of
+the last (or first) row shown, so fetching page N costs the same as page 1
+and rows inserted meanwhile do not shift the pages. Queries are plain
+``select()`` projections, so only the displayed columns are loaded.
+
+A nullable sort column (a customer's balance, an item's stock, a sale's
+date) sorts NULL as its lowest value, first ascending and last
+descending, on every database. A row-value comparison against NULL matches nothing, so such a
+column is paged as its NULL rows and its other rows, one query each, and
+a page that spans both runs two.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from flask import abort, request, url_for
+from sqlalchemy import and_, tuple_
+
+from app import db
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+def encode_cursor(values):
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else None if value is None else str(value)
+                      for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """Turn a cursor back into values of the columns' Python types"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if len(values) != len(columns):
+            raise ValueError(token)
+        decoded = []
+        for column, value in zip(columns, values):
+            python_type = column.type.python_type
+            if value is None:
+                decoded.append(None)
+            elif python_type is datetime:
+                decoded.append(datetime.fromisoformat(value))
+            elif python_type is Decimal:
+                decoded.append(Decimal(value))
+            else:
+                decoded.append(python_type(value))
+        return decoded
+    except (ValueError, TypeError, binascii.Error, ArithmeticError):
+        abort(400, description='Invalid page cursor')
+
+
+def _nullable(column):
+    return getattr(column.expression, 'nullable', True)
+
+
+def _segments(key_columns, values, descending):
+    """``(where, order_by)`` parts of the scan past the cursor ``values``, in scan order.
+
+    A nullable sort column is scanned as two parts, its NULL rows by id and
+    the rest by value and id, so each part can still be an index range.
+    """
+    column = key_columns[0]
+    if len(key_columns) == 1 or not _nullable(column):
+        order = [col.desc() if descending else col.asc() for col in key_columns]
+        if values is None:
+            return [(None, order)]
+        keys, bounds = tuple_(*key_columns), tuple_(*values)
+        return [(keys < bounds if descending else keys > bounds, order)]
+
+    id_column = key_columns[1]
+    id_order = id_column.desc() if descending else id_column.asc()
+    nulls, non_nulls = [column.is_(None)], [column.is_not(None)]
+    if values is not None:
+        value, id_value = values
+        if value is None:
+            nulls.append(id_column < id_value if descending else id_column > id_value)
+            # Descending, the cursor is already past every non-NULL value
+            non_nulls = None if descending else non_nulls
+        else:
+            keys, bounds = tuple_(column, id_column), tuple_(value, id_value)
+            non_nulls = [keys < bounds if descending else keys > bounds]
+            # Ascending, the NULLs came first and were all passed
+            nulls = nulls if descending else None
+    segments = [(and_(*nulls), [id_order]) if nulls else None,
+                (and_(*non_nulls), [column.desc() if descending else column.asc(), id_order]) if non_nulls else None]
+    if descending:
+        segments.reverse()
+    return [segment for segment in segments if segment]
+
+
+class Page:
+    """One page of projected rows plus the links around it"""
+
+    def __init__(self, rows, sort, descending, next_cursor=None, prev_cursor=None):
+        self.rows = rows
+        self.sort = sort
+        self.descending = descending
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _url(self, **changes):
+        args = request.args.to_dict()
+        for key in ('after', 'before'):
+            args.pop(key, None)
+        args.update(changes)
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    @property
+    def next_url(self):
+        return self._url(after=self.next_cursor) if self.next_cursor else None
+
+    @property
+    def prev_url(self):
+        return self._url(before=self.prev_cursor) if self.prev_cursor else None
+
+    def sort_url(self, key):
+        """Link that sorts by ``key``, toggling direction if already sorted by it"""
+        if key == self.sort:
+            direction = 'asc' if self.descending else 'desc'
+        else:
+            direction = 'asc'
+        return self._url(sort=key, dir=direction)
+
+    def sort_direction(self, key):
+        if key != self.sort:
+            return None
+        return 'desc' if self.descending else 'asc'
+
+
+def paginate(query, sorts, id_column, default_sort, default_desc=False):
+    """Run one page of ``query`` using the request's sort and cursor arguments.
+
+    ``sorts`` maps the ``sort`` query-string values to columns; each sort
+    column and ``id_column`` must be selected unlabelled by ``query`` so the
+    cursor can be read back from the last row. Recognised arguments:
+    ``sort``, ``dir`` (asc/desc), ``after``/``before`` (cursors) and
+    ``per_page``.
+    """
+    sort = request.args.get('sort', default_sort)
+    if sort not in sorts:
+        sort = default_sort
+    direction = request.args.get('dir')
+    descending = direction == 'desc' if direction in ('asc', 'desc') else default_desc
+    per_page = min(max(request.args.get('per_page', DEFAULT_PER_PAGE, type=int), 1), MAX_PER_PAGE)
+
+    key_columns = [sorts[sort]] if sorts[sort] is id_column else [sorts[sort], id_column]
+    after = request.args.get('after')
+    before = request.args.get('before') if not after else None
+
+    # Walking backwards is the same query with the order flipped, reversed afterwards
+    backwards = before is not None
+    scan_desc = descending != backwards
+    cursor = after or before
+    values = decode_cursor(cursor, key_columns) if cursor else None
+
+    rows = []
+    for where, order in _segments(key_columns, values, scan_desc):
+        segment = query.where(where) if where is not None else query
+        rows += db.session.execute(segment.order_by(*order).limit(per_page + 1 - len(rows))).all()
+        if len(rows) > per_page:
+            break
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def cursor_for(row):
+        return encode_cursor([row._mapping[col] for col in key_columns])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if more or backwards:
+            next_cursor = cursor_for(rows[-1])
+        if (more and backwards) or after:
+            prev_cursor = cursor_for(rows[0])
+    return Page(rows, sort, descending, next_cursor=next_cursor, prev_cursor=prev_cursor)
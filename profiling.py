@@ -0,0 +1,141 @@
+"""On-demand cProfile of a single request.
+
+A user listed in ``PROFILE_USERS`` (``admin`` by default) adds ``?_profile=1``
+to a URL, or sends ``X-Profile: 1``, and that request runs under cProfile.
+The stats are saved to ``PROFILE_DIR`` as
+``<timestamp>_<endpoint>_<method>_<ms>ms.prof``. The Profiles page lists
+them with their top functions by cumulative time, and each can be
+downloaded for snakeviz / ``python -m pstats``. A form posts back to its
+own URL, so opening ``/sales/add?_profile=1`` profiles both the form and
+the sale it submits.
+
+Only one request per process is profiled at a time. A second request
+asking for a profile meanwhile runs normally. Only the newest
+``PROFILE_KEEP`` profiles are kept.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app, g, request, session
+
+logger = logging.getLogger(__name__)
+
+ProfileInfo = namedtuple('ProfileInfo', 'name created endpoint method duration_ms size')
+
+PROFILE_NAME = re.compile(r'^(\d{8}-\d{6}-\d{6})_([\w.]+)_([A-Z]+)_(\d+)ms\.prof$')
+
+_active = threading.Lock()
+
+
+def can_profile():
+    """Whether the logged-in user may profile requests and see the profiles"""
+    config = current_app.config
+    return config['PROFILING_ENABLED'] and session.get('username') in config['PROFILE_USERS']
+
+
+def _requested():
+    return request.args.get('_profile') == '1' or request.headers.get('X-Profile') == '1'
+
+
+def profile_path(name):
+    """Absolute path of a stored profile, or None if ``name`` is not one"""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(current_app.config['PROFILE_DIR'], name)
+    return path if os.path.isfile(path) else None
+
+
+def list_profiles():
+    """Stored profiles, newest first"""
+    directory = current_app.config['PROFILE_DIR']
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        match = PROFILE_NAME.match(name)
+        if match:
+            created, endpoint, method, duration_ms = match.groups()
+            profiles.append(ProfileInfo(name, datetime.strptime(created, '%Y%m%d-%H%M%S-%f'), endpoint, method,
+                                        int(duration_ms), os.path.getsize(os.path.join(directory, name))))
+    profiles.sort(key=lambda profile: profile.name, reverse=True)
+    return profiles
+
+
+def profile_summary(name, limit=40):
+    """pstats report of ``name`` sorted by cumulative time, or None if there is no such profile"""
+    path = profile_path(name)
+    if path is None:
+        return None
+    stream = io.StringIO()
+    stats = pstats.Stats(path, stream=stream)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+def _prune(directory, keep):
+    names = sorted((name for name in os.listdir(directory) if PROFILE_NAME.match(name)), reverse=True)
+    for name in names[keep:]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def _save(profiler, started_at, elapsed):
+    config = current_app.config
+    directory = config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    endpoint = re.sub(r'[^\w.]', '-', request.endpoint or 'unmatched')
+    name = f"{started_at:%Y%m%d-%H%M%S-%f}_{endpoint}_{request.method}_{int(elapsed * 1000)}ms.prof"
+    profiler.dump_stats(os.path.join(directory, name))
+    _prune(directory, config['PROFILE_KEEP'])
+    logger.info("Saved profile %s", name)
+
+
+def init_app(app):
+    app.config.setdefault('PROFILING_ENABLED', True)
+    app.config.setdefault('PROFILE_USERS', {'admin'})
+    app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+    app.config.setdefault('PROFILE_KEEP', 200)
+
+    @app.context_processor
+    def profiling_context():
+        return {'can_profile': can_profile}
+
+    @app.before_request
+    def start_profile():
+        if not _requested() or not can_profile():
+            return
+        if not _active.acquire(blocking=False):
+            logger.info("Not profiling %s: another request is being profiled", request.path)
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is already active
+            _active.release()
+            logger.warning("Not profiling %s: a profiler is already active", request.path)
+            return
+        g.profile = (profiler, datetime.now(), time.perf_counter())
+
+    @app.teardown_request
+    def save_profile(exc):
+        if 'profile' not in g:
+            return
+        profiler, started_at, started = g.pop('profile')
+        try:
+            profiler.disable()
+            _save(profiler, started_at, time.perf_counter() - started)
+        except Exception:
+            logger.exception("Could not save profile of %s", request.path)
+        finally:
+            _active.release()
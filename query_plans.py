@@ -0,0 +1,142 @@
+"""EXPLAIN-based check that the hot queries use their indexes.
+
+``flask check-indexes`` (and tests/test_query_plans.py) runs two kinds of
+query through the database's planner and fails (exit status 1) if a plan
+does not mention the expected index:
+
+* the lookups in :func:`hot_queries`;
+* the SQL the list pages in :func:`hot_pages` actually emit, captured
+  while each page is requested through the test client, so a change to a
+  route's select, filters or pagination that stops using the index fails
+  as well.
+
+A dropped index or a rewritten query that stops using one is then caught
+before it reaches production. Works on SQLite
+(``EXPLAIN QUERY PLAN``) and Postgres (``EXPLAIN``, with sequential scans
+disabled so small tables still show their index).
+"""
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import event, select, text
+
+from app import db
+from models import Customer, Vendor, Item, Sale, SaleItem, Purchase, PurchaseItem
+from pagination import encode_cursor
+
+
+def hot_queries():
+    """``(description, statement, expected index)`` for each query to check"""
+    since = datetime(2024, 1, 1)
+    until = since + timedelta(days=1)
+    return [
+        ("sales list, newest first", select(Sale.id).order_by(Sale.sale_date.desc()).limit(50),
+         'ix_sales_sale_date'),
+        ("sales in a date range", select(Sale.id, Sale.total_amount)
+         .where(Sale.sale_date >= since, Sale.sale_date < until), 'ix_sales_sale_date'),
+        ("sales of a customer", select(Sale.id).where(Sale.customer_id == 1), 'ix_sales_customer_id'),
+        ("lines of a sale", select(SaleItem.id).where(SaleItem.sale_id == 1), 'ix_sale_items_sale_id'),
+        ("sales of an item", select(SaleItem.id).where(SaleItem.item_id == 1), 'ix_sale_items_item_id'),
+        ("purchases list, newest first",
+         select(Purchase.id).order_by(Purchase.purchase_date.desc()).limit(50), 'ix_purchases_purchase_date'),
+        ("purchases from a vendor", select(Purchase.id).where(Purchase.vendor_id == 1), 'ix_purchases_vendor_id'),
+        ("lines of a purchase", select(PurchaseItem.id).where(PurchaseItem.purchase_id == 1),
+         'ix_purchase_items_purchase_id'),
+        ("purchases of an item", select(PurchaseItem.id).where(PurchaseItem.item_id == 1),
+         'ix_purchase_items_item_id'),
+        ("low stock items", select(Item.id).where(Item.current_quantity < 10), 'ix_items_current_quantity'),
+        ("customers by name", select(Customer.id).order_by(Customer.name).limit(50), 'ix_customers_name'),
+        ("vendors by name", select(Vendor.id).order_by(Vendor.name).limit(50), 'ix_vendors_name'),
+        ("items by product", select(Item.id).order_by(Item.product).limit(50), 'ix_items_product'),
+    ]
+
+
+def hot_pages():
+    """``(description, list page URL, expected index)``; cursors make later pages run the keyset comparison"""
+    since = datetime(2024, 1, 1)
+    return [
+        ("sales page, newest first", '/sales', 'ix_sales_sale_date'),
+        ("sales page, later", f"/sales?after={encode_cursor([since, 1])}", 'ix_sales_sale_date'),
+        ("purchases page, newest first", '/purchases', 'ix_purchases_purchase_date'),
+        ("purchases page, later", f"/purchases?after={encode_cursor([since, 1])}", 'ix_purchases_purchase_date'),
+        ("customers page by name", '/customers', 'ix_customers_name'),
+        ("customers page by name, later", f"/customers?after={encode_cursor(['M', 1])}", 'ix_customers_name'),
+        ("vendors page by name", '/vendors', 'ix_vendors_name'),
+        ("items page by product", '/items?sort=product', 'ix_items_product'),
+        ("items page by stock, later", f"/items?sort=stock&after={encode_cursor([10, 1])}",
+         'ix_items_current_quantity'),
+        ("sales ledger page, newest first", '/ledger/sales', 'ix_sales_ledger_date'),
+        ("purchase ledger page, newest first", '/ledger/purchases', 'ix_purchase_ledger_date'),
+    ]
+
+
+def _explain_sql(sql, parameters=None):
+    dialect = db.engine.dialect
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    with db.engine.connect() as connection:
+        if dialect.name == 'postgresql':
+            connection.execute(text('SET LOCAL enable_seqscan = off'))
+        rows = connection.exec_driver_sql(prefix + sql, parameters or ()).all()
+    return '\n'.join(' '.join(str(value) for value in row) for row in rows)
+
+
+def explain(statement):
+    """The planner's output for ``statement`` as one string"""
+    return _explain_sql(str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})))
+
+
+def page_selects(client, url):
+    """``(status, [(sql, parameters)])`` of the SELECTs run while ``client`` requests ``url``"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        status = client.get(url).status_code
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', capture)
+    return status, statements
+
+
+def check_query_plans():
+    """``[(description, expected index, plan)]`` for every query not using its index (app context)"""
+    failures = []
+    for description, statement, index in hot_queries():
+        plan = explain(statement)
+        if index not in plan:
+            failures.append((description, index, plan))
+
+    client = current_app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 0
+        session['username'] = 'check-indexes'
+    for description, url, index in hot_pages():
+        # Each page runs in a session of its own, as in a worker
+        db.session.remove()
+        status, statements = page_selects(client, url)
+        if status != 200:
+            failures.append((description, index, f"{url} returned HTTP {status}"))
+            continue
+        plans = [_explain_sql(sql, parameters) for sql, parameters in statements]
+        if not any(index in plan for plan in plans):
+            failures.append((description, index, '\n    '.join(plans) or 'no SELECT ran'))
+    return failures
+
+
+def init_app(app):
+    @app.cli.command('check-indexes')
+    def check_indexes_command():
+        """Fail if a hot query's plan does not use its index."""
+        failures = check_query_plans()
+        for description, index, plan in failures:
+            click.echo(f"{description}: expected {index}\n    {plan}", err=True)
+        if failures:
+            raise SystemExit(1)
+        click.echo(f"All {len(hot_queries()) + len(hot_pages())} hot queries use their indexes.")
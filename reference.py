@@ -0,0 +1,59 @@
+"""Customer and vendor picker lists for the sale and purchase forms.
+
+The lists are cached per process against the ``parties_version`` counter,
+which the counter flush hook bumps on every customer or vendor add, edit
+or delete (see counters.py). Rendering a form costs one counter read
+unless a customer or vendor changed since the list was last built. Nothing
+is read on a POST that redirects away, since the routes only ask for the
+lists when they render the form.
+"""
+import threading
+
+from sqlalchemy import select
+
+from app import db
+from counters import parties_version
+from models import Customer, Vendor
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+QUERIES = {
+    'customers': select(Customer.id, Customer.name).order_by(Customer.name),
+    'vendors': select(Vendor.id, Vendor.name, Vendor.discount_rate, Vendor.vat_rate, Vendor.excise_rate)
+    .order_by(Vendor.name),
+}
+
+
+def _cached(name):
+    """``(rows, {id: row})`` for the named list"""
+    version = parties_version()
+    with _cache_lock:
+        cached = _cache.get(name)
+        if version is not None and cached is not None and cached[0] == version:
+            return cached[1]
+
+    rows = db.session.execute(QUERIES[name]).all()
+    entry = (rows, {row.id: row for row in rows})
+    with _cache_lock:
+        _cache[name] = (version, entry)
+    return entry
+
+
+def _choices(name):
+    return _cached(name)[0]
+
+
+def customer_choices():
+    """``(id, name)`` rows for every customer, by name"""
+    return _choices('customers')
+
+
+def vendor_choices():
+    """``(id, name, discount_rate, vat_rate, excise_rate)`` rows for every vendor, by name"""
+    return _choices('vendors')
+
+
+def vendor_rates(vendor_id):
+    """The :func:`vendor_choices` row for one vendor, or None"""
+    return _cached('vendors')[1].get(vendor_id)
@@ -0,0 +1,234 @@
+"""Reporting rollups: sales and purchases pre-aggregated by day x item,
+day x customer/vendor and month x category.
+
+The rollup rows are incremented (or decremented) in the same transaction
+that creates or deletes a sale/purchase, with one multi-row upsert per
+table, so the report pages read a few small aggregate rows instead of
+joining ``sale_items`` to ``items`` over the whole period. Category
+totals record the item's category at the time of the sale;
+``flask rebuild-rollups`` recomputes everything from the base tables
+(backfill, or after recategorising items).
+"""
+import logging
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+import click
+from sqlalchemy import bindparam, delete, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models import (Customer, Vendor, Item, Sale, SaleItem, Purchase, PurchaseItem, RollupDayItem,
+                    RollupDayParty, RollupMonthCategory)
+
+logger = logging.getLogger(__name__)
+
+CASH_PARTY = 0
+UNCATEGORISED = ''
+
+# kind -> (document model, line model, line FK to the document, party column, date column)
+SOURCES = {
+    'sales': (Sale, SaleItem, SaleItem.sale_id, Sale.customer_id, Sale.sale_date),
+    'purchases': (Purchase, PurchaseItem, PurchaseItem.purchase_id, Purchase.vendor_id, Purchase.purchase_date),
+}
+
+# table -> (key columns, summed columns)
+ROLLUPS = {
+    RollupDayItem: (['kind', 'day', 'item_id'], ['quantity', 'amount']),
+    RollupDayParty: (['kind', 'day', 'party_id'], ['documents', 'amount']),
+    RollupMonthCategory: (['kind', 'month', 'category'], ['quantity', 'amount']),
+}
+
+
+def _as_date(value):
+    """func.date() returns a string on SQLite and a date on Postgres"""
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _increment(model, rows):
+    """Add each row's summed columns onto the matching rollup row, creating it if needed"""
+    if not rows:
+        return
+    keys, sums = ROLLUPS[model]
+    table = model.__table__
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=keys,
+                                          set_={col: table.c[col] + stmt.excluded[col] for col in sums})
+        db.session.execute(stmt, rows)
+        return
+    match = [table.c[col] == bindparam(f'match_{col}') for col in keys]
+    for row in rows:
+        params = {f'match_{col}': row[col] for col in keys}
+        result = db.session.execute(
+            update(table).where(*match).values({col: table.c[col] + row[col] for col in sums}), params)
+        if result.rowcount == 0:
+            db.session.execute(insert(table).values(row))
+
+
+def record(kind, when, party_id, document_amount, lines, sign=1):
+    """Roll one sale/purchase into the rollups (``sign=-1`` when it is deleted).
+
+    ``lines`` are ``(item_id, quantity, line_total)`` tuples. Documents
+    without a date are left out, as :func:`rebuild_rollups` leaves them out.
+    """
+    if when is None:
+        return
+    day = when.date()
+    month = day.replace(day=1)
+    lines = list(lines)
+    categories = dict(db.session.execute(
+        select(Item.id, Item.category).where(Item.id.in_({item_id for item_id, _, _ in lines}))).all())
+
+    by_item = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    by_category = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    for item_id, quantity, amount in lines:
+        for bucket in (by_item[item_id], by_category[categories.get(item_id) or UNCATEGORISED]):
+            bucket[0] += sign * quantity
+            bucket[1] += sign * amount
+
+    _increment(RollupDayItem, [{'kind': kind, 'day': day, 'item_id': item_id, 'quantity': q, 'amount': a}
+                               for item_id, (q, a) in by_item.items()])
+    _increment(RollupDayParty, [{'kind': kind, 'day': day, 'party_id': party_id or CASH_PARTY,
+                                 'documents': sign, 'amount': sign * Decimal(str(document_amount or 0))}])
+    _increment(RollupMonthCategory, [{'kind': kind, 'month': month, 'category': category, 'quantity': q,
+                                      'amount': a} for category, (q, a) in by_category.items()])
+
+
+def record_sale(sale, lines, sign=1):
+    record('sales', sale.sale_date, sale.customer_id, sale.total_amount, lines, sign)
+
+
+def record_purchase(purchase, lines, sign=1):
+    record('purchases', purchase.purchase_date, purchase.vendor_id, purchase.total_amount, lines, sign)
+
+
+def adjust_document_totals(kind, changes):
+    """Move the party rollups by ``(when, party_id, delta)`` after document totals were rewritten.
+
+    Line totals, and so the item and category rollups, are unchanged.
+    """
+    amounts = defaultdict(Decimal)
+    for when, party_id, delta in changes:
+        if when is None:
+            continue
+        amounts[(when.date(), party_id or CASH_PARTY)] += delta
+    _increment(RollupDayParty, [{'kind': kind, 'day': day, 'party_id': party_id, 'documents': 0, 'amount': amount}
+                                for (day, party_id), amount in amounts.items() if amount])
+
+
+def rebuild_rollups():
+    """Recompute every rollup from the sale/purchase tables"""
+    for model in ROLLUPS:
+        db.session.execute(delete(model))
+
+    for kind, (document, line, document_fk, party, when) in SOURCES.items():
+        day = func.date(when)
+        item_rows = db.session.execute(
+            select(day, line.item_id, func.coalesce(Item.category, UNCATEGORISED),
+                   func.sum(line.quantity), func.sum(line.total_price))
+            .join(document, document_fk == document.id)
+            .outerjoin(Item, line.item_id == Item.id)
+            .where(when.is_not(None))
+            .group_by(day, line.item_id, Item.category)).all()
+        by_item = defaultdict(lambda: [0, 0])
+        by_category = defaultdict(lambda: [0, 0])
+        for sold_on, item_id, category, quantity, amount in item_rows:
+            sold_on = _as_date(sold_on)
+            for bucket in (by_item[(sold_on, item_id)], by_category[(sold_on.replace(day=1), category)]):
+                bucket[0] += quantity or 0
+                bucket[1] += amount or 0
+        if by_item:
+            db.session.execute(insert(RollupDayItem), [
+                {'kind': kind, 'day': d, 'item_id': i, 'quantity': q, 'amount': a}
+                for (d, i), (q, a) in by_item.items()])
+            db.session.execute(insert(RollupMonthCategory), [
+                {'kind': kind, 'month': m, 'category': c, 'quantity': q, 'amount': a}
+                for (m, c), (q, a) in by_category.items()])
+
+        party_rows = db.session.execute(
+            select(day, func.coalesce(party, CASH_PARTY), func.count(), func.sum(document.total_amount))
+            .where(when.is_not(None))
+            .group_by(day, func.coalesce(party, CASH_PARTY))).all()
+        if party_rows:
+            db.session.execute(insert(RollupDayParty), [
+                {'kind': kind, 'day': _as_date(d), 'party_id': p, 'documents': n, 'amount': a or 0}
+                for d, p, n, a in party_rows])
+    db.session.commit()
+
+
+def ensure_rollups():
+    """Build the rollups once for a database that has sales or purchases but no rollups yet"""
+    if not inspect(db.engine).has_table(RollupDayParty.__tablename__):
+        return
+    if db.session.scalar(select(RollupDayParty.kind).limit(1)) is not None:
+        return
+    if db.session.scalar(select(Sale.id).limit(1)) is None and \
+            db.session.scalar(select(Purchase.id).limit(1)) is None:
+        return
+    rebuild_rollups()
+    logger.info("Reporting rollups initialised")
+
+
+def init_app(app):
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Recompute the reporting rollups from the sale and purchase tables."""
+        rebuild_rollups()
+        click.echo("Reporting rollups rebuilt.")
+
+
+# ------------------------
+# Reports (read the rollups only)
+# ------------------------
+REPORTS = ('day', 'item', 'party', 'category')
+
+
+def report(kind, by, start, end, limit=100):
+    """Rows of ``(label, detail, documents or quantity, amount)`` for ``start``..``end`` (dates, inclusive).
+
+    ``by`` is one of :data:`REPORTS`; 'party' means customer for sales and
+    vendor for purchases. Day reports are in date order, the others by
+    amount, largest first, up to ``limit`` rows.
+    """
+    if by == 'day':
+        stmt = (select(RollupDayParty.day, func.sum(RollupDayParty.documents), func.sum(RollupDayParty.amount))
+                .where(RollupDayParty.kind == kind, RollupDayParty.day.between(start, end))
+                .group_by(RollupDayParty.day).order_by(RollupDayParty.day))
+        return [(day.isoformat(), '', documents, amount) for day, documents, amount in db.session.execute(stmt)]
+
+    if by == 'item':
+        amount = func.sum(RollupDayItem.amount)
+        stmt = (select(RollupDayItem.item_id, func.sum(RollupDayItem.quantity), amount)
+                .where(RollupDayItem.kind == kind, RollupDayItem.day.between(start, end))
+                .group_by(RollupDayItem.item_id).order_by(amount.desc()).limit(limit))
+        rows = db.session.execute(stmt).all()
+        names = dict((row.id, (row.sn, row.product)) for row in db.session.execute(
+            select(Item.id, Item.sn, Item.product).where(Item.id.in_([row[0] for row in rows]))))
+        return [(names.get(item_id, ('', 'Deleted item'))[1], names.get(item_id, ('', ''))[0], quantity, total)
+                for item_id, quantity, total in rows]
+
+    if by == 'party':
+        party_model = Customer if kind == 'sales' else Vendor
+        amount = func.sum(RollupDayParty.amount)
+        stmt = (select(RollupDayParty.party_id, func.sum(RollupDayParty.documents), amount)
+                .where(RollupDayParty.kind == kind, RollupDayParty.day.between(start, end))
+                .group_by(RollupDayParty.party_id).order_by(amount.desc()).limit(limit))
+        rows = db.session.execute(stmt).all()
+        names = dict(db.session.execute(
+            select(party_model.id, party_model.name).where(party_model.id.in_([row[0] for row in rows]))).all())
+        return [('Cash' if party_id == CASH_PARTY else names.get(party_id, 'Deleted'), '', documents, total)
+                for party_id, documents, total in rows]
+
+    if by == 'category':
+        amount = func.sum(RollupMonthCategory.amount)
+        stmt = (select(RollupMonthCategory.category, func.sum(RollupMonthCategory.quantity), amount)
+                .where(RollupMonthCategory.kind == kind,
+                       RollupMonthCategory.month.between(start.replace(day=1), end))
+                .group_by(RollupMonthCategory.category).order_by(amount.desc()).limit(limit))
+        return [(category or 'Uncategorised', '', quantity, total)
+                for category, quantity, total in db.session.execute(stmt)]
+
+    raise ValueError(by)
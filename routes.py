@@ -1,16 +1,80 @@
 import os
 from decimal import Decimal, InvalidOperation
-from flask import render_template, request, redirect, url_for, flash, session, jsonify
+from flask import (render_template, request, redirect, url_for, flash, session, jsonify, abort, send_file,
+                   current_app)
 from werkzeug.utils import secure_filename
-from app import app, db
-from models import User, Customer, Vendor, Item, Sale, SaleItem, Purchase, PurchaseItem
+from app import db
+from models import (User, Customer, Vendor, Item, Sale, SaleItem, Purchase, PurchaseItem, ImportJob,
+                    StockMovement, LedgerOutbox)
 from forms import (LoginForm, CustomerForm, VendorForm, ItemForm, ExcelUploadForm,
                    SaleForm, PurchaseForm)
-from utils import process_excel_file, generate_invoice_number
-from sqlalchemy import func
-from datetime import datetime
+from numbering import next_number
+from jobs import submit_import
+from logging_config import log_payload
+from counters import get_dashboard_payload, items_version
+from db_routing import read_only, writes
+from inventory import (InsufficientStock, adjust_stock, decrement_stock, delete_stock_history, find_shortages,
+                       load_stock, record_movements, stock_at, total_quantities)
+from ledger import LEDGERS, queue_purchase, queue_sale, wake_writer
+from exports import export_response
+from pagination import paginate
+from profiling import can_profile, list_profiles, profile_path, profile_summary
+from reference import customer_choices, vendor_choices, vendor_rates
+from rollups import record_purchase, record_sale, report
+from search import search_items
+from tax import compute_invoice, rates as tax_rates
+import scan_cache
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import joinedload, selectinload
+from datetime import datetime, timedelta
 import uuid
 
+# Sortable columns for the list pages (``?sort=<key>&dir=asc|desc``)
+CUSTOMER_SORTS = {'name': Customer.name, 'balance': Customer.balance, 'created': Customer.created_at}
+VENDOR_SORTS = {'name': Vendor.name, 'balance': Vendor.balance}
+ITEM_SORTS = {'sn': Item.sn, 'product': Item.product, 'sp': Item.sp, 'stock': Item.current_quantity}
+SALE_SORTS = {'date': Sale.sale_date, 'bill': Sale.bill_number, 'total': Sale.total_amount}
+PURCHASE_SORTS = {'date': Purchase.purchase_date, 'invoice': Purchase.invoice_number,
+                  'total': Purchase.total_amount}
+MOVEMENT_SORTS = {'date': StockMovement.created_at}
+
+# Most items one /api/items request may ask for
+MAX_API_ITEMS = 500
+
+def search_term():
+    """``?q=`` as a LIKE pattern, or None when no search was given"""
+    q = request.args.get('q', '').strip()
+    if not q:
+        return None
+    return f"%{q}%"
+
+def filter_date_range(query, column):
+    """Apply the inclusive ``?start=YYYY-MM-DD&end=YYYY-MM-DD`` filter"""
+    try:
+        start = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d')
+        query = query.where(column >= start)
+    except ValueError:
+        pass
+    try:
+        end = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d')
+        query = query.where(column < end + timedelta(days=1))
+    except ValueError:
+        pass
+    return query
+
+# Views are collected here and registered on the app by init_app (called from create_app)
+_views = []
+
+def route(rule, **options):
+    def decorator(f):
+        _views.append((rule, options, f))
+        return f
+    return decorator
+
+def init_app(app):
+    for rule, options, view in _views:
+        app.add_url_rule(rule, view_func=view, **options)
+
 # Authentication decorator
 def login_required(f):
     def decorated_function(*args, **kwargs):
@@ -20,7 +84,7 @@ def login_required(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     form = LoginForm()
     if form.validate_on_submit():
@@ -46,47 +110,45 @@ def login():
     
     return render_template('login.html', form=form)
 
-@app.route('/logout')
+@route('/logout')
 def logout():
     session.clear()
     flash('You have been logged out', 'info')
     return redirect(url_for('login'))
 
-@app.route('/')
+@route('/')
 @login_required
+@read_only
 def dashboard():
-    # Get dashboard statistics
-    total_customers = Customer.query.count()
-    total_vendors = Vendor.query.count()
-    total_items = Item.query.count()
-    total_sales = Sale.query.count()
-    total_purchases = Purchase.query.count()
-    
-    # Get recent sales
-    recent_sales = Sale.query.order_by(Sale.sale_date.desc()).limit(5).all()
-    recent_purchases = Purchase.query.order_by(Purchase.purchase_date.desc()).limit(5).all()
-    
-    # Get low stock items (items with current_quantity < 10)
-    low_stock_items = Item.query.filter(Item.current_quantity < 10).limit(5).all()
-    
-    return render_template('dashboard.html', 
-                         total_customers=total_customers,
-                         total_vendors=total_vendors,
-                         total_items=total_items,
-                         total_sales=total_sales,
-                         total_purchases=total_purchases,
-                         recent_sales=recent_sales,
-                         recent_purchases=recent_purchases,
-                         low_stock_items=low_stock_items)
+    # Counters are maintained on write and the payload is cached until the next write
+    return render_template('dashboard.html', **get_dashboard_payload())
 
 # Customer routes
-@app.route('/customers')
+@route('/customers')
 @login_required
+@read_only
 def customers():
-    customers = Customer.query.all()
-    return render_template('customers.html', customers=customers)
+    query = filter_customers(select(Customer.id, Customer.name, Customer.email, Customer.phone, Customer.address,
+                                    Customer.balance, Customer.created_at))
+    page = paginate(query, CUSTOMER_SORTS, Customer.id, default_sort='name')
+    return render_template('customers.html', customers=page.rows, page=page)
+
+def filter_customers(query):
+    term = search_term()
+    if term:
+        query = query.where(or_(Customer.name.ilike(term), Customer.email.ilike(term), Customer.phone.ilike(term)))
+    return query
 
-@app.route('/customers/add', methods=['GET', 'POST'])
+@route('/customers/export.<any(csv, xlsx):fmt>')
+@login_required
+@read_only
+def export_customers(fmt):
+    query = filter_customers(select(Customer.id, Customer.name, Customer.email, Customer.phone, Customer.address,
+                                    Customer.balance, Customer.created_at)).order_by(Customer.id)
+    return export_response(query, ['ID', 'Name', 'Email', 'Phone', 'Address', 'Balance', 'Created'],
+                           'customers', fmt)
+
+@route('/customers/add', methods=['GET', 'POST'])
 @login_required
 def add_customer():
     form = CustomerForm()
@@ -105,7 +167,7 @@ def add_customer():
     
     return render_template('customer_form.html', form=form, title='Add Customer')
 
-@app.route('/customers/edit/<int:id>', methods=['GET', 'POST'])
+@route('/customers/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_customer(id):
     customer = Customer.query.get_or_404(id)
@@ -123,8 +185,9 @@ def edit_customer(id):
     
     return render_template('customer_form.html', form=form, title='Edit Customer')
 
-@app.route('/customers/delete/<int:id>')
+@route('/customers/delete/<int:id>')
 @login_required
+@writes
 def delete_customer(id):
     customer = Customer.query.get_or_404(id)
     db.session.delete(customer)
@@ -133,13 +196,33 @@ def delete_customer(id):
     return redirect(url_for('customers'))
 
 # Vendor routes
-@app.route('/vendors')
+@route('/vendors')
 @login_required
+@read_only
 def vendors():
-    vendors = Vendor.query.all()
-    return render_template('vendors.html', vendors=vendors)
+    query = filter_vendors(select(Vendor.id, Vendor.name, Vendor.email, Vendor.phone, Vendor.balance,
+                                  Vendor.tax_number, Vendor.discount_rate, Vendor.vat_rate, Vendor.excise_rate))
+    page = paginate(query, VENDOR_SORTS, Vendor.id, default_sort='name')
+    return render_template('vendors.html', vendors=page.rows, page=page)
+
+def filter_vendors(query):
+    term = search_term()
+    if term:
+        query = query.where(or_(Vendor.name.ilike(term), Vendor.email.ilike(term), Vendor.phone.ilike(term),
+                                Vendor.tax_number.ilike(term)))
+    return query
+
+@route('/vendors/export.<any(csv, xlsx):fmt>')
+@login_required
+@read_only
+def export_vendors(fmt):
+    query = filter_vendors(select(Vendor.id, Vendor.name, Vendor.email, Vendor.phone, Vendor.address,
+                                  Vendor.balance, Vendor.tax_number, Vendor.discount_rate, Vendor.vat_rate,
+                                  Vendor.excise_rate)).order_by(Vendor.id)
+    return export_response(query, ['ID', 'Name', 'Email', 'Phone', 'Address', 'Balance', 'Tax Number',
+                                   'Discount %', 'VAT %', 'Excise %'], 'vendors', fmt)
 
-@app.route('/vendors/add', methods=['GET', 'POST'])
+@route('/vendors/add', methods=['GET', 'POST'])
 @login_required
 def add_vendor():
     form = VendorForm()
@@ -162,7 +245,7 @@ def add_vendor():
     
     return render_template('vendor_form.html', form=form, title='Add Vendor')
 
-@app.route('/vendors/edit/<int:id>', methods=['GET', 'POST'])
+@route('/vendors/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_vendor(id):
     vendor = Vendor.query.get_or_404(id)
@@ -184,8 +267,9 @@ def edit_vendor(id):
     
     return render_template('vendor_form.html', form=form, title='Edit Vendor')
 
-@app.route('/vendors/delete/<int:id>')
+@route('/vendors/delete/<int:id>')
 @login_required
+@writes
 def delete_vendor(id):
     vendor = Vendor.query.get_or_404(id)
     db.session.delete(vendor)
@@ -194,13 +278,34 @@ def delete_vendor(id):
     return redirect(url_for('vendors'))
 
 # Item routes
-@app.route('/items')
+@route('/items')
 @login_required
+@read_only
 def items():
-    items = Item.query.all()
-    return render_template('items.html', items=items)
+    query = filter_items(select(Item.id, Item.sn, Item.product, Item.category, Item.brand, Item.cp, Item.wholesale,
+                                Item.sp, Item.current_quantity, Item.uom))
+    page = paginate(query, ITEM_SORTS, Item.id, default_sort='sn')
+    return render_template('items.html', items=page.rows, page=page)
 
-@app.route('/items/add', methods=['GET', 'POST'])
+def filter_items(query):
+    term = search_term()
+    if term:
+        query = query.where(or_(Item.sn.ilike(term), Item.product.ilike(term), Item.brand.ilike(term),
+                                Item.category.ilike(term)))
+    if request.args.get('low_stock'):
+        query = query.where(Item.current_quantity < 10)
+    return query
+
+@route('/items/export.<any(csv, xlsx):fmt>')
+@login_required
+@read_only
+def export_items(fmt):
+    query = filter_items(select(Item.sn, Item.product, Item.category, Item.brand, Item.cp, Item.wholesale, Item.sp,
+                                Item.uom, Item.opening_quantity, Item.current_quantity)).order_by(Item.id)
+    return export_response(query, ['sn', 'product', 'category', 'brand', 'cp', 'wholesale', 'sp', 'uom',
+                                   'opening_quantity', 'current_quantity'], 'items', fmt)
+
+@route('/items/add', methods=['GET', 'POST'])
 @login_required
 def add_item():
     form = ItemForm()
@@ -218,13 +323,15 @@ def add_item():
             current_quantity=form.opening_quantity.data or Decimal('0.00')
         )
         db.session.add(item)
+        db.session.flush()  # get item.id
+        record_movements({item.id: item.current_quantity}, 'opening')
         db.session.commit()
         flash('Item added successfully!', 'success')
         return redirect(url_for('items'))
     
     return render_template('item_form.html', form=form, title='Add Item')
 
-@app.route('/items/edit/<int:id>', methods=['GET', 'POST'])
+@route('/items/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_item(id):
     item = Item.query.get_or_404(id)
@@ -246,85 +353,176 @@ def edit_item(id):
     
     return render_template('item_form.html', form=form, title='Edit Item')
 
-@app.route('/items/delete/<int:id>')
+@route('/items/delete/<int:id>')
 @login_required
+@writes
 def delete_item(id):
     item = Item.query.get_or_404(id)
+    delete_stock_history(id)
     db.session.delete(item)
     db.session.commit()
     flash('Item deleted successfully!', 'success')
     return redirect(url_for('items'))
 
-@app.route('/items/import', methods=['GET', 'POST'])
+@route('/items/<int:id>/movements')
+@login_required
+@read_only
+def item_movements(id):
+    item = Item.query.get_or_404(id)
+    query = (select(StockMovement.id, StockMovement.created_at, StockMovement.reason, StockMovement.reference,
+                    StockMovement.quantity)
+             .where(StockMovement.item_id == id))
+    term = search_term()
+    if term:
+        query = query.where(StockMovement.reference.ilike(term))
+    query = filter_date_range(query, StockMovement.created_at)
+    page = paginate(query, MOVEMENT_SORTS, StockMovement.id, default_sort='date', default_desc=True)
+
+    # Stock at the end of ?at=YYYY-MM-DD, from the latest snapshot plus the movements since
+    stock_on = None
+    try:
+        at = datetime.strptime(request.args.get('at', ''), '%Y-%m-%d')
+        stock_on = (at.date(), stock_at(id, at + timedelta(days=1) - timedelta(microseconds=1)))
+    except ValueError:
+        pass
+    return render_template('item_movements.html', item=item, movements=page.rows, page=page, stock_on=stock_on)
+
+@route('/items/import', methods=['GET', 'POST'])
 @login_required
 def import_items():
+    request.max_content_length = current_app.config['IMPORT_MAX_CONTENT_LENGTH']
     form = ExcelUploadForm()
     if form.validate_on_submit():
         file = form.file.data
         if file:
             filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            # Prefix keeps concurrent uploads of the same file name apart
+            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{filename}")
             
             # Create upload directory if it doesn't exist
-            os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+            os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
             
             file.save(file_path)
             
-            # Process the Excel file
-            success, message = process_excel_file(file_path)
-            
-            if success:
-                flash(message, 'success')
-            else:
-                flash(message, 'error')
-            
-            return redirect(url_for('items'))
+            # Process the Excel file in the background and show its progress
+            job = submit_import(file_path, filename)
+            return redirect(url_for('job_progress', id=job.id))
     
     return render_template('item_form.html', form=form, title='Import Items from Excel', is_import=True)
 
+@route('/jobs/<int:id>')
+@login_required
+def job_status(id):
+    job = ImportJob.query.get_or_404(id)
+    return jsonify(job.to_dict())
+
+@route('/jobs/<int:id>/progress')
+@login_required
+def job_progress(id):
+    job = ImportJob.query.get_or_404(id)
+    return render_template('job_progress.html', job=job, title='Import Progress')
+
+@route('/jobs/<int:id>/rejects')
+@login_required
+def job_rejects(id):
+    job = ImportJob.query.get_or_404(id)
+    if not job.rejects_path or not os.path.exists(job.rejects_path):
+        abort(404)
+    download_name = f"{os.path.splitext(job.filename)[0]}_rejected.csv"
+    return send_file(job.rejects_path, mimetype='text/csv', as_attachment=True, download_name=download_name)
+
+# Request profiles (see profiling.py)
+@route('/profiles')
+@login_required
+def profiles():
+    if not can_profile():
+        abort(403)
+    selected = request.args.get('name')
+    summary = profile_summary(selected) if selected else None
+    if selected and summary is None:
+        abort(404)
+    return render_template('profiles.html', profiles=list_profiles(), selected=selected, summary=summary)
+
+@route('/profiles/<name>')
+@login_required
+def download_profile(name):
+    if not can_profile():
+        abort(403)
+    path = profile_path(name)
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=name)
+
 # Sales routes
-@app.route('/sales')
+@route('/sales')
 @login_required
+@read_only
 def sales():
-    sales = Sale.query.order_by(Sale.sale_date.desc()).all()
-    return render_template('sales.html', sales=sales)
+    query = filter_sales(select(Sale.id, Sale.bill_number, Customer.name.label('customer_name'),
+                                Sale.subtotal_amount, Sale.discount, Sale.total_amount, Sale.sale_date))
+    page = paginate(query, SALE_SORTS, Sale.id, default_sort='date', default_desc=True)
+    return render_template('sales.html', sales=page.rows, page=page)
+
+def filter_sales(query):
+    """Join the customer and apply the sales list's search and date filters"""
+    query = query.outerjoin(Customer, Sale.customer_id == Customer.id)
+    term = search_term()
+    if term:
+        query = query.where(or_(Sale.bill_number.ilike(term), Customer.name.ilike(term)))
+    return filter_date_range(query, Sale.sale_date)
+
+@route('/sales/export.<any(csv, xlsx):fmt>')
+@login_required
+@read_only
+def export_sales(fmt):
+    query = filter_sales(select(Sale.bill_number, Sale.sale_date, Customer.name, Sale.subtotal_amount, Sale.discount,
+                                Sale.taxable_amount, Sale.vat_amount, Sale.excise_amount, Sale.total_amount,
+                                Sale.payment_type)).order_by(Sale.sale_date, Sale.id)
+    return export_response(query, ['Bill Number', 'Date', 'Customer', 'Subtotal', 'Discount', 'Taxable', 'VAT',
+                                   'Excise', 'Total', 'Payment'], 'sales', fmt)
+
+@route('/sales/lines/export.<any(csv, xlsx):fmt>')
+@login_required
+@read_only
+def export_sale_lines(fmt):
+    query = filter_sales(select(Sale.bill_number, Sale.sale_date, Customer.name, Item.sn, Item.product,
+                                SaleItem.quantity, SaleItem.unit_price, SaleItem.total_price)
+                         .select_from(SaleItem).join(Sale, SaleItem.sale_id == Sale.id)
+                         .outerjoin(Item, SaleItem.item_id == Item.id)).order_by(Sale.sale_date, SaleItem.id)
+    return export_response(query, ['Bill Number', 'Date', 'Customer', 'SN', 'Product', 'Quantity', 'Unit Price',
+                                   'Line Total'], 'sale-lines', fmt)
+
+def render_sale_form():
+    return render_template('sales_form.html', customers=customer_choices(), vat_rate=tax_rates().vat,
+                           title='Add Sale')
 
-@app.route('/sales/add', methods=['GET', 'POST'])
+@route('/sales/add', methods=['GET', 'POST'])
 @login_required
 def add_sale():
-    customers = Customer.query.all()
-    # only items with stock > 0 for sale selection
-    items = Item.query.filter(Item.current_quantity > 0).all()
-    
+    # The customer picker is loaded only when the form is rendered; items come from /api/items/search
     if request.method == 'POST':
         try:
-            # Debug logging for request data
-            app.logger.info("Processing sale creation request")
-            app.logger.info(f"Form data keys: {list(request.form.keys())}")
-            app.logger.info(f"Files: {list(request.files.keys()) if request.files else 'No files'}")
-            
             customer_id = request.form.get('customer_id')
             discount = Decimal(request.form.get('discount', '0') or '0')
             notes = request.form.get('notes', '')
             vat_enabled = request.form.get('vat_enabled') == 'on'
             excise_enabled = request.form.get('excise_enabled') == 'on'
             
-            # Log the extracted values
-            app.logger.info(f"Extracted values: customer_id={customer_id}, discount={discount}, vat_enabled={vat_enabled}, excise_enabled={excise_enabled}")
-            
             # Get sale items from form arrays
             item_ids = request.form.getlist('item_id[]')
             quantities = request.form.getlist('quantity[]')
             unit_prices = request.form.getlist('unit_price[]')
-            
-            app.logger.info(f"Item arrays: item_ids={item_ids}, quantities={quantities}, unit_prices={unit_prices}")
+            if log_payload():
+                current_app.logger.info("Sale form", extra={
+                    'customer_id': customer_id, 'discount': discount, 'vat_enabled': vat_enabled,
+                    'excise_enabled': excise_enabled, 'item_ids': item_ids, 'quantities': quantities,
+                    'unit_prices': unit_prices})
             
             if not item_ids:
                 flash('Please add at least one item to the sale', 'error')
-                return render_template('sales_form.html', customers=customers, items=items, title='Add Sale')
+                return render_sale_form()
             
-            # Calculate subtotal and prepare sale items
-            subtotal = Decimal('0.00')
+            # Validate the lines; amounts are computed below by the tax engine
             sale_items_data = []
             for i in range(len(item_ids)):
                 raw_item_id = item_ids[i]
@@ -332,54 +530,55 @@ def add_sale():
                 raw_up = unit_prices[i] if i < len(unit_prices) else '0'
                 if not raw_item_id:
                     flash('Select an item for sale or provide valid item id', 'error')
-                    return render_template('sales_form.html', customers=customers, items=items, title='Add Sale')
+                    return render_sale_form()
                 item_id = int(raw_item_id)
                 try:
                     quantity = Decimal(raw_qty)
                     unit_price = Decimal(raw_up)
                 except (InvalidOperation, TypeError):
                     flash('Invalid quantity or unit price', 'error')
-                    return render_template('sales_form.html', customers=customers, items=items, title='Add Sale')
-                
-                item = Item.query.get(item_id)
-                if not item:
-                    flash('Selected item not found', 'error')
-                    return render_template('sales_form.html', customers=customers, items=items, title='Add Sale')
-                if item.current_quantity < quantity:
-                    flash(f'Insufficient stock for {item.product}. Available: {item.current_quantity}', 'error')
-                    return render_template('sales_form.html', customers=customers, items=items, title='Add Sale')
+                    return render_sale_form()
+                if quantity <= 0:
+                    flash('Invalid quantity or unit price', 'error')
+                    return render_sale_form()
                 
-                total_price = (quantity * unit_price)
-                subtotal += total_price
                 sale_items_data.append({
                     'item_id': item_id,
                     'quantity': quantity,
-                    'unit_price': unit_price,
-                    'total_price': total_price
+                    'unit_price': unit_price
                 })
             
-            taxable_amount = subtotal - discount
-            if taxable_amount < 0:
-                taxable_amount = Decimal('0.00')
+            # The number is reserved before the first query of the transaction (see numbering.py)
+            bill_no = next_number("SALE")
             
-            # VAT 13% if enabled
-            vat_amount = (taxable_amount * Decimal('13.00') / Decimal('100.00')) if vat_enabled else Decimal('0.00')
-            # Excise: for sales we can check settings or assume 0 (leave as 0 unless you have specific excise logic)
-            excise_amount = Decimal('0.00')
+            # Load every line's item in one query; repeated items are checked on their total
+            requested = total_quantities((sd['item_id'], sd['quantity']) for sd in sale_items_data)
+            stock = load_stock(requested)
+            if len(stock) != len(requested):
+                flash('Selected item not found', 'error')
+                return render_sale_form()
+            shortages = find_shortages(requested, stock)
+            if shortages:
+                for product, available, _ in shortages:
+                    flash(f'Insufficient stock for {product}. Available: {available}', 'error')
+                return render_sale_form()
             
-            total_amount = taxable_amount + vat_amount + excise_amount
+            # Line totals, VAT and excise at the configured rates (see tax.py)
+            totals = compute_invoice([(sd['quantity'], sd['unit_price']) for sd in sale_items_data],
+                                     discount, vat_enabled, excise_enabled)
+            for sd, line_total in zip(sale_items_data, totals.line_totals):
+                sd['total_price'] = line_total
             
             # Create Sale: use bill_number (model expects bill_number, not invoice_number)
-            bill_no = generate_invoice_number("SALE")
             sale = Sale(
                 bill_number=bill_no,
                 customer_id=int(customer_id) if customer_id else None,
-                subtotal_amount=subtotal,
-                discount=discount,
-                taxable_amount=taxable_amount,
-                vat_amount=vat_amount,
-                excise_amount=excise_amount,
-                total_amount=total_amount,
+                subtotal_amount=totals.subtotal,
+                discount=totals.discount,
+                taxable_amount=totals.taxable,
+                vat_amount=totals.vat,
+                excise_amount=totals.excise,
+                total_amount=totals.total,
                 vat_enabled=vat_enabled,
                 excise_enabled=excise_enabled
             )
@@ -389,7 +588,7 @@ def add_sale():
             db.session.add(sale)
             db.session.flush()  # to get sale.id
             
-            # Add sale items and reduce inventory
+            # Add sale items
             for sd in sale_items_data:
                 sale_item = SaleItem(
                     sale_id=sale.id,
@@ -401,59 +600,107 @@ def add_sale():
                     excise_enabled=False
                 )
                 db.session.add(sale_item)
-                # decrement stock
-                item = Item.query.get(sd['item_id'])
-                item.current_quantity = (item.current_quantity or Decimal('0.00')) - sd['quantity']
+            
+            # Reduce inventory in one conditional UPDATE; fails if another sale took the stock first
+            decrement_stock(requested, reference=bill_no)
+            queue_sale(sale)
+            record_sale(sale, [(sd['item_id'], sd['quantity'], sd['total_price']) for sd in sale_items_data])
             
             db.session.commit()
+            wake_writer()
             flash('Sale created successfully!', 'success')
             return redirect(url_for('sales'))
+        except InsufficientStock as e:
+            db.session.rollback()
+            shortages = find_shortages(e.quantities)
+            for product, available, _ in shortages:
+                flash(f'Insufficient stock for {product}. Available: {available}', 'error')
+            if not shortages:
+                flash('Stock changed while the sale was being saved. Please try again.', 'error')
         except Exception as e:
             db.session.rollback()
-            app.logger.exception("Error creating sale")
-            # Enhanced error logging
-            app.logger.error(f"Sale creation failed with error: {str(e)}")
-            app.logger.error(f"Form data: customer_id={customer_id}, discount={discount}, notes={notes}")
-            app.logger.error(f"Item data: {sale_items_data}")
-            app.logger.error(f"Exception type: {type(e).__name__}")
+            # The form goes with the error so a failed sale can be reproduced
+            current_app.logger.exception("Error creating sale", extra={'form': request.form.to_dict(flat=False)})
             flash(f'Error creating sale: {str(e)}', 'error')
     
-    return render_template('sales_form.html', customers=customers, items=items, title='Add Sale')
+    return render_sale_form()
 
-@app.route('/sales/view/<int:id>')
+@route('/sales/view/<int:id>')
 @login_required
+@read_only
 def view_sale(id):
-    sale = Sale.query.get_or_404(id)
+    sale = (Sale.query.options(joinedload(Sale.customer), selectinload(Sale.items).joinedload(SaleItem.item))
+            .filter_by(id=id).first_or_404())
     return render_template('invoice.html', sale=sale, title='Sale Invoice')
 
-@app.route('/sales/delete/<int:id>')
+@route('/sales/delete/<int:id>')
 @login_required
+@writes
 def delete_sale(id):
-    sale = Sale.query.get_or_404(id)
+    sale = (Sale.query.options(selectinload(Sale.items))
+            .filter_by(id=id).first_or_404())
     
     # Restore inventory quantities
-    for sale_item in sale.items:
-        item = Item.query.get(sale_item.item_id)
-        item.current_quantity = (item.current_quantity or Decimal('0.00')) + sale_item.quantity
+    adjust_stock(total_quantities((line.item_id, line.quantity) for line in sale.items),
+                 'sale_void', sale.bill_number)
+    queue_sale(sale, reverse=True)
+    record_sale(sale, [(line.item_id, line.quantity, line.total_price) for line in sale.items], sign=-1)
     
     db.session.delete(sale)
     db.session.commit()
+    wake_writer()
     flash('Sale deleted successfully!', 'success')
     return redirect(url_for('sales'))
 
 # Purchase routes
-@app.route('/purchases')
+@route('/purchases')
 @login_required
+@read_only
 def purchases():
-    purchases = Purchase.query.order_by(Purchase.purchase_date.desc()).all()
-    return render_template('purchases.html', purchases=purchases)
+    query = filter_purchases(select(Purchase.id, Purchase.invoice_number, Vendor.name.label('vendor_name'),
+                                    Purchase.subtotal_amount, Purchase.discount, Purchase.total_amount,
+                                    Purchase.purchase_date))
+    page = paginate(query, PURCHASE_SORTS, Purchase.id, default_sort='date', default_desc=True)
+    return render_template('purchases.html', purchases=page.rows, page=page)
 
-@app.route('/purchases/add', methods=['GET', 'POST'])
+def filter_purchases(query):
+    """Join the vendor and apply the purchases list's search and date filters"""
+    query = query.outerjoin(Vendor, Purchase.vendor_id == Vendor.id)
+    term = search_term()
+    if term:
+        query = query.where(or_(Purchase.invoice_number.ilike(term), Vendor.name.ilike(term)))
+    return filter_date_range(query, Purchase.purchase_date)
+
+@route('/purchases/export.<any(csv, xlsx):fmt>')
+@login_required
+@read_only
+def export_purchases(fmt):
+    query = filter_purchases(select(Purchase.invoice_number, Purchase.purchase_date, Vendor.name,
+                                    Purchase.subtotal_amount, Purchase.discount, Purchase.taxable_amount,
+                                    Purchase.vat_amount, Purchase.excise_amount, Purchase.total_amount,
+                                    Purchase.payment_type)).order_by(Purchase.purchase_date, Purchase.id)
+    return export_response(query, ['Invoice Number', 'Date', 'Vendor', 'Subtotal', 'Discount', 'Taxable', 'VAT',
+                                   'Excise', 'Total', 'Payment'], 'purchases', fmt)
+
+@route('/purchases/lines/export.<any(csv, xlsx):fmt>')
+@login_required
+@read_only
+def export_purchase_lines(fmt):
+    query = filter_purchases(select(Purchase.invoice_number, Purchase.purchase_date, Vendor.name, Item.sn,
+                                    Item.product, PurchaseItem.quantity, PurchaseItem.unit_price,
+                                    PurchaseItem.total_price)
+                             .select_from(PurchaseItem).join(Purchase, PurchaseItem.purchase_id == Purchase.id)
+                             .outerjoin(Item, PurchaseItem.item_id == Item.id)
+                             ).order_by(Purchase.purchase_date, PurchaseItem.id)
+    return export_response(query, ['Invoice Number', 'Date', 'Vendor', 'SN', 'Product', 'Quantity', 'Unit Price',
+                                   'Line Total'], 'purchase-lines', fmt)
+
+def render_purchase_form():
+    return render_template('purchase_form.html', vendors=vendor_choices(), title='Add Purchase')
+
+@route('/purchases/add', methods=['GET', 'POST'])
 @login_required
 def add_purchase():
-    vendors = Vendor.query.all()
-    items = Item.query.all()
-    
     if request.method == 'POST':
         try:
             vendor_id = request.form.get('vendor_id')
@@ -476,11 +723,10 @@ def add_purchase():
             
             if not item_ids:
                 flash('Please add at least one item to the purchase', 'error')
-                return render_template('purchase_form.html', vendors=vendors, items=items, title='Add Purchase')
+                return render_purchase_form()
             
             # Build purchase item list, allowing creation of new items if item_id empty
             purchase_items_data = []
-            subtotal = Decimal('0.00')
             for i in range(len(item_ids)):
                 raw_item_id = item_ids[i]
                 raw_qty = quantities[i] if i < len(quantities) else '0'
@@ -490,7 +736,7 @@ def add_purchase():
                     unit_price = Decimal(raw_up)
                 except (InvalidOperation, TypeError):
                     flash('Invalid quantity or unit price entered', 'error')
-                    return render_template('purchase_form.html', vendors=vendors, items=items, title='Add Purchase')
+                    return render_purchase_form()
                 
                 product_name = products[i] if i < len(products) else ''
                 category = categories[i] if i < len(categories) else ''
@@ -509,14 +755,10 @@ def add_purchase():
                         sp_val = None
                 uom = uoms[i] if i < len(uoms) and uoms[i] else 'pcs'
                 
-                total_price = (unit_price * quantity)
-                subtotal += total_price
-                
                 purchase_items_data.append({
                     'item_id': int(raw_item_id) if raw_item_id else None,
                     'quantity': quantity,
                     'unit_price': unit_price,
-                    'total_price': total_price,
                     'product': product_name,
                     'category': category,
                     'brand': brand,
@@ -525,35 +767,26 @@ def add_purchase():
                     'uom': uom
                 })
             
-            taxable_amount = subtotal - discount
-            if taxable_amount < 0:
-                taxable_amount = Decimal('0.00')
-            
-            # VAT 13% if enabled
-            vat_amount = (taxable_amount * Decimal('13.00') / Decimal('100.00')) if vat_enabled else Decimal('0.00')
-            
-            # Excise: use vendor.excise_rate (if toggled on and vendor specified), else 0
-            excise_amount = Decimal('0.00')
-            if excise_enabled and vendor_id:
-                vendor_obj = Vendor.query.get(int(vendor_id))
-                if vendor_obj and vendor_obj.excise_rate:
-                    excise_rate = Decimal(str(vendor_obj.excise_rate))
-                    excise_amount = (taxable_amount * excise_rate / Decimal('100.00'))
+            # Invoice number: either posted or auto-generated, before the first query (see numbering.py)
+            invoice_no = request.form.get('invoice_number') or next_number("PUR")
             
-            total_amount = taxable_amount + vat_amount + excise_amount
-            
-            # Invoice number: either posted or auto-generated
-            invoice_no = request.form.get('invoice_number') or generate_invoice_number("PUR")
+            # Excise is charged at the vendor's rate (from the cached vendor list), none without a vendor
+            vendor = vendor_rates(int(vendor_id)) if vendor_id else None
+            totals = compute_invoice([(pid['quantity'], pid['unit_price']) for pid in purchase_items_data],
+                                     discount, vat_enabled, excise_enabled,
+                                     excise_rate=(vendor.excise_rate if vendor else None) or 0)
+            for pid, line_total in zip(purchase_items_data, totals.line_totals):
+                pid['total_price'] = line_total
             
             purchase = Purchase(
                 invoice_number=invoice_no,
                 vendor_id=int(vendor_id) if vendor_id else None,
-                subtotal_amount=subtotal,
-                discount=discount,
-                taxable_amount=taxable_amount,
-                vat_amount=vat_amount,
-                excise_amount=excise_amount,
-                total_amount=total_amount,
+                subtotal_amount=totals.subtotal,
+                discount=totals.discount,
+                taxable_amount=totals.taxable,
+                vat_amount=totals.vat,
+                excise_amount=totals.excise,
+                total_amount=totals.total,
                 vat_enabled=vat_enabled,
                 excise_enabled=excise_enabled
             )
@@ -564,6 +797,7 @@ def add_purchase():
             db.session.flush()  # get purchase.id
             
             # For each purchase item: either use existing item or create a new item
+            received = []
             for pid in purchase_items_data:
                 item_obj = None
                 if pid['item_id']:
@@ -581,8 +815,8 @@ def add_purchase():
                         wholesale=pid.get('cp') or pid.get('unit_price') or Decimal('0.00'),
                         sp=pid.get('sp') or pid.get('unit_price') or Decimal('0.00'),
                         uom=pid.get('uom') or 'pcs',
-                        opening_quantity=pid.get('quantity') or Decimal('0.00'),
-                        current_quantity=pid.get('quantity') or Decimal('0.00')
+                        opening_quantity=Decimal('0.00'),
+                        current_quantity=Decimal('0.00')  # the purchase below brings the stock in
                     )
                     db.session.add(item_obj)
                     db.session.flush()  # get item_obj.id
@@ -598,44 +832,105 @@ def add_purchase():
                     excise_enabled=excise_enabled
                 )
                 db.session.add(purchase_item)
-                
-                # update item current_quantity
-                item_obj.current_quantity = (item_obj.current_quantity or Decimal('0.00')) + pid['quantity']
+                received.append((item_obj.id, pid['quantity'], pid['total_price']))
+            
+            # update item current_quantity
+            adjust_stock(total_quantities((item_id, qty) for item_id, qty, _ in received), 'purchase', invoice_no)
+            queue_purchase(purchase)
+            record_purchase(purchase, received)
             
             db.session.commit()
+            wake_writer()
             flash('Purchase created successfully!', 'success')
             return redirect(url_for('purchases'))
         except Exception as e:
             db.session.rollback()
-            app.logger.exception("Error creating purchase")
+            current_app.logger.exception("Error creating purchase")
             flash(f'Error creating purchase: {str(e)}', 'error')
     
-    return render_template('purchase_form.html', vendors=vendors, items=items, title='Add Purchase')
+    return render_purchase_form()
 
-@app.route('/purchases/view/<int:id>')
+@route('/purchases/view/<int:id>')
 @login_required
+@read_only
 def view_purchase(id):
-    purchase = Purchase.query.get_or_404(id)
+    purchase = (Purchase.query.options(joinedload(Purchase.vendor),
+                                       selectinload(Purchase.items).joinedload(PurchaseItem.item))
+                .filter_by(id=id).first_or_404())
     return render_template('invoice.html', purchase=purchase, title='Purchase Invoice')
 
-@app.route('/purchases/delete/<int:id>')
+@route('/purchases/delete/<int:id>')
 @login_required
+@writes
 def delete_purchase(id):
-    purchase = Purchase.query.get_or_404(id)
+    purchase = (Purchase.query.options(selectinload(Purchase.items))
+                .filter_by(id=id).first_or_404())
     
     # Restore inventory quantities (subtract the purchase quantity)
-    for purchase_item in purchase.items:
-        item = Item.query.get(purchase_item.item_id)
-        item.current_quantity = (item.current_quantity or Decimal('0.00')) - purchase_item.quantity
+    adjust_stock({item_id: -qty for item_id, qty in
+                  total_quantities((line.item_id, line.quantity) for line in purchase.items).items()},
+                 'purchase_void', purchase.invoice_number)
+    queue_purchase(purchase, reverse=True)
+    record_purchase(purchase, [(line.item_id, line.quantity, line.total_price) for line in purchase.items], sign=-1)
     
     db.session.delete(purchase)
     db.session.commit()
+    wake_writer()
     flash('Purchase deleted successfully!', 'success')
     return redirect(url_for('purchases'))
 
+# Ledger reports (posted by the ledger writer, see ledger.py)
+@route('/ledger/<any(sales, purchases):name>')
+@login_required
+@read_only
+def ledger_report(name):
+    model, number_column, _, _ = LEDGERS[name]
+    number = getattr(model, number_column)
+    query = select(model.id, model.date, model.particular, number.label('document_number'), model.amount)
+    term = search_term()
+    if term:
+        query = query.where(or_(number.ilike(term), model.particular.ilike(term)))
+    query = filter_date_range(query, model.date)
+    total = db.session.scalar(select(func.coalesce(func.sum(query.subquery().c.amount), 0)))
+    page = paginate(query, {'date': model.date, 'amount': model.amount}, model.id,
+                    default_sort='date', default_desc=True)
+    pending = db.session.scalar(select(func.count()).select_from(LedgerOutbox).where(LedgerOutbox.ledger == name))
+    return render_template('ledger.html', name=name, entries=page.rows, page=page, total=total, pending=pending)
+
+# Sales / purchase reports (read only the rollup tables, see rollups.py)
+@route('/reports')
+@login_required
+def reports_index():
+    return redirect(url_for('reports', kind='sales', by='day'))
+
+@route('/reports/<any(sales, purchases):kind>/<any(day, item, party, category):by>')
+@login_required
+@read_only
+def reports(kind, by):
+    today = datetime.utcnow().date()
+    try:
+        start = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d').date()
+    except ValueError:
+        start = today.replace(day=1)
+    try:
+        end = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d').date()
+    except ValueError:
+        end = today
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    rows = report(kind, by, start, end, limit)
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'kind': kind, 'by': by, 'start': start.isoformat(), 'end': end.isoformat(),
+            'rows': [{'label': label, 'detail': detail, 'count': float(count or 0), 'amount': float(amount or 0)}
+                     for label, detail, count, amount in rows],
+        })
+    return render_template('reports.html', kind=kind, by=by, start=start, end=end, rows=rows,
+                           total=sum((row[3] or 0 for row in rows), Decimal('0')))
+
 # API routes for dynamic data
-@app.route('/api/item/<int:id>')
+@route('/api/item/<int:id>')
 @login_required
+@read_only
 def get_item(id):
     item = Item.query.get_or_404(id)
     return jsonify({
@@ -645,3 +940,94 @@ def get_item(id):
         'current_quantity': float(item.current_quantity),
         'uom': item.uom
     })
+
+def item_json(row):
+    return {
+        'id': row.id,
+        'sn': row.sn,
+        'product': row.product,
+        'sp': float(row.sp),
+        'wholesale': float(row.wholesale),
+        'current_quantity': float(row.current_quantity or 0),
+        'uom': row.uom,
+    }
+
+def requested_item_ids():
+    """``?ids=1,2,3`` as a list of ints; 400 on junk or too many ids"""
+    try:
+        ids = sorted({int(part) for part in request.args.get('ids', '').split(',') if part.strip()})
+    except ValueError:
+        abort(400)
+    if len(ids) > MAX_API_ITEMS:
+        abort(400)
+    return ids
+
+def conditional_item_json(build):
+    """JSON from ``build()``, tagged with the items version; 304 without a query when it still matches"""
+    version = items_version()
+    etag = f"items-{version}"
+    if version is not None and request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    if version is not None:
+        response.set_etag(etag, weak=True)
+    # Revalidate every time; the 304 is a single counter read
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@route('/api/items')
+@login_required
+@read_only
+def get_items():
+    ids = requested_item_ids()
+    def build():
+        rows = db.session.execute(
+            select(Item.id, Item.sn, Item.product, Item.sp, Item.wholesale, Item.current_quantity, Item.uom)
+            .where(Item.id.in_(ids))) if ids else []
+        return {'items': [item_json(row) for row in rows]}
+    return conditional_item_json(build)
+
+@route('/api/scan')
+@login_required
+def scan_item():
+    """Barcode scan: price and stock for ``?sn=``, from the in-process map"""
+    sn = request.args.get('sn', '').strip()
+    entry = scan_cache.lookup(sn) if sn else None
+    if entry is None:
+        return jsonify({'error': 'Unknown serial number', 'sn': sn}), 404
+    return jsonify({
+        'id': entry.id,
+        'sn': sn,
+        'sp': float(entry.sp),
+        'wholesale': float(entry.wholesale),
+        'current_quantity': float(entry.current_quantity or 0),
+        'uom': entry.uom,
+    })
+
+@route('/api/items/search')
+@login_required
+@read_only
+def search_items_api():
+    """Typeahead: ``?q=`` words matched as prefixes over sn/product/brand/category"""
+    rows = search_items(request.args.get('q', ''), limit=request.args.get('limit', 20, type=int),
+                        in_stock=bool(request.args.get('in_stock')))
+    return jsonify({'items': [dict(item_json(row), brand=row.brand, category=row.category, cp=float(row.cp))
+                              for row in rows]})
+
+@route('/api/items/snapshot')
+@login_required
+@read_only
+def item_snapshot():
+    """Price and stock for the ``?ids=`` given (or every item) as compact rows"""
+    ids = requested_item_ids() if request.args.get('ids') else None
+    def build():
+        query = select(Item.id, Item.sp, Item.wholesale, Item.current_quantity).order_by(Item.id)
+        if ids is not None:
+            query = query.where(Item.id.in_(ids))
+        return {
+            'fields': ['id', 'sp', 'wholesale', 'current_quantity'],
+            'items': [[row.id, float(row.sp), float(row.wholesale), float(row.current_quantity or 0)]
+                      for row in db.session.execute(query)],
+        }
+    return conditional_item_json(build)
@@ -0,0 +1,143 @@
+"""Process-local serial number lookup for barcode scans at the till.
+
+Each worker keeps ``{sn: ScanEntry}`` for the whole catalogue in memory and
+answers scans from it. At most every ``SCAN_CACHE_CHECK_INTERVAL`` seconds
+a scan reads the two item version counters (one indexed query, see
+counters.py) to see whether anything changed:
+
+* ``item_catalogue_version`` moved (item added, edited, deleted or
+  imported): the map is reloaded.
+* only ``items_version`` moved (stock changed): the items with stock
+  movements since the last check are re-read and just their
+  ``current_quantity`` is updated.
+
+Stock movements can commit out of id order under concurrent writers on
+Postgres, so the map is also reloaded in full every ``SCAN_CACHE_MAX_AGE``
+seconds. The map is warmed on a background thread when a worker serves its
+first request.
+"""
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import func, select
+
+import counters
+from app import db
+from models import Item, StatCounter, StockMovement
+
+logger = logging.getLogger(__name__)
+
+ScanEntry = namedtuple('ScanEntry', 'id sp wholesale uom current_quantity')
+
+_state = {
+    'entries': {},       # sn -> ScanEntry
+    'sns': {},           # item id -> sn
+    'versions': None,    # counter values the map reflects
+    'movement_id': 0,    # highest stock movement applied
+    'checked_at': None,  # time.monotonic() of the last version check
+    'loaded_at': None,   # time.monotonic() of the last full load
+}
+_lock = threading.Lock()
+_warm = {'pid': None}
+_warm_lock = threading.Lock()
+
+
+def _read_versions():
+    keys = (counters.ITEMS_VERSION_KEY, counters.ITEM_CATALOGUE_KEY)
+    values = dict(db.session.execute(
+        select(StatCounter.name, StatCounter.value).where(StatCounter.name.in_(keys))).all())
+    return tuple(values.get(key) for key in keys)
+
+
+def _entry(row):
+    return ScanEntry(row.id, row.sp, row.wholesale, row.uom, row.current_quantity)
+
+
+def _load(versions, now):
+    # Read the watermark first: movements that land during the load are re-read next time
+    movement_id = db.session.scalar(select(func.coalesce(func.max(StockMovement.id), 0)))
+    entries, sns = {}, {}
+    for row in db.session.execute(
+            select(Item.sn, Item.id, Item.sp, Item.wholesale, Item.uom, Item.current_quantity)):
+        entries[row.sn] = _entry(row)
+        sns[row.id] = row.sn
+    _state.update(entries=entries, sns=sns, versions=versions, movement_id=movement_id, loaded_at=now)
+    logger.info("Scan cache loaded %d items", len(entries))
+
+
+def _refresh_stock(versions):
+    moved = db.session.execute(
+        select(StockMovement.item_id, func.max(StockMovement.id))
+        .where(StockMovement.id > _state['movement_id'])
+        .group_by(StockMovement.item_id)).all()
+    if moved:
+        stock = db.session.execute(
+            select(Item.id, Item.current_quantity).where(Item.id.in_([item_id for item_id, _ in moved])))
+        entries, sns = _state['entries'], _state['sns']
+        for item_id, quantity in stock:
+            sn = sns.get(item_id)
+            if sn in entries:
+                entries[sn] = entries[sn]._replace(current_quantity=quantity)
+        _state['movement_id'] = max(last_id for _, last_id in moved)
+    _state['versions'] = versions
+
+
+def sync(force=False):
+    """Bring the map up to date if the check interval has passed (or ``force``)"""
+    config = current_app.config
+    now = time.monotonic()
+    with _lock:
+        loaded_at, checked_at = _state['loaded_at'], _state['checked_at']
+        if not force and checked_at is not None and now - checked_at < config['SCAN_CACHE_CHECK_INTERVAL']:
+            return
+        versions = _read_versions()
+        if force or loaded_at is None or now - loaded_at >= config['SCAN_CACHE_MAX_AGE'] \
+                or versions[1] != _state['versions'][1]:
+            _load(versions, now)
+        elif versions != _state['versions']:
+            _refresh_stock(versions)
+        _state['checked_at'] = now
+
+
+def lookup(sn):
+    """The :class:`ScanEntry` for ``sn``, or None if no item has it"""
+    sync()
+    entry = _state['entries'].get(sn)
+    if entry is None:
+        # Not in the map (e.g. created since the last check): ask the database
+        row = db.session.execute(
+            select(Item.id, Item.sp, Item.wholesale, Item.uom, Item.current_quantity).where(Item.sn == sn)).first()
+        if row is not None:
+            entry = _entry(row)
+            with _lock:
+                _state['entries'][sn] = entry
+                _state['sns'][row.id] = sn
+    return entry
+
+
+def _warm_up(app):
+    with app.app_context():
+        try:
+            sync(force=True)
+        except Exception:
+            logger.exception("Scan cache warm-up failed; it will load on the first scan")
+            db.session.rollback()
+        finally:
+            db.session.remove()
+
+
+def init_app(app):
+    @app.before_request
+    def warm_scan_cache():
+        # Once per worker process, off the request thread
+        if _warm['pid'] == os.getpid():
+            return
+        with _warm_lock:
+            if _warm['pid'] == os.getpid():
+                return
+            _warm['pid'] = os.getpid()
+        threading.Thread(target=_warm_up, args=(app,), name='scan-cache-warm-up', daemon=True).start()
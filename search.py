@@ -0,0 +1,96 @@
+"""Typeahead search over items (``sn``, ``product``, ``brand``, ``category``).
+
+On SQLite the search runs against the ``items_fts`` FTS5 table created by
+migration 0006; triggers on ``items`` keep it in step with every write, so
+there is nothing to maintain here. Each word typed becomes a prefix match
+and all words must match. On Postgres the words are matched with ILIKE
+against one concatenated expression backed by a ``pg_trgm`` GIN index and
+ranked by trigram similarity. Elsewhere (or on a SQLite build without FTS5)
+it falls back to plain LIKE.
+
+A batch migration that rebuilds ``items`` on SQLite drops its triggers;
+such a migration must recreate them from 0006.
+"""
+import re
+
+from sqlalchemy import column, func, inspect, literal_column, or_, select, table
+
+from app import db
+from models import Item
+
+MAX_RESULTS = 50
+MAX_WORDS = 8
+# Same token characters as the FTS5 tokenizer, so a serial number stays one word
+WORD = re.compile(r"[\w\-./]+")
+
+items_fts = table('items_fts', column('rowid'), column('rank'))
+
+RESULT_COLUMNS = (Item.id, Item.sn, Item.product, Item.brand, Item.category, Item.cp, Item.wholesale, Item.sp,
+                  Item.current_quantity, Item.uom)
+
+_fts_available = None
+
+
+def search_expression():
+    """The text the Postgres trigram index is built on (must match migration 0006)"""
+    return (func.coalesce(Item.sn, '') + ' ' + func.coalesce(Item.product, '') + ' '
+            + func.coalesce(Item.brand, '') + ' ' + func.coalesce(Item.category, ''))
+
+
+def _words(term):
+    return WORD.findall(term or '')[:MAX_WORDS]
+
+
+def _like_pattern(word):
+    escaped = word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def has_fts():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = (db.engine.dialect.name == 'sqlite'
+                          and inspect(db.engine).has_table('items_fts'))
+    return _fts_available
+
+
+def _fts_query(words):
+    match = ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+    return (select(*RESULT_COLUMNS)
+            .select_from(items_fts)
+            .join(Item, Item.id == items_fts.c.rowid)
+            .where(literal_column('items_fts').op('MATCH')(match))
+            .order_by(items_fts.c.rank))
+
+
+def _trigram_query(words, term):
+    expression = search_expression()
+    query = select(*RESULT_COLUMNS)
+    for word in words:
+        query = query.where(expression.ilike(_like_pattern(word), escape='\\'))
+    return query.order_by(func.similarity(expression, term).desc(), Item.product)
+
+
+def _like_query(words):
+    query = select(*RESULT_COLUMNS)
+    for word in words:
+        pattern = _like_pattern(word)
+        query = query.where(or_(*(col.ilike(pattern, escape='\\')
+                                  for col in (Item.sn, Item.product, Item.brand, Item.category))))
+    return query.order_by(Item.product)
+
+
+def search_items(term, limit=20, in_stock=False):
+    """Best matches for ``term`` as rows of ``RESULT_COLUMNS``; empty for an empty term"""
+    words = _words(term)
+    if not words:
+        return []
+    if has_fts():
+        query = _fts_query(words)
+    elif db.engine.dialect.name == 'postgresql':
+        query = _trigram_query(words, ' '.join(words))
+    else:
+        query = _like_query(words)
+    if in_stock:
+        query = query.where(Item.current_quantity > 0)
+    return db.session.execute(query.limit(min(max(limit, 1), MAX_RESULTS))).all()
@@ -0,0 +1,243 @@
+"""Synthetic data for load testing: ``flask seed``.
+
+Generates customers, vendors, items, sales and purchases at production-like
+volumes. The defaults are 50k items, 5k customers, 500 vendors and 200k
+sales of 1-9 lines (about 1M sale lines), and ``--scale`` shrinks or grows
+all of them together. Rows go in with multi-row Core INSERTs, one
+transaction per chunk of documents.
+
+Sales and purchases are dated over the past ``--days`` days. Their totals
+come from :func:`tax.compute_invoice`. Every line also gets its stock
+movement, and each item ends with opening stock plus purchases minus sales.
+Ledger entries are written as already posted. The counters and reporting
+rollups are rebuilt at the end, so the database looks like one the
+application built itself. Output is deterministic for a given
+``--random-seed``. Seeded serial numbers start with ``SEED`` and seeding
+refuses to run twice.
+"""
+import random
+import string
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import click
+from sqlalchemy import bindparam, insert, select, update
+
+import counters
+import rollups
+from app import db
+from models import (Customer, Vendor, Item, Sale, SaleItem, Purchase, PurchaseItem, SalesLedger, PurchaseLedger,
+                    StockMovement)
+from ledger import CASH_PARTICULAR
+from tax import compute_invoice, rates
+
+SN_PREFIX = 'SEED'
+DEFAULT_VOLUMES = {'items': 50000, 'customers': 5000, 'vendors': 500, 'sales': 200000, 'purchases': 20000}
+MAX_LINES = 9
+CHUNK_SIZE = 2000
+
+CATEGORIES = ['Beverages', 'Snacks', 'Dairy', 'Bakery', 'Household', 'Personal Care', 'Stationery', 'Electronics',
+              'Hardware', 'Frozen', 'Produce', 'Spices']
+BRANDS = ['Acme', 'Himal', 'Everest', 'Sunrise', 'Royal', 'Golden', 'Pure', 'Fresh Farm', 'Classic', 'Prime']
+ADJECTIVES = ['Premium', 'Classic', 'Organic', 'Family', 'Mini', 'Large', 'Lite', 'Extra', 'Spicy', 'Sweet']
+NOUNS = ['Tea', 'Coffee', 'Biscuits', 'Noodles', 'Soap', 'Shampoo', 'Rice', 'Lentils', 'Oil', 'Juice', 'Notebook',
+         'Pen', 'Battery', 'Bulb', 'Detergent', 'Butter', 'Cheese', 'Bread', 'Chips', 'Sauce']
+UOMS = ['pcs', 'kg', 'ltr', 'box', 'pack']
+FIRST_NAMES = ['Aarav', 'Sita', 'Ram', 'Gita', 'Hari', 'Maya', 'Bikash', 'Anita', 'Suman', 'Pooja', 'Ramesh',
+               'Kiran', 'Nabin', 'Sunita', 'Deepak', 'Asha']
+LAST_NAMES = ['Shrestha', 'Sharma', 'Thapa', 'Gurung', 'Rai', 'Karki', 'Adhikari', 'Tamang', 'Magar', 'Joshi']
+COMPANY_SUFFIXES = ['Traders', 'Suppliers', 'Distributors', 'Enterprises', 'Wholesale', 'Trading Co.']
+
+
+def _money(rng, low, high):
+    return Decimal(rng.randint(int(low * 100), int(high * 100))) / 100
+
+
+def _phone(rng):
+    return '98' + ''.join(rng.choice(string.digits) for _ in range(8))
+
+
+def _insert_returning_ids(model, rows):
+    """Insert ``rows`` and return their new ids in the same order"""
+    return list(db.session.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows))
+
+
+def _chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+def seed_parties(rng, customers, vendors):
+    """Insert customers and vendors; returns ``{id: (name, None)}`` and ``{id: (name, excise_rate)}``"""
+    customer_names, vendor_rates = {}, {}
+    for start, count in _chunks(customers, CHUNK_SIZE):
+        rows = []
+        for n in range(start, start + count):
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {n + 1}"
+            rows.append({'name': name, 'email': f"customer{n + 1}@example.com", 'phone': _phone(rng),
+                         'address': f"Ward {rng.randint(1, 32)}, Kathmandu", 'balance': Decimal('0.00')})
+        customer_names.update((customer_id, (row['name'], None))
+                              for customer_id, row in zip(_insert_returning_ids(Customer, rows), rows))
+        db.session.commit()
+    for start, count in _chunks(vendors, CHUNK_SIZE):
+        rows = []
+        for n in range(start, start + count):
+            rows.append({'name': f"{rng.choice(LAST_NAMES)} {rng.choice(COMPANY_SUFFIXES)} {n + 1}",
+                         'email': f"vendor{n + 1}@example.com", 'phone': _phone(rng),
+                         'address': f"Ward {rng.randint(1, 32)}, Lalitpur", 'balance': Decimal('0.00'),
+                         'tax_number': str(rng.randint(100000000, 999999999)),
+                         'discount_rate': Decimal('0.00'), 'vat_rate': Decimal('13.00'),
+                         'excise_rate': rng.choice([Decimal('0.00'), Decimal('0.00'), Decimal('5.00')])})
+        ids = _insert_returning_ids(Vendor, rows)
+        vendor_rates.update((vendor_id, (row['name'], row['excise_rate'])) for vendor_id, row in zip(ids, rows))
+        db.session.commit()
+    return customer_names, vendor_rates
+
+
+def seed_items(rng, items, now):
+    """Insert items with opening stock; returns ``{id: (sp, cp)}`` and ``{id: opening quantity}``"""
+    prices, opening = {}, {}
+    for start, count in _chunks(items, CHUNK_SIZE):
+        rows = []
+        for n in range(start, start + count):
+            cp = _money(rng, 5, 2000)
+            quantity = Decimal(rng.randint(100, 5000))
+            rows.append({'sn': f"{SN_PREFIX}{n + 1:07d}",
+                         'product': f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {n + 1}",
+                         'category': rng.choice(CATEGORIES), 'brand': rng.choice(BRANDS), 'cp': cp,
+                         'wholesale': (cp * Decimal('1.10')).quantize(Decimal('0.01')),
+                         'sp': (cp * Decimal('1.25')).quantize(Decimal('0.01')), 'uom': rng.choice(UOMS),
+                         'opening_quantity': quantity, 'current_quantity': quantity, 'created_at': now})
+        ids = _insert_returning_ids(Item, rows)
+        db.session.execute(insert(StockMovement), [
+            {'item_id': item_id, 'quantity': row['opening_quantity'], 'reason': 'opening', 'reference': None,
+             'created_at': now} for item_id, row in zip(ids, rows)])
+        for item_id, row in zip(ids, rows):
+            prices[item_id] = (row['sp'], row['cp'])
+            opening[item_id] = row['opening_quantity']
+        db.session.commit()
+    return prices, opening
+
+
+# kind -> (document, line, ledger, number column, date column, party column, line FK / ledger FK,
+#          ledger number column, number prefix, stock sign)
+DOCUMENTS = {
+    'sales': (Sale, SaleItem, SalesLedger, 'bill_number', 'sale_date', 'customer_id', 'sale_id', 'bill_no',
+              'SALE-SEED', -1),
+    'purchases': (Purchase, PurchaseItem, PurchaseLedger, 'invoice_number', 'purchase_date', 'vendor_id',
+                  'purchase_id', 'invoice_no', 'PUR-SEED', 1),
+}
+
+
+def seed_documents(rng, kind, total, parties, prices, days, now, stock):
+    """Insert ``total`` sales or purchases with their lines, stock movements and ledger entries.
+
+    ``parties`` is ``{id: (name, excise rate or None)}``; ``stock``
+    (``{item_id: quantity}``) is moved by every line.
+    """
+    (document, line, ledger, number_column, date_column, party_column, fk, ledger_number, prefix,
+     sign) = DOCUMENTS[kind]
+    reason = 'sale' if kind == 'sales' else 'purchase'
+    current_rates = rates()
+    item_ids = list(prices)
+    party_ids = list(parties)
+    for start, count in _chunks(total, CHUNK_SIZE):
+        documents, lines = [], []
+        for n in range(start, start + count):
+            party_id = rng.choice(party_ids) if party_ids and rng.random() > 0.1 else None
+            chosen = rng.sample(item_ids, min(len(item_ids), rng.randint(1, MAX_LINES)))
+            quantities = [Decimal(rng.randint(1, 5) if kind == 'sales' else rng.randint(10, 100)) for _ in chosen]
+            unit_prices = [prices[item_id][0 if kind == 'sales' else 1] for item_id in chosen]
+            vat_enabled, excise_enabled = rng.random() < 0.7, rng.random() < 0.1
+            # Purchases use the vendor's excise rate (none without a vendor), sales the configured one
+            excise_rate = parties[party_id][1] if party_id else None
+            if kind == 'purchases' and excise_rate is None:
+                excise_rate = Decimal('0.00')
+            discount = _money(rng, 0, 50) if rng.random() < 0.2 else Decimal('0.00')
+            totals = compute_invoice(zip(quantities, unit_prices), discount, vat_enabled, excise_enabled,
+                                     excise_rate=excise_rate, current_rates=current_rates)
+            when = now - timedelta(days=rng.uniform(0, days))
+            documents.append({number_column: f"{prefix}-{n + 1:07d}", party_column: party_id,
+                              'subtotal_amount': totals.subtotal, 'discount': totals.discount,
+                              'taxable_amount': totals.taxable, 'vat_amount': totals.vat,
+                              'excise_amount': totals.excise, 'total_amount': totals.total,
+                              'vat_enabled': vat_enabled, 'excise_enabled': excise_enabled,
+                              'payment_type': rng.choice(['cash', 'cash', 'credit', 'bank']),
+                              date_column: when, 'notes': ''})
+            lines.append([{'item_id': item_id, 'quantity': quantity, 'unit_price': unit_price,
+                           'total_price': line_total, 'vat_enabled': vat_enabled, 'excise_enabled': excise_enabled}
+                          for item_id, quantity, unit_price, line_total
+                          in zip(chosen, quantities, unit_prices, totals.line_totals)])
+
+        ids = _insert_returning_ids(document, documents)
+        line_rows, movements, postings = [], [], []
+        for document_id, row, document_lines in zip(ids, documents, lines):
+            for line_row in document_lines:
+                line_rows.append(dict(line_row, **{fk: document_id}))
+                movements.append({'item_id': line_row['item_id'], 'quantity': sign * line_row['quantity'],
+                                  'reason': reason, 'reference': row[number_column],
+                                  'created_at': row[date_column]})
+                stock[line_row['item_id']] += sign * line_row['quantity']
+            party = row[party_column]
+            postings.append({'date': row[date_column], 'amount': row['total_amount'], fk: document_id,
+                             ledger_number: row[number_column], 'created_at': row[date_column],
+                             'particular': parties[party][0] if party else CASH_PARTICULAR})
+        db.session.execute(insert(line), line_rows)
+        db.session.execute(insert(StockMovement), movements)
+        db.session.execute(insert(ledger), postings)
+        db.session.commit()
+
+
+def seed(items, customers, vendors, sales, purchases, days=365, random_seed=42, progress=None):
+    """Generate the data set; ``progress`` is called with a message before each stage"""
+    progress = progress or (lambda message: None)
+    rng = random.Random(random_seed)
+    now = datetime.utcnow()
+
+    progress(f"{customers} customers, {vendors} vendors")
+    customer_names, vendor_rates = seed_parties(rng, customers, vendors)
+    progress(f"{items} items")
+    prices, stock = seed_items(rng, items, now)
+    opening = dict(stock)
+    progress(f"{purchases} purchases")
+    seed_documents(rng, 'purchases', purchases, vendor_rates, prices, days, now, stock)
+    progress(f"{sales} sales")
+    seed_documents(rng, 'sales', sales, customer_names, prices, days, now, stock)
+
+    progress("stock levels")
+    changed = [{'match_id': item_id, 'current_quantity': quantity}
+               for item_id, quantity in stock.items() if quantity != opening[item_id]]
+    table = Item.__table__
+    for start, count in _chunks(len(changed), CHUNK_SIZE * 5):
+        db.session.execute(update(table).where(table.c.id == bindparam('match_id'))
+                           .values(current_quantity=bindparam('current_quantity')), changed[start:start + count])
+    db.session.commit()
+
+    progress("counters and rollups")
+    counters.rebuild_counters()
+    rollups.rebuild_rollups()
+
+
+def init_app(app):
+    @app.cli.command('seed')
+    @click.option('--scale', type=float, default=1.0, show_default=True,
+                  help='Multiply every default volume (e.g. 0.01 for a quick data set).')
+    @click.option('--items', type=int, help=f"Items (default {DEFAULT_VOLUMES['items']} x scale).")
+    @click.option('--customers', type=int, help=f"Customers (default {DEFAULT_VOLUMES['customers']} x scale).")
+    @click.option('--vendors', type=int, help=f"Vendors (default {DEFAULT_VOLUMES['vendors']} x scale).")
+    @click.option('--sales', type=int, help=f"Sales, 1-{MAX_LINES} lines each "
+                                            f"(default {DEFAULT_VOLUMES['sales']} x scale).")
+    @click.option('--purchases', type=int, help=f"Purchases (default {DEFAULT_VOLUMES['purchases']} x scale).")
+    @click.option('--days', type=int, default=365, show_default=True, help='Spread documents over this many days.')
+    @click.option('--random-seed', type=int, default=42, show_default=True)
+    def seed_command(scale, days, random_seed, **volumes):
+        """Fill the database with synthetic data for load testing."""
+        if db.session.scalar(select(Item.id).where(Item.sn.like(f"{SN_PREFIX}%")).limit(1)) is not None:
+            raise click.ClickException("This database has already been seeded.")
+        for name, default in DEFAULT_VOLUMES.items():
+            if volumes[name] is None:
+                volumes[name] = max(1, int(default * scale))
+        started = datetime.utcnow()
+        seed(days=days, random_seed=random_seed, progress=lambda message: click.echo(f"Seeding {message}..."),
+             **volumes)
+        click.echo(f"Seeded in {(datetime.utcnow() - started).total_seconds():.0f}s.")
@@ -0,0 +1,90 @@
+"""Connection settings for running on SQLite in production.
+
+Every new SQLite connection is switched to WAL (readers no longer block the
+writer or each other) with ``synchronous=NORMAL``, which is durable across
+application crashes in WAL mode and skips an fsync per commit. It also gets
+a busy timeout, so a writer waits for the lock instead of failing with
+"database is locked", plus a larger page cache, in-memory temp tables and
+memory-mapped reads.
+
+pysqlite's own transaction handling is turned off and SQLAlchemy emits the
+``BEGIN`` itself, as recommended in the SQLAlchemy SQLite dialect docs, so
+savepoints work. A write transaction begins with ``BEGIN IMMEDIATE``
+(``SQLITE_BEGIN_MODE``) and takes the write lock before its first read.
+Begun deferred, it would start as a WAL read snapshot, and if another
+connection committed before its first write, that write would fail with
+SQLITE_BUSY_SNAPSHOT ("database is locked") without waiting on the busy
+timeout. Writers are what :func:`db_routing.writes_expected` says: POST
+(PUT, PATCH, DELETE) requests, views marked ``@writes``, CLI commands and
+background threads. Every other transaction, and every transaction on the
+reader bind, begins deferred and never holds the write lock.
+
+Settings (``SQLITE_*`` config keys, all overridable from the environment
+in app.py) are applied by listeners on the app's own engines, registered
+by :func:`init_app` before the first connection is opened.
+"""
+import logging
+
+from sqlalchemy import event
+
+from db_routing import READER_BIND, writes_expected
+
+logger = logging.getLogger(__name__)
+
+BEGIN_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+def _pragmas(config):
+    return [
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', int(config['SQLITE_BUSY_TIMEOUT_MS'])),
+        # Negative cache_size is in KiB rather than pages
+        ('cache_size', -int(config['SQLITE_CACHE_SIZE_KB'])),
+        ('temp_store', 'MEMORY'),
+        ('mmap_size', int(config['SQLITE_MMAP_SIZE'])),
+    ]
+
+
+def init_app(app, db):
+    app.config.setdefault('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config.setdefault('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    app.config.setdefault('SQLITE_CACHE_SIZE_KB', 64 * 1024)
+    app.config.setdefault('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+    app.config.setdefault('SQLITE_BEGIN_MODE', 'IMMEDIATE')
+    write_mode = app.config['SQLITE_BEGIN_MODE'].upper()
+    if write_mode not in BEGIN_MODES:
+        raise ValueError(f"SQLITE_BEGIN_MODE must be one of {', '.join(BEGIN_MODES)}")
+    pragmas = _pragmas(app.config)
+    journal_mode = app.config['SQLITE_JOURNAL_MODE']
+
+    def configure_sqlite_connection(dbapi_connection, connection_record):
+        # Let SQLAlchemy issue BEGIN (below) instead of pysqlite's implicit one
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+            mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+            if mode.upper() != journal_mode.upper():
+                # e.g. in-memory databases, which cannot use WAL
+                logger.debug("SQLite journal_mode is %s, not %s", mode, journal_mode)
+        finally:
+            cursor.close()
+
+    def begin_sqlite_transaction(connection):
+        connection.exec_driver_sql(f"BEGIN {write_mode}" if writes_expected() else "BEGIN")
+
+    def begin_read_transaction(connection):
+        # The reader's connections are query_only and must not queue behind writers
+        connection.exec_driver_sql("BEGIN")
+
+    # On this app's engines rather than the Engine class, so another create_app() in the same
+    # process (tests, CLI) neither stacks a second BEGIN nor runs with this app's settings
+    with app.app_context():
+        engines = dict(db.engines)
+    for key, engine in engines.items():
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', configure_sqlite_connection)
+            event.listen(engine, 'begin', begin_read_transaction if key == READER_BIND else begin_sqlite_transaction)
@@ -214,6 +214,11 @@ function initializeTableEnhancements() {
         // Add hover effects
         table.classList.add('table-hover');
         
+        // Paginated list pages search and sort on the server
+        if (table.hasAttribute('data-server-sort')) {
+            return;
+        }
+        
         // Add search functionality for large tables
         if (table.rows.length > 10) {
             addTableSearch(table);
@@ -400,6 +405,49 @@ function debounce(func, wait) {
     };
 }
 
+/**
+ * Item Typeahead
+ * Fills ``select`` with matches from the item search endpoint as ``input`` is typed.
+ * ``options.describe(item)`` gives the option text, ``options.data(item)`` its data-* values.
+ */
+function attachItemSearch(input, select, options) {
+    let latest = 0;
+    const search = debounce(function() {
+        const q = input.value.trim();
+        if (q.length < 2) {
+            return;
+        }
+        const params = new URLSearchParams({ q: q, limit: options.limit || 20 });
+        if (options.inStock) {
+            params.set('in_stock', '1');
+        }
+        const request = ++latest;
+        fetch(options.url + '?' + params, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.ok ? response.json() : { items: [] })
+            .then(data => {
+                if (request !== latest) {
+                    return;  // a newer search is in flight
+                }
+                // Keep the placeholder and the current choice, replace the rest
+                Array.from(select.options).forEach(option => {
+                    if (option.value && !option.selected) {
+                        option.remove();
+                    }
+                });
+                data.items.forEach(item => {
+                    if (String(item.id) === select.value) {
+                        return;
+                    }
+                    const option = new Option(options.describe(item), item.id);
+                    Object.assign(option.dataset, options.data(item));
+                    select.add(option);
+                });
+            })
+            .catch(() => {});
+    }, 200);
+    input.addEventListener('input', search);
+}
+
 /**
  * Show Toast Notification
  */
@@ -560,5 +608,6 @@ window.AccountingSystem = {
     showButtonLoading,
     hideButtonLoading,
     confirmDelete,
-    formatCurrency
+    formatCurrency,
+    attachItemSearch
 };
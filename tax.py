@@ -0,0 +1,236 @@
+"""Invoice totals and tax rates.
+
+:func:`compute_invoice` turns an invoice's lines, discount and tax toggles
+into every stored amount in one pass. Line totals, VAT and excise are
+rounded half-up to the cent. VAT and the sales excise rate are read from
+the ``settings`` table (``vat_rate``, ``sale_excise_rate``, as percentages)
+and cached per process against the ``settings_version`` counter. Purchase
+excise uses the vendor's own ``excise_rate``.
+
+After a rate changes, ``flask recalculate-taxes --since DATE`` recomputes
+VAT, excise and totals for stored invoices in chunks. The arithmetic is
+vectorised over integer cents, so it is exact and rounds the same way as
+:func:`compute_invoice`. Every total that moves also moves the party
+rollups and the day's revenue counter. A correcting posting is queued for
+the ledgers in the same transaction.
+"""
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+import click
+from sqlalchemy import bindparam, select, update
+
+import counters
+from app import db
+from ledger import queue_corrections
+from models import Customer, Vendor, Sale, Purchase, Settings
+from rollups import adjust_document_totals
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+HUNDRED = Decimal('100')
+RECALCULATE_CHUNK_SIZE = 2000
+
+# settings key -> default percentage
+RATE_SETTINGS = {
+    'vat_rate': Decimal('13.00'),
+    'sale_excise_rate': Decimal('0.00'),
+}
+
+Rates = namedtuple('Rates', 'vat sale_excise')
+InvoiceTotals = namedtuple('InvoiceTotals', 'line_totals subtotal discount taxable vat excise total')
+
+_cache = {'version': None, 'rates': None}
+_cache_lock = threading.Lock()
+
+
+def _cents(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _parse_rate(key, value):
+    try:
+        rate = Decimal(value)
+    except (InvalidOperation, TypeError):
+        logger.warning("Ignoring invalid %s setting %r", key, value)
+        return RATE_SETTINGS[key]
+    return rate
+
+
+def _load_rates():
+    stored = dict(db.session.execute(
+        select(Settings.key, Settings.value).where(Settings.key.in_(RATE_SETTINGS))).all())
+    values = {key: _parse_rate(key, stored[key]) if key in stored else default
+              for key, default in RATE_SETTINGS.items()}
+    return Rates(vat=values['vat_rate'], sale_excise=values['sale_excise_rate'])
+
+
+def rates():
+    """Current :class:`Rates`; one counter read unless a setting changed"""
+    version = counters.settings_version()
+    with _cache_lock:
+        if version is not None and _cache['version'] == version:
+            return _cache['rates']
+
+    current = _load_rates()
+    with _cache_lock:
+        _cache['version'], _cache['rates'] = version, current
+    return current
+
+
+def compute_invoice(lines, discount=0, vat_enabled=False, excise_enabled=False, excise_rate=None,
+                    current_rates=None):
+    """Totals for ``(quantity, unit_price)`` lines.
+
+    ``excise_rate`` overrides the sales excise rate (purchases pass the
+    vendor's). The discount comes off the subtotal before tax and the
+    taxable amount never goes below zero.
+    """
+    current_rates = current_rates or rates()
+    line_totals = [_cents(Decimal(quantity) * Decimal(unit_price)) for quantity, unit_price in lines]
+    subtotal = sum(line_totals, Decimal('0.00'))
+    discount = _cents(discount or 0)
+    taxable = max(subtotal - discount, Decimal('0.00'))
+    vat = _cents(taxable * current_rates.vat / HUNDRED) if vat_enabled else Decimal('0.00')
+    if excise_rate is None:
+        excise_rate = current_rates.sale_excise
+    excise = _cents(taxable * Decimal(excise_rate or 0) / HUNDRED) if excise_enabled else Decimal('0.00')
+    return InvoiceTotals(line_totals, subtotal, discount, taxable, vat, excise, taxable + vat + excise)
+
+
+# ------------------------
+# Batch recalculation
+# ------------------------
+# kind (also the ledger name) -> (document model, date column, party column, party name column, number column)
+DOCUMENTS = {
+    'sales': (Sale, Sale.sale_date, Sale.customer_id, Customer.name, Sale.bill_number),
+    'purchases': (Purchase, Purchase.purchase_date, Purchase.vendor_id, Vendor.name, Purchase.invoice_number),
+}
+
+
+def _hundredths(series):
+    """Amounts as integer cents, or percentages as hundredths of a percent (13.00 -> 1300)"""
+    return series.map(lambda value: int(_cents(value or 0) * 100)).astype('int64')
+
+
+def _percent_of(cents, points):
+    """``cents * points / 10000`` rounded half-up; ``cents`` is never negative"""
+    return (cents * points + 5000) // 10000
+
+
+def _document_query(kind):
+    document, when, party, party_name, number = DOCUMENTS[kind]
+    columns = [document.id, when, party, party_name, number, document.taxable_amount, document.vat_amount,
+               document.excise_amount, document.total_amount, document.vat_enabled, document.excise_enabled]
+    if kind == 'purchases':
+        query = select(*columns, Vendor.excise_rate).outerjoin(Vendor, Purchase.vendor_id == Vendor.id)
+    else:
+        query = select(*columns).outerjoin(Customer, Sale.customer_id == Customer.id)
+    return query
+
+
+def recalculate_chunk(kind, rows, current_rates):
+    """Rewrite VAT/excise/total for one chunk of ``_document_query`` rows; returns how many changed"""
+    import pandas as pd
+
+    document, _, _, _, _ = DOCUMENTS[kind]
+    frame = pd.DataFrame(rows, columns=['id', 'when', 'party_id', 'party_name', 'number', 'taxable', 'vat',
+                                        'excise', 'total', 'vat_enabled', 'excise_enabled']
+                         + (['excise_rate'] if kind == 'purchases' else []), dtype=object)
+    taxable = _hundredths(frame['taxable']).clip(lower=0)
+    vat_points = int(_cents(current_rates.vat) * 100)
+    if kind == 'purchases':
+        excise_points = _hundredths(frame['excise_rate'])
+    else:
+        excise_points = int(_cents(current_rates.sale_excise) * 100)
+
+    vat = _percent_of(taxable, vat_points).where(frame['vat_enabled'].fillna(False).astype(bool), 0)
+    excise = _percent_of(taxable, excise_points).where(frame['excise_enabled'].fillna(False).astype(bool), 0)
+    total = taxable + vat + excise
+    delta = total - _hundredths(frame['total'])
+    changed = (vat != _hundredths(frame['vat'])) | (excise != _hundredths(frame['excise'])) | (delta != 0)
+    if not changed.any():
+        return 0
+
+    def money(cents):
+        return Decimal(int(cents)) / 100
+
+    table = document.__table__
+    db.session.execute(
+        update(table).where(table.c.id == bindparam('match_id'))
+        .values(vat_amount=bindparam('vat_amount'), excise_amount=bindparam('excise_amount'),
+                total_amount=bindparam('total_amount')),
+        [{'match_id': int(row_id), 'vat_amount': money(v), 'excise_amount': money(e), 'total_amount': money(t)}
+         for row_id, v, e, t in zip(frame['id'][changed], vat[changed], excise[changed], total[changed])])
+
+    moved = frame[changed & (delta != 0)].assign(delta=delta[changed & (delta != 0)])
+    if len(moved):
+        adjust_document_totals(kind, [(row.when, row.party_id, money(row.delta)) for row in moved.itertuples()
+                                      if row.when is not None])
+        queue_corrections(kind, [{'source_id': int(row.id), 'date': row.when or datetime.utcnow(),
+                                  'particular': row.party_name, 'document_number': row.number,
+                                  'amount': money(row.delta)} for row in moved.itertuples()])
+        if kind == 'sales':
+            revenue = {}
+            for row in moved.itertuples():
+                if row.when is not None:
+                    key = counters.revenue_key(row.when.date())
+                    revenue[key] = revenue.get(key, Decimal('0')) + money(row.delta)
+            counters.adjust(revenue)
+    return int(changed.sum())
+
+
+def recalculate(kind, since, chunk_size=RECALCULATE_CHUNK_SIZE, dry_run=False):
+    """Recompute stored invoices of ``kind`` dated ``since`` or later; returns ``(checked, changed)``"""
+    document, when, _, _, _ = DOCUMENTS[kind]
+    current_rates = rates()
+    base = _document_query(kind).where(when >= since).order_by(document.id).limit(chunk_size)
+    checked = changed = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(base.where(document.id > last_id)).all()
+        if not rows:
+            break
+        checked += len(rows)
+        changed += recalculate_chunk(kind, rows, current_rates)
+        last_id = rows[-1][0]
+        if dry_run:
+            db.session.rollback()
+        else:
+            # One transaction per chunk keeps the write lock short; each chunk is self-consistent
+            db.session.commit()
+    return checked, changed
+
+
+def init_app(app):
+    @app.cli.command('set-tax-rate')
+    @click.argument('key', type=click.Choice(sorted(RATE_SETTINGS)))
+    @click.argument('value')
+    def set_tax_rate_command(key, value):
+        """Store a tax rate (percent) in settings."""
+        try:
+            Decimal(value)
+        except InvalidOperation:
+            raise click.BadParameter(f"{value!r} is not a number", param_hint='VALUE')
+        setting = db.session.scalar(select(Settings).where(Settings.key == key))
+        if setting is None:
+            db.session.add(Settings(key=key, value=value))
+        else:
+            setting.value = value
+        db.session.commit()
+        click.echo(f"{key} = {value}%. Run `flask recalculate-taxes` to apply it to stored invoices.")
+
+    @app.cli.command('recalculate-taxes')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), required=True,
+                  help='Recalculate invoices dated on or after this day.')
+    @click.option('--kind', type=click.Choice(['sales', 'purchases', 'all']), default='all')
+    @click.option('--dry-run', is_flag=True, help='Report what would change without writing.')
+    def recalculate_taxes_command(since, kind, dry_run):
+        """Recompute VAT, excise and totals of stored invoices with the current rates."""
+        for name in (DOCUMENTS if kind == 'all' else [kind]):
+            checked, changed = recalculate(name, since, dry_run=dry_run)
+            click.echo(f"{name}: {changed} of {checked} invoices {'would change' if dry_run else 'updated'}.")
@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on a fresh, migrated SQLite file, as a web worker sees it"""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('AUTO_MIGRATE', '1')
+    monkeypatch.setenv('LEDGER_WRITER', '0')
+    monkeypatch.setenv('LOG_FORMAT', 'text')
+    monkeypatch.setenv('LOG_LEVEL', 'WARNING')
+    monkeypatch.setenv('PROFILE_DIR', str(tmp_path / 'profiles'))
+    monkeypatch.setenv('JINJA_BYTECODE_CACHE_DIR', '')
+
+    import numbering
+    import scan_cache
+    import tax
+    from app import create_app, db
+    # Number blocks, tax rates and the scan map are cached per process; the last test's belong to another database
+    numbering._blocks.clear()
+    tax._cache.update(version=None, rates=None)
+    scan_cache._state.update(entries={}, sns={}, versions=None, movement_id=0, checked_at=None, loaded_at=None)
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def stock(app):
+    """Five items with 1000 in stock, a customer and a vendor"""
+    from app import db
+    from models import Customer, Item, Vendor
+
+    with app.app_context():
+        for n in range(5):
+            db.session.add(Item(sn=f"SN{n}", product=f"Product {n}", cp=1, wholesale=1, sp=2, uom='pcs',
+                                opening_quantity=1000, current_quantity=1000))
+        db.session.add(Customer(name='Customer'))
+        db.session.add(Vendor(name='Vendor'))
+        db.session.commit()
+
+
+def logged_in_client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['username'] = 'admin'
+    return client
+
+
+def sale_form(item_ids=(1, 2), quantity='1'):
+    return {'customer_id': '1', 'discount': '0', 'item_id[]': [str(item_id) for item_id in item_ids],
+            'quantity[]': [quantity] * len(item_ids), 'unit_price[]': ['2'] * len(item_ids)}
+
+
+def purchase_form(item_ids=(1,), quantity='5'):
+    return {'vendor_id': '1', 'discount': '0', 'item_id[]': [str(item_id) for item_id in item_ids],
+            'quantity[]': [quantity] * len(item_ids), 'unit_price[]': ['1'] * len(item_ids)}
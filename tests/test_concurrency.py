@@ -0,0 +1,59 @@
+import threading
+
+from conftest import logged_in_client, purchase_form, sale_form
+
+WRITERS = 4
+SALES_PER_WRITER = 10
+READERS = 3
+
+
+def run_threads(targets):
+    errors = []
+
+    def guarded(target):
+        try:
+            target()
+        except Exception as e:  # reported on the main thread
+            errors.append(e)
+
+    threads = [threading.Thread(target=guarded, args=(target,)) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+    assert not errors, errors
+
+
+def test_concurrent_sales_and_reads(app, stock):
+    from app import db
+    from models import Item, Purchase, Sale
+
+    # Small blocks so reservations commit while other sales are in their transactions
+    app.config['DOCUMENT_NUMBER_BLOCK_SIZE'] = 2
+    writing = threading.Event()
+    statuses = []
+
+    def writer():
+        client = logged_in_client(app)
+        for _ in range(SALES_PER_WRITER):
+            statuses.append(client.post('/sales/add', data=sale_form()).status_code)
+        statuses.append(client.post('/purchases/add', data=purchase_form()).status_code)
+
+    def reader():
+        client = logged_in_client(app)
+        while not writing.is_set():
+            for path in ('/sales', '/items', '/'):
+                assert client.get(path).status_code == 200
+
+    def writers():
+        run_threads([writer] * WRITERS)
+        writing.set()
+
+    run_threads([writers] + [reader] * READERS)
+
+    assert statuses == [302] * len(statuses)
+    with app.app_context():
+        assert db.session.query(Sale).count() == WRITERS * SALES_PER_WRITER
+        assert db.session.query(Purchase).count() == WRITERS
+        assert len(set(db.session.scalars(db.select(Sale.bill_number)))) == WRITERS * SALES_PER_WRITER
+        assert db.session.get(Item, 1).current_quantity == 1000 - WRITERS * SALES_PER_WRITER + 5 * WRITERS
@@ -0,0 +1,36 @@
+import csv
+import io
+
+import pytest
+
+from conftest import logged_in_client
+
+MALICIOUS = ['=HYPERLINK("http://evil.example","x")', '+1+1', '-2+3', '@SUM(A1)']
+
+
+@pytest.fixture
+def customers(app):
+    from app import db
+    from models import Customer
+
+    with app.app_context():
+        for name in MALICIOUS:
+            db.session.add(Customer(name=name, address='Main St'))
+        db.session.commit()
+
+
+def test_csv_export_neutralises_formulas(app, customers):
+    response = logged_in_client(app).get('/customers/export.csv')
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True).lstrip('\ufeff'))))
+    assert [row[1] for row in rows[1:]] == ["'" + name for name in MALICIOUS]
+    assert rows[1][4] == 'Main St'
+
+
+def test_xlsx_export_neutralises_formulas(app, customers):
+    from openpyxl import load_workbook
+
+    response = logged_in_client(app).get('/customers/export.xlsx')
+    sheet = load_workbook(io.BytesIO(response.data)).active
+    names = [row[1].value for row in sheet.iter_rows(min_row=2)]
+    assert names == ["'" + name for name in MALICIOUS]
+    assert all(row[1].data_type == 's' for row in sheet.iter_rows(min_row=2))
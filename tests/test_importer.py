@@ -0,0 +1,66 @@
+from decimal import Decimal
+
+import pandas as pd
+
+COLUMNS = ['sn', 'product', 'category', 'brand', 'cp', 'wholesale', 'sp', 'uom', 'opening_quantity']
+
+
+def test_rows_are_classified_as_inserts_and_updates(app, stock):
+    from app import db
+    from importer import import_item_frame
+    from models import Item, StockMovement
+
+    frame = pd.DataFrame([
+        ['SN0', 'Renamed', 'Tea', 'B', '1', '1', '2', 'pcs', '50'],
+        ['NEW1', 'New 1', 'Tea', 'B', '1', '1', '2', 'pcs', '10'],
+        ['NEW2', 'New 2', 'Tea', 'B', '1', '1', '3', 'pcs', '10'],
+        # Next chunk: a repeat of a serial number the first chunk inserted
+        ['NEW2', 'New 2', 'Tea', 'B', '1', '1', '4', 'pcs', '20'],
+    ], columns=COLUMNS)
+    with app.app_context():
+        result = import_item_frame(frame, chunk_size=3)
+        assert (result.success_count, result.inserted, result.updated, result.error_count) == (4, 2, 2, 0)
+
+        items = {item.sn: item for item in db.session.query(Item)}
+        assert len(items) == 7
+        assert (items['SN0'].product, items['SN0'].current_quantity) == ('Renamed', Decimal('50'))
+        assert (items['NEW2'].sp, items['NEW2'].current_quantity) == (Decimal('4'), Decimal('20'))
+        # Every stock change the import made is in the movements ledger
+        moved = dict(db.session.execute(db.select(StockMovement.item_id, db.func.sum(StockMovement.quantity))
+                                        .group_by(StockMovement.item_id)).all())
+        assert moved == {items['SN0'].id: Decimal('-950'), items['NEW1'].id: Decimal('10'),
+                         items['NEW2'].id: Decimal('20')}
+
+
+def test_a_csv_import_writes_its_rejected_rows(app, stock, tmp_path):
+    from app import db
+    from models import Item
+    from utils import process_import_file
+
+    upload = tmp_path / 'items.csv'
+    upload.write_text(','.join(COLUMNS) + '\n'
+                      'SN0,Renamed,Tea,B,1,1,2,pcs,50\n'
+                      ',No serial,Tea,B,1,1,2,pcs,5\n'
+                      'NEW1,New 1,Tea,B,1,1,2,pcs,10\n'
+                      'NEW2,New 2,Tea,B,abc,1,2,pcs,10\n'
+                      'NEW3,New 3,Tea,B,1,1,2,pcs,\n')
+    rejects = tmp_path / 'rejects' / 'items.csv'
+    progress = []
+    with app.app_context():
+        success, message = process_import_file(str(upload), chunk_size=2, commit_each_chunk=True,
+                                               progress=progress.append, rejects_path=str(rejects))
+        assert success
+        result = progress[-1]
+        assert (result.success_count, result.inserted, result.updated, result.error_count) == (3, 2, 1, 2)
+        assert message.startswith('Processed 3 items successfully. 2 errors: ')
+        assert sorted(db.session.scalars(db.select(Item.sn).where(Item.sn.like('NEW%')))) == ['NEW1', 'NEW3']
+        assert db.session.scalar(db.select(Item.product).where(Item.sn == 'SN0')) == 'Renamed'
+    assert not upload.exists()
+
+    # Rejects from both chunks, with their source row numbers and the raw values
+    written = pd.read_csv(rejects, dtype=str, keep_default_na=False)
+    assert list(written.columns) == ['row', 'error'] + COLUMNS
+    assert written[['row', 'error', 'sn', 'cp']].values.tolist() == [
+        ['3', 'sn is required', '', '1'],
+        ['5', 'invalid cp abc', 'NEW2', 'abc'],
+    ]
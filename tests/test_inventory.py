@@ -0,0 +1,53 @@
+from datetime import datetime
+from decimal import Decimal
+
+from conftest import logged_in_client, purchase_form, sale_form
+
+
+def day(n):
+    return datetime(2024, 1, n)
+
+
+def test_snapshots_and_movements_give_the_stock_at_any_date(app, stock):
+    from app import db
+    from inventory import stock_at, take_snapshot
+    from models import StockMovement
+
+    client = logged_in_client(app)
+    assert client.post('/purchases/add', data=purchase_form()).status_code == 302
+    assert client.post('/sales/add', data=sale_form(item_ids=(1,))).status_code == 302
+    assert client.post('/sales/add', data=sale_form(item_ids=(1,), quantity='2')).status_code == 302
+
+    with app.app_context():
+        # +5 on the 1st, -1 on the 3rd, -2 on the 5th
+        for movement_id, n in ((1, 1), (2, 3), (3, 5)):
+            db.session.execute(db.update(StockMovement).where(StockMovement.id == movement_id)
+                               .values(created_at=day(n)))
+        db.session.commit()
+
+        def replayed(at):
+            return db.session.scalar(db.select(db.func.coalesce(db.func.sum(StockMovement.quantity), 0))
+                                     .where(StockMovement.item_id == 1, StockMovement.created_at <= at))
+
+        expected = [Decimal(n) for n in (5, 5, 4, 4, 2, 2)]
+        assert [replayed(day(n)) for n in range(1, 7)] == expected
+        for snapshot_day in (2, 4):
+            take_snapshot(day(snapshot_day))
+            assert [stock_at(1, day(n)) for n in range(1, 7)] == expected
+
+
+def test_deleting_an_item_deletes_its_stock_history(app, stock):
+    from app import db
+    from inventory import take_snapshot
+    from models import Item, StockMovement, StockSnapshot
+
+    client = logged_in_client(app)
+    assert client.post('/purchases/add', data=purchase_form(item_ids=(1, 2))).status_code == 302
+    with app.app_context():
+        take_snapshot(datetime.utcnow())
+
+    assert client.get('/items/delete/1').status_code == 302
+    with app.app_context():
+        assert db.session.get(Item, 1) is None
+        for model in (StockMovement, StockSnapshot):
+            assert db.session.scalars(db.select(model.item_id)).all() == [2]
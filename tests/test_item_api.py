@@ -0,0 +1,27 @@
+from conftest import logged_in_client, sale_form
+
+
+def test_item_data_is_revalidated_by_etag(app, stock):
+    from app import db
+    from models import Item
+
+    client = logged_in_client(app)
+    for url in ('/api/items?ids=1,2', '/api/items/snapshot'):
+        first = client.get(url)
+        assert first.status_code == 200 and first.headers['ETag']
+        assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    etag = client.get('/api/items?ids=1,2').headers['ETag']
+    # A sale moves stock with a Core UPDATE, outside the ORM
+    assert client.post('/sales/add', data=sale_form()).status_code == 302
+    response = client.get('/api/items?ids=1,2', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert {item['id']: item['current_quantity'] for item in response.get_json()['items']} == {1: 999, 2: 999}
+
+    etag = response.headers['ETag']
+    with app.app_context():
+        db.session.get(Item, 1).sp = 5
+        db.session.commit()
+    response = client.get('/api/items?ids=1,2', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert {item['id']: item['sp'] for item in response.get_json()['items']} == {1: 5, 2: 2}
@@ -0,0 +1,100 @@
+import threading
+
+from sqlalchemy import update
+
+from conftest import logged_in_client, purchase_form, sale_form
+
+SALES = 30
+
+
+def test_checkouts_while_the_writer_drains(app, stock):
+    from app import db
+    from ledger import drain
+    from models import LedgerOutbox, Sale, SalesLedger
+
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        # What the background writer does, without waiting between drains
+        with app.app_context():
+            try:
+                while not stop.is_set():
+                    drain(batch_size=1)
+                    db.session.remove()
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        client = logged_in_client(app)
+        statuses = [client.post('/sales/add', data=sale_form()).status_code for _ in range(SALES)]
+    finally:
+        stop.set()
+        thread.join(30)
+
+    assert not errors, errors
+    assert statuses == [302] * SALES
+    with app.app_context():
+        drain()
+        assert db.session.query(Sale).count() == SALES
+        assert db.session.query(SalesLedger).count() == SALES
+        assert db.session.query(LedgerOutbox).count() == 0
+
+
+def test_documents_without_a_date_can_be_deleted(app, stock):
+    from app import db
+    from ledger import drain
+    from models import Purchase, PurchaseLedger, Sale, SalesLedger
+
+    client = logged_in_client(app)
+    assert client.post('/sales/add', data=sale_form()).status_code == 302
+    assert client.post('/purchases/add', data=purchase_form()).status_code == 302
+    with app.app_context():
+        # Legacy rows from before the dates were filled in
+        db.session.execute(update(Sale).values(sale_date=None))
+        db.session.execute(update(Purchase).values(purchase_date=None))
+        db.session.commit()
+
+    assert client.get('/sales/delete/1').status_code == 302
+    assert client.get('/purchases/delete/1').status_code == 302
+    with app.app_context():
+        drain()
+        assert db.session.query(Sale).count() == 0 and db.session.query(Purchase).count() == 0
+        # The posting and its reversal cancel out
+        assert sum(entry.amount for entry in db.session.query(SalesLedger)) == 0
+        assert sum(entry.amount for entry in db.session.query(PurchaseLedger)) == 0
+
+
+def test_the_writer_takes_the_write_lock_only_when_there_is_work(app, stock):
+    from sqlalchemy import event
+
+    from app import db
+    from ledger import drain_pending
+    from models import SalesLedger
+
+    begins = []
+
+    def record_begin(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('BEGIN'):
+            begins.append(statement)
+
+    def drain_as_the_writer():
+        # An app context and no request, as in the writer thread
+        begins.clear()
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', record_begin)
+            try:
+                return drain_pending()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record_begin)
+
+    assert drain_as_the_writer() == 0
+    assert begins == ['BEGIN']
+
+    assert logged_in_client(app).post('/sales/add', data=sale_form()).status_code == 302
+    assert drain_as_the_writer() == 1
+    assert begins[0] == 'BEGIN' and 'BEGIN IMMEDIATE' in begins[1:]
+    with app.app_context():
+        assert db.session.query(SalesLedger).count() == 1
@@ -0,0 +1,31 @@
+def client_as(app, username=None):
+    client = app.test_client()
+    if username:
+        with client.session_transaction() as session:
+            session['user_id'] = 1
+            session['username'] = username
+    return client
+
+
+def test_metrics_closed_by_default(app):
+    assert client_as(app).get('/metrics').status_code == 401
+    assert client_as(app, 'clerk').get('/metrics').status_code == 403
+
+
+def test_metrics_for_admin_users(app):
+    response = client_as(app, 'admin').get('/metrics')
+    assert response.status_code == 200
+    assert b'http_request_duration_seconds' in response.data
+
+
+def test_metrics_with_bearer_token(app):
+    app.config['METRICS_TOKEN'] = 'secret'
+    client = client_as(app)
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+
+def test_server_timing_only_for_metrics_users(app):
+    assert 'Server-Timing' not in client_as(app).get('/login').headers
+    assert 'Server-Timing' not in client_as(app, 'clerk').get('/').headers
+    assert client_as(app, 'admin').get('/').headers['Server-Timing'].startswith('db;dur=')
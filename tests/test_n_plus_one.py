@@ -0,0 +1,48 @@
+import logging
+
+import pytest
+from flask import Response
+
+from conftest import logged_in_client, sale_form
+
+SALES = 12
+
+
+@pytest.fixture
+def sales(app, stock):
+    client = logged_in_client(app)
+    for _ in range(SALES):
+        assert client.post('/sales/add', data=sale_form()).status_code == 302
+
+
+def lazy_load_items(app):
+    """One request that lazily loads every sale's lines, one query per sale"""
+    from models import Sale
+
+    with app.test_request_context('/sales'):
+        app.preprocess_request()
+        for sale in Sale.query.all():
+            list(sale.items)
+        app.process_response(Response())
+
+
+def test_lazy_load_loop_is_reported_in_debug_mode(app, sales, caplog):
+    # Debug switched on after create_app(), as app.run(debug=True) does
+    app.debug = True
+    with caplog.at_level(logging.WARNING, logger='n_plus_one'):
+        lazy_load_items(app)
+    assert any(f"Sale.items lazily loaded {SALES} times" in message for message in caplog.messages)
+
+
+def test_lazy_load_loop_raises_with_nplusone_raise(app, sales):
+    from n_plus_one import NPlusOneError
+
+    app.config.update(NPLUSONE_DETECT=True, NPLUSONE_RAISE=True)
+    with pytest.raises(NPlusOneError):
+        lazy_load_items(app)
+
+
+def test_nothing_reported_outside_debug_mode(app, sales, caplog):
+    with caplog.at_level(logging.WARNING, logger='n_plus_one'):
+        lazy_load_items(app)
+    assert not [message for message in caplog.messages if 'Possible N+1' in message]
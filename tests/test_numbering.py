@@ -0,0 +1,49 @@
+import pytest
+
+from conftest import logged_in_client, purchase_form, sale_form
+
+
+def test_every_sale_refilling_the_block_is_saved(app, stock):
+    from app import db
+    from models import Purchase, Sale
+
+    # A block of one makes every sale reserve on its own connection
+    app.config['DOCUMENT_NUMBER_BLOCK_SIZE'] = 1
+    client = logged_in_client(app)
+    for _ in range(5):
+        assert client.post('/sales/add', data=sale_form()).status_code == 302
+    assert client.post('/purchases/add', data=purchase_form()).status_code == 302
+
+    with app.app_context():
+        numbers = db.session.scalars(db.select(Sale.bill_number).order_by(Sale.id)).all()
+        assert len(set(numbers)) == 5
+        assert numbers[0].endswith('-000001') and numbers[-1].endswith('-000005')
+        assert db.session.query(Purchase).count() == 1
+
+
+def test_next_number_refuses_an_open_transaction(app, stock):
+    from app import db
+    from models import Item
+    from numbering import next_number
+
+    with app.app_context():
+        db.session.get(Item, 1)
+        with pytest.raises(RuntimeError):
+            next_number('SALE')
+
+
+def test_fiscal_year_defaults_to_the_utc_date(app, monkeypatch):
+    from datetime import datetime
+
+    import numbering
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return cls(2024, 7, 15, 23, 30)
+
+    monkeypatch.setattr(numbering, 'datetime', FrozenDatetime)
+    app.config['FISCAL_YEAR_START'] = '07-16'
+    with app.app_context():
+        assert numbering.fiscal_year() == '2023-24'
+        assert numbering.fiscal_year(FrozenDatetime(2024, 7, 16).date()) == '2024-25'
@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import select, update
+
+QUANTITIES = [5, None, 3, None, 5, 1, None, 3, 2]
+
+
+@pytest.fixture
+def items(app):
+    from app import db
+    from models import Item
+
+    with app.app_context():
+        for n in range(len(QUANTITIES)):
+            db.session.add(Item(sn=f"SN{n}", product=f"Product {n}", cp=1, wholesale=1, sp=2, uom='pcs',
+                                opening_quantity=0, current_quantity=0))
+        db.session.flush()
+        for item_id, quantity in enumerate(QUANTITIES, start=1):
+            db.session.execute(update(Item).where(Item.id == item_id).values(current_quantity=quantity))
+        db.session.commit()
+
+
+def expected_order(descending):
+    # NULL sorts lowest (first ascending, last descending); ties go by id
+    keys = sorted((quantity is not None, quantity or 0, item_id)
+                  for item_id, quantity in enumerate(QUANTITIES, start=1))
+    return [item_id for _, _, item_id in (reversed(keys) if descending else keys)]
+
+
+def page(app, **args):
+    from models import Item
+    from pagination import paginate
+
+    with app.test_request_context('/items', query_string={'sort': 'stock', 'per_page': 2, **args}):
+        result = paginate(select(Item.id, Item.current_quantity), {'stock': Item.current_quantity}, Item.id,
+                          default_sort='stock')
+        return [row.id for row in result], result.next_cursor, result.prev_cursor
+
+
+@pytest.mark.parametrize('direction', ['asc', 'desc'])
+def test_pages_cross_null_sort_values(app, items, direction):
+    pages = [page(app, dir=direction)]
+    while pages[-1][1]:
+        pages.append(page(app, dir=direction, after=pages[-1][1]))
+    forward = [item_id for ids, _, _ in pages for item_id in ids]
+    assert forward == expected_order(direction == 'desc')
+
+    # Back from the last page, through cursors that hold NULL
+    ids, _, cursor = pages[-1]
+    backward = list(ids)
+    while cursor:
+        ids, _, cursor = page(app, dir=direction, before=cursor)
+        backward = ids + backward
+    assert backward == forward
+
+
+def test_cursor_holding_null_is_accepted(app, items):
+    ids, cursor, _ = page(app, dir='asc')
+    assert QUANTITIES[ids[-1] - 1] is None
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    assert client.get(f'/items?sort=stock&per_page=2&after={cursor}').status_code == 200
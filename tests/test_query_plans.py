@@ -0,0 +1,18 @@
+def test_hot_queries_use_their_indexes(app):
+    from query_plans import check_query_plans
+
+    with app.app_context():
+        failures = check_query_plans()
+    assert not failures, '\n'.join(f"{description}: expected {index}\n    {plan}"
+                                   for description, index, plan in failures)
+
+
+def test_a_dropped_index_is_reported(app):
+    from app import db
+    from query_plans import check_query_plans
+
+    with app.app_context():
+        db.session.execute(db.text('DROP INDEX ix_customers_name'))
+        db.session.commit()
+        failed = {description for description, _, _ in check_query_plans()}
+    assert {'customers by name', 'customers page by name', 'customers page by name, later'} <= failed
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import logged_in_client, sale_form
+
+
+def saved_rows():
+    from app import db
+    from models import LedgerOutbox, RollupDayItem, RollupDayParty, RollupMonthCategory, Sale, SaleItem
+
+    return {model.__tablename__: db.session.query(model).count()
+            for model in (Sale, SaleItem, LedgerOutbox, RollupDayItem, RollupDayParty, RollupMonthCategory)}
+
+
+@pytest.mark.parametrize('stock_seen', ['current', 'stale'])
+def test_an_oversold_sale_is_rejected(app, stock, monkeypatch, stock_seen):
+    import routes
+    from app import db
+    from models import Item, Sale, StockMovement
+
+    if stock_seen == 'stale':
+        # Another sale took the stock after the form's check, so the conditional UPDATE has to catch it
+        real_load_stock = routes.load_stock
+        monkeypatch.setattr(routes, 'load_stock', lambda ids: {
+            item_id: SimpleNamespace(id=item_id, product=row.product, current_quantity=10 ** 6)
+            for item_id, row in real_load_stock(ids).items()})
+    with app.app_context():
+        before = saved_rows()
+        movements = db.session.query(StockMovement).count()
+
+    client = logged_in_client(app)
+    response = client.post('/sales/add', data=sale_form(item_ids=(1, 2), quantity='1001'))
+    assert response.status_code == 200
+    assert b'Insufficient stock for Product 1' in response.data
+
+    with app.app_context():
+        assert [item.current_quantity for item in db.session.query(Item).order_by(Item.id)] == [1000] * 5
+        assert saved_rows() == before
+        assert db.session.query(StockMovement).count() == movements
+
+    # The rejected sale's number is skipped, never saved
+    assert client.post('/sales/add', data=sale_form()).status_code == 302
+    with app.app_context():
+        numbers = db.session.scalars(db.select(Sale.bill_number)).all()
+        assert len(numbers) == 1 and numbers[0].endswith('-000002')
@@ -0,0 +1,36 @@
+from decimal import Decimal
+from types import SimpleNamespace
+
+from conftest import logged_in_client, sale_form
+
+
+def test_scans_see_edits_within_the_check_interval(app, stock, monkeypatch):
+    import scan_cache
+    from app import db
+    from models import Item
+
+    clock = [1000.0]
+    monkeypatch.setattr(scan_cache, 'time', SimpleNamespace(monotonic=lambda: clock[0]))
+    interval = app.config['SCAN_CACHE_CHECK_INTERVAL']
+    client = logged_in_client(app)
+
+    def scan(sn):
+        response = client.get(f'/api/scan?sn={sn}')
+        assert response.status_code == 200
+        return response.get_json()
+
+    assert (scan('SN0')['sp'], scan('SN0')['current_quantity']) == (2, 1000)
+
+    with app.app_context():
+        db.session.get(Item, 1).sp = Decimal('7')
+        db.session.commit()
+    # Served from the map until the interval is up, then reloaded
+    assert scan('SN0')['sp'] == 2
+    clock[0] += interval
+    assert scan('SN0')['sp'] == 7
+
+    # A stock-only change re-reads just the items that moved
+    assert client.post('/sales/add', data=sale_form(item_ids=(1,))).status_code == 302
+    clock[0] += interval
+    assert (scan('SN0')['sp'], scan('SN0')['current_quantity']) == (7, 999)
+    assert scan('SN1')['current_quantity'] == 1000
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from conftest import logged_in_client
+
+
+def test_search_follows_item_writes(app, stock):
+    from app import db
+    from importer import REQUIRED_COLUMNS, import_item_frame
+    from models import Item
+    from search import has_fts
+
+    client = logged_in_client(app)
+
+    def found(term):
+        return sorted(item['sn'] for item in client.get(f'/api/items/search?q={term}').get_json()['items'])
+
+    with app.app_context():
+        # Otherwise the LIKE fallback would pass this test without the triggers
+        assert has_fts()
+        db.session.add(Item(sn='TEA-1', product='Darjeeling', brand='Hills', category='Tea', cp=1, wholesale=1,
+                            sp=2, uom='pcs'))
+        db.session.commit()
+    assert found('darj') == ['TEA-1']
+    assert found('hills tea') == ['TEA-1']
+
+    with app.app_context():
+        db.session.scalar(db.select(Item).where(Item.sn == 'TEA-1')).product = 'Assam'
+        db.session.commit()
+    assert found('darj') == []
+    assert found('assam') == ['TEA-1']
+
+    # The importer writes with INSERT ... ON CONFLICT DO UPDATE, not through the ORM
+    with app.app_context():
+        import_item_frame(pd.DataFrame([['TEA-1', 'Oolong', 'Tea', 'Hills', '1', '1', '2', 'pcs', '0'],
+                                        ['TEA-2', 'Sencha', 'Tea', 'Uji', '1', '1', '2', 'pcs', '0']],
+                                       columns=REQUIRED_COLUMNS))
+    assert found('assam') == []
+    assert found('oolong') == ['TEA-1']
+    assert found('tea') == ['TEA-1', 'TEA-2']
+
+    with app.app_context():
+        db.session.execute(db.delete(Item).where(Item.sn == 'TEA-2'))
+        db.session.commit()
+    assert found('sencha') == []
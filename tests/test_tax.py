@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from conftest import logged_in_client, purchase_form, sale_form
+
+
+def test_lines_and_taxes_are_rounded_half_up_to_the_cent():
+    from tax import Rates, compute_invoice
+
+    totals = compute_invoice([(3, '0.335'), ('1.5', '0.333')], discount='0.01', vat_enabled=True,
+                             excise_enabled=True, excise_rate='2.5',
+                             current_rates=Rates(vat=Decimal('13'), sale_excise=Decimal('0')))
+    # 1.005 -> 1.01 and 0.4995 -> 0.50 per line, before they are summed
+    assert totals.line_totals == [Decimal('1.01'), Decimal('0.50')]
+    assert totals.subtotal == Decimal('1.51')
+    assert totals.taxable == Decimal('1.50')
+    assert totals.vat == Decimal('0.20')  # 0.195
+    assert totals.excise == Decimal('0.04')  # 0.0375
+    assert totals.total == Decimal('1.74')
+
+
+def test_sale_lines_are_stored_rounded(app, stock):
+    from app import db
+    from models import Sale, SaleItem
+
+    client = logged_in_client(app)
+    form = dict(sale_form(item_ids=(1,), quantity='3'), **{'unit_price[]': ['0.335'], 'vat_enabled': 'on'})
+    assert client.post('/sales/add', data=form).status_code == 302
+    with app.app_context():
+        assert db.session.get(SaleItem, 1).total_price == Decimal('1.01')
+        sale = db.session.get(Sale, 1)
+        assert (sale.subtotal_amount, sale.vat_amount, sale.total_amount) == \
+            (Decimal('1.01'), Decimal('0.13'), Decimal('1.14'))
+
+
+def test_recalculate_taxes_applies_a_new_rate(app, stock):
+    from app import db
+    from counters import revenue_key
+    from ledger import drain
+    from models import Purchase, PurchaseLedger, RollupDayParty, Sale, SalesLedger, StatCounter
+
+    client = logged_in_client(app)
+    assert client.post('/sales/add', data=dict(sale_form(), vat_enabled='on')).status_code == 302
+    assert client.post('/purchases/add', data=dict(purchase_form(), vat_enabled='on')).status_code == 302
+    with app.app_context():
+        assert db.session.get(Sale, 1).total_amount == Decimal('4.52')
+        assert db.session.get(Purchase, 1).total_amount == Decimal('5.65')
+
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['set-tax-rate', 'vat_rate', '10']).exit_code == 0
+    result = runner.invoke(args=['recalculate-taxes', '--since', '2000-01-01', '--dry-run'])
+    assert 'sales: 1 of 1 invoices would change.' in result.output
+    with app.app_context():
+        assert db.session.get(Sale, 1).total_amount == Decimal('4.52')
+
+    result = runner.invoke(args=['recalculate-taxes', '--since', '2000-01-01'])
+    assert result.exit_code == 0, result.output
+    assert 'purchases: 1 of 1 invoices updated.' in result.output
+    with app.app_context():
+        sale = db.session.get(Sale, 1)
+        assert (sale.vat_amount, sale.total_amount) == (Decimal('0.40'), Decimal('4.40'))
+        purchase = db.session.get(Purchase, 1)
+        assert (purchase.vat_amount, purchase.total_amount) == (Decimal('0.50'), Decimal('5.50'))
+
+        # The rollups, the revenue counter and the ledgers follow the new totals
+        amounts = dict(db.session.execute(db.select(RollupDayParty.kind, RollupDayParty.amount)).all())
+        assert amounts == {'sales': Decimal('4.40'), 'purchases': Decimal('5.50')}
+        assert db.session.get(StatCounter, revenue_key(sale.sale_date.date())).value == Decimal('4.40')
+        drain()
+        assert sum(entry.amount for entry in db.session.query(SalesLedger)) == Decimal('4.40')
+        assert sum(entry.amount for entry in db.session.query(PurchaseLedger)) == Decimal('5.50')